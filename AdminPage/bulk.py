@@ -0,0 +1,122 @@
+"""
+Bulk moderation of Software from the admin list.
+
+apply() runs one action over a selection, given as ids or as the list
+filters (see AdminPage/listing.py), as set-based UPDATE and DELETE
+statements of SOFTWARE_BULK_BATCH_SIZE rows, each batch in its own
+transaction.  The per-row signal receivers do not run, so what they
+maintain is brought up to date once per batch instead: the category
+statistics in the same transaction; the page cache generations, the
+suggest index and the dashboard snapshot after it commits.  Updates set
+updated_at themselves and deletes write their tombstones, so the changes
+feed sees both.
+"""
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+
+from software import page_cache
+from software.category_stats import refresh_category_stats
+from software.models import DeletedRecord, Software, SoftwareCategory, UploadSession
+from software.suggest import SOFTWARE, suggest_index
+
+from . import dashboard, listing
+
+# action -> past tense for messages
+ACTIONS = {
+    'activate': 'activated',
+    'deactivate': 'deactivated',
+    'categorize': 'moved',
+    'delete': 'deleted',
+}
+
+ROW = ('pk', 'category_id', 'title', 'download_count')
+
+
+def _id_batches(ids, batch_size):
+    ids = sorted(set(ids))
+    for start in range(0, len(ids), batch_size):
+        rows = list(Software.objects.filter(pk__in=ids[start:start + batch_size]).order_by('pk').values_list(*ROW))
+        if rows:
+            yield rows
+
+
+def _filter_batches(filters, batch_size):
+    # Keyset on the id, so rows the action moves out of the filter
+    # (activating an "inactive" selection) do not shift later batches
+    queryset = listing.filtered(**filters)
+    last = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last).order_by('pk').values_list(*ROW)[:batch_size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+def _delete(pks):
+    # The download logs keep their rows and the upload sessions that created
+    # the software only lose the link (SET_NULL, done here as one UPDATE), so
+    # skip the deletion collector, which loads every row to send its signals
+    UploadSession.objects.filter(software_id__in=pks).update(software=None)
+    Software.objects.filter(pk__in=pks)._raw_delete(router.db_for_write(Software))
+    DeletedRecord.objects.bulk_create([DeletedRecord(kind=DeletedRecord.SOFTWARE, object_id=pk) for pk in pks])
+
+
+def _invalidate(rows, category_ids, active):
+    """
+    What the signal receivers would have done for every row, in one go.
+    ``active`` is the rows' new state, or None when it did not change.
+    """
+    page_cache.bump_many([
+        'catalog',
+        *(f'software:{pk}' for pk, *_ in rows),
+        *(f'category:{pk}' for pk in category_ids),
+    ])
+    if active is not None:
+        suggest_index.changed_many(SOFTWARE, [(pk, title, active, downloads) for pk, _, title, downloads in rows])
+
+
+def apply(action, ids=None, filters=None, category=None, batch_size=None):
+    """
+    Run ``action`` on the software with the given ids, or matching the list
+    filters ({'status', 'category', 'search'}), and return how many rows it
+    changed.  ``category`` is the target category id of 'categorize'.
+    Raises ValueError for an unknown action, a missing selection or an
+    unknown target category.
+    """
+    if action not in ACTIONS:
+        raise ValueError(f'Unknown action: {action}')
+    if (ids is None) == (filters is None):
+        raise ValueError('Give either ids or filters')
+    if action == 'categorize' and not SoftwareCategory.objects.filter(pk=category).exists():
+        raise ValueError('Unknown category')
+    batch_size = batch_size or settings.SOFTWARE_BULK_BATCH_SIZE
+    batches = _id_batches(ids, batch_size) if ids is not None else _filter_batches(filters, batch_size)
+
+    changed = 0
+    while True:
+        with transaction.atomic():
+            rows = next(batches, None)
+            if not rows:
+                break
+            pks = [row[0] for row in rows]
+            category_ids = {row[1] for row in rows if row[1] is not None}
+            if action == 'delete':
+                _delete(pks)
+            else:
+                values = {'updated_at': timezone.now()}
+                if action == 'categorize':
+                    values['category_id'] = category
+                    category_ids.add(category)
+                else:
+                    values['is_active'] = action == 'activate'
+                Software.objects.filter(pk__in=pks).update(**values)
+            changed += len(pks)
+            refresh_category_stats(category_ids)
+            transaction.on_commit(lambda rows=rows, category_ids=category_ids: _invalidate(
+                rows, category_ids, None if action == 'categorize' else action == 'activate'
+            ))
+    if changed:
+        transaction.on_commit(dashboard.invalidate)
+    return changed
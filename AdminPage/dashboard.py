@@ -0,0 +1,133 @@
+"""
+Statistics snapshot for the admin dashboard.
+
+compute_stats() reads everything the dashboard shows in eight queries: one
+conditional aggregate (Count(filter=...)) each over Software,
+SoftwareCategory and User, and one per top-N list.  The result is plain
+dicts and lists, kept in the ``default`` cache (shared between workers, see
+software.E003), so rendering the dashboard costs the same however large the
+catalog grows.
+
+get_snapshot() serves the snapshot.  Once it is older than
+SOFTWARE_DASHBOARD_STATS_TTL seconds it is still served, while a background
+thread recomputes it (one worker at a time, guarded by a cache lock); only a
+missing snapshot is computed during the request.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from software.models import Software, SoftwareCategory
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'adminpage:dashboard-stats'
+LOCK_KEY = 'adminpage:dashboard-stats:refreshing'
+
+SOFTWARE_COLUMNS = ('id', 'title', 'is_active', 'download_count', 'created_at', 'uploader__username', 'category__name')
+
+
+def _software_rows(queryset, limit):
+    return [
+        {
+            'id': row['id'],
+            'title': row['title'],
+            'is_active': row['is_active'],
+            'download_count': row['download_count'],
+            'created_at': row['created_at'],
+            'uploader': row['uploader__username'],
+            'category': row['category__name'],
+        }
+        for row in queryset.values(*SOFTWARE_COLUMNS)[:limit]
+    ]
+
+
+def _user_row(row):
+    # What User.get_full_name() returns
+    row['full_name'] = f"{row.pop('first_name')} {row.pop('last_name')}".strip()
+    return row
+
+
+def compute_stats():
+    """Everything the dashboard shows, as plain data"""
+    # Windows start at midnight like the date-based filters they replace,
+    # but compare the raw column so the aggregate stays a single scan
+    midnight = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    week_ago = midnight - timedelta(days=7)
+    month_ago = midnight - timedelta(days=30)
+
+    software = Software.objects.aggregate(
+        total_software=Count('pk', filter=Q(is_active=True)),
+        pending_reviews=Count('pk', filter=Q(is_active=False)),
+        software_this_week=Count('pk', filter=Q(is_active=True, created_at__gte=week_ago)),
+        software_this_month=Count('pk', filter=Q(is_active=True, created_at__gte=month_ago)),
+        total_downloads=Sum('download_count'),
+    )
+    categories = SoftwareCategory.objects.aggregate(
+        active_categories=Count('pk', filter=Q(is_active=True)),
+        inactive_categories=Count('pk', filter=Q(is_active=False)),
+    )
+    users = User.objects.aggregate(
+        total_users=Count('pk', filter=Q(is_active=True)),
+        new_users_this_week=Count('pk', filter=Q(is_active=True, date_joined__gte=week_ago)),
+    )
+
+    stats = {**software, **categories, **users}
+    stats['total_downloads'] = stats['total_downloads'] or 0
+    stats['total_categories'] = stats['active_categories']
+    stats.update({
+        'recent_software': _software_rows(Software.active.order_by('-created_at'), 10),
+        'popular_software': _software_rows(Software.active.order_by('-download_count'), 10),
+        'inactive_software': _software_rows(Software.objects.filter(is_active=False).order_by('-created_at'), 5),
+        'category_stats': list(
+            SoftwareCategory.objects.filter(is_active=True)
+            .order_by('-active_software_count')
+            .values('id', 'name', software_count=F('active_software_count'))[:10]
+        ),
+        'recent_users': [_user_row(row) for row in User.objects.filter(is_active=True).order_by('-date_joined').values(
+            'id', 'username', 'email', 'first_name', 'last_name', 'date_joined', 'is_active'
+        )[:10]],
+    })
+    return stats
+
+
+def refresh():
+    """Recompute and store the snapshot"""
+    snapshot = {'generated_at': timezone.now(), 'stats': compute_stats()}
+    cache.set(SNAPSHOT_KEY, snapshot, None)
+    return snapshot
+
+
+def invalidate():
+    """Drop the snapshot, so the next dashboard view computes a fresh one"""
+    cache.delete(SNAPSHOT_KEY)
+
+
+def _refresh_in_background():
+    try:
+        refresh()
+    except Exception:
+        logger.exception('Could not refresh the dashboard statistics')
+    finally:
+        cache.delete(LOCK_KEY)
+        # This thread's own database connections
+        connections.close_all()
+
+
+def get_snapshot():
+    """The current snapshot ({'generated_at', 'stats'}), refreshing it if stale"""
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        return refresh()
+    age = (timezone.now() - snapshot['generated_at']).total_seconds()
+    if age > settings.SOFTWARE_DASHBOARD_STATS_TTL and cache.add(LOCK_KEY, time.time(), 300):
+        threading.Thread(target=_refresh_in_background, name='dashboard-stats', daemon=True).start()
+    return snapshot
@@ -0,0 +1,91 @@
+"""
+Rows for the admin software list.
+
+The list reads one page at a time with the keyset paginator from
+software/pagination.py, so a page costs an index range scan whatever the
+catalog size and nothing counts the whole table.  Only the columns the page
+shows are selected (values(), with a short prefix of the description), and
+every sort order ends with the id and is backed by an index on Software.
+Search goes through the full-text index; an exact username also lists that
+user's uploads (username is unique, so that lookup is indexed too).
+"""
+from django.db.models import F, Q
+from django.db.models.functions import Substr
+
+from software.models import Software
+from software.search import get_search_backend
+
+# ?sort= keys -> ordering fields; a leading '-' sorts descending
+SORTS = {
+    'title': ('title', 'id'),
+    'downloads': ('download_count', 'id'),
+    'date': ('created_at', 'id'),
+    'status': ('is_active', 'created_at', 'id'),
+}
+LABELS = {'title': 'Title', 'downloads': 'Downloads', 'date': 'Date', 'status': 'Status'}
+# What a column header sorts by on the first click
+FIRST_CLICK = {'title': 'title', 'downloads': '-downloads', 'date': '-date', 'status': '-status'}
+DEFAULT_SORT = '-date'
+
+STATUSES = ('all', 'active', 'inactive')
+
+# Enough of the description for the 15 words the grid cards show
+SUMMARY_LENGTH = 200
+
+COLUMNS = ('id', 'title', 'version', 'is_active', 'download_count', 'created_at', 'thumbnail')
+
+
+def parse_sort(value):
+    return value if value and value.lstrip('-') in SORTS else DEFAULT_SORT
+
+
+def ordering(sort):
+    """Ordering fields of a parsed ?sort= value"""
+    descending = sort.startswith('-')
+    return tuple(f'-{name}' if descending else name for name in SORTS[sort.lstrip('-')])
+
+
+def next_sort(current, key):
+    """?sort= value of the ``key`` column header: the first click, then toggle"""
+    if current.lstrip('-') != key:
+        return FIRST_CLICK[key]
+    return key if current.startswith('-') else f'-{key}'
+
+
+def parse_filters(params):
+    """{'status', 'category', 'search'} from request parameters, invalid values dropped"""
+    status = params.get('status', 'all')
+    category = str(params.get('category', ''))
+    return {
+        'status': status if status in STATUSES else 'all',
+        'category': category if category.isdigit() else '',
+        'search': str(params.get('search', '')).strip(),
+    }
+
+
+def filtered(status='all', category=None, search=None):
+    """Software matching the list filters, unordered"""
+    queryset = Software.objects.all()
+    if status == 'active':
+        queryset = queryset.filter(is_active=True)
+    elif status == 'inactive':
+        queryset = queryset.filter(is_active=False)
+    if category:
+        queryset = queryset.filter(category_id=category)
+    if search:
+        queryset = queryset.filter(get_search_backend().matches(search) | Q(uploader__username=search.strip()))
+    return queryset
+
+
+def rows(queryset):
+    """The page columns as values() dicts"""
+    return queryset.values(
+        *COLUMNS,
+        category_name=F('category__name'),
+        uploader_name=F('uploader__username'),
+        summary=Substr('description', 1, SUMMARY_LENGTH),
+    )
+
+
+def thumbnail_url(name):
+    return Software._meta.get_field('thumbnail').storage.url(name) if name else ''
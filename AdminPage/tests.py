@@ -1,3 +1,220 @@
-from django.test import TestCase
+import hashlib
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from AdminPage import dashboard, timeseries
+from software import uploads
+from software.models import DeletedRecord, Software, SoftwareCategory, UploadSession
+from software.storage import is_content_name
+
+
+class AdminTestCase(TestCase):
+    """Signed in as staff, with media and caches of its own"""
+
+    def setUp(self):
+        for cache in caches.all(initialized_only=True):
+            cache.clear()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        overrides = override_settings(
+            MEDIA_ROOT=f'{media}/media', SOFTWARE_UPLOAD_STAGING_DIR=f'{media}/staging', SOFTWARE_THUMBNAIL_WORKERS=0,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = User.objects.create_user('editor', password='secret', is_staff=True)
+        self.client.force_login(self.user)
+
+
+@override_settings(SOFTWARE_UPLOAD_CHUNK_SIZE=4)
+class ChunkedUploadTests(AdminTestCase):
+    content = b'0123456789abcdefghij'
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(uploads._hashes.clear)
+        self.category = SoftwareCategory.objects.create(name='Tools')
+
+    def start(self):
+        response = self.client.post(
+            '/adminpage/uploads/', {'filename': 'setup.exe', 'size': len(self.content)}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def put(self, session_id, offset, **headers):
+        return self.client.put(
+            f'/adminpage/uploads/{session_id}/', self.content[offset:offset + 4],
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset), **headers,
+        )
+
+    def finalize(self, session_id):
+        return self.client.post(f'/adminpage/uploads/{session_id}/finalize/', {
+            'title': 'Setup', 'description': 'An installer', 'version': '1.0',
+            'category': self.category.pk, 'is_active': 'on',
+        })
+
+    def test_chunks_received_by_one_process_are_hashed_as_they_arrive(self):
+        session_id = self.start()
+        for offset in range(0, len(self.content), 4):
+            self.assertEqual(self.put(session_id, offset).status_code, 200)
+        self.assertEqual(UploadSession.objects.get(pk=session_id).sha256, hashlib.sha256(self.content).hexdigest())
+
+        response = self.finalize(session_id)
+
+        self.assertEqual(response.status_code, 200)
+        software = Software.objects.get(pk=response.json()['id'])
+        self.assertTrue(is_content_name(software.file.name))
+        self.assertEqual(software.download_name, 'setup.exe')
+        with software.file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_chunks_spread_over_processes_are_hashed_once_before_finalizing(self):
+        session_id = self.start()
+        with mock.patch.object(uploads, '_start_hashing') as start_hashing:
+            for offset in range(0, len(self.content), 4):
+                self.assertEqual(self.put(session_id, offset).status_code, 200)
+                # The next chunk lands in a process without the running hash
+                uploads._hashes.clear()
+        self.assertEqual(start_hashing.call_count, 1)
+
+        response = self.finalize(session_id)
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.json()['pending'])
+
+        uploads.hash_staged(session_id)
+        response = self.finalize(session_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['sha256'], hashlib.sha256(self.content).hexdigest())
+
+    def test_unfinished_hashing_is_restarted(self):
+        session_id = self.start()
+        with mock.patch.object(uploads, '_start_hashing') as start_hashing:
+            for offset in range(0, len(self.content), 4):
+                self.put(session_id, offset)
+                uploads._hashes.clear()
+            self.finalize(session_id)
+            self.assertEqual(start_hashing.call_count, 1)
+
+            UploadSession.objects.filter(pk=session_id).update(updated_at=timezone.now() - timedelta(hours=1))
+            self.assertEqual(self.finalize(session_id).status_code, 202)
+            self.assertEqual(start_hashing.call_count, 2)
+
+    def test_chunk_at_the_wrong_offset_gets_the_session_offset(self):
+        session_id = self.start()
+        self.put(session_id, 0)
+
+        response = self.put(session_id, 8)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 4)
+
+    def test_corrupt_chunk_is_discarded(self):
+        session_id = self.start()
+
+        response = self.put(session_id, 0, HTTP_X_CHUNK_SHA256='0' * 64)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(UploadSession.objects.get(pk=session_id).received, 0)
+        self.assertEqual(self.put(session_id, 0).status_code, 200)
+
+    def test_incomplete_upload_cannot_be_finalized(self):
+        session_id = self.start()
+        self.put(session_id, 0)
+
+        response = self.finalize(session_id)
+
+        self.assertEqual(response.status_code, 409)
+
+
+class BulkDeleteTests(AdminTestCase):
+
+    def test_software_created_by_an_upload_can_be_deleted(self):
+        software = Software.objects.create(title='Setup', description='An installer', file='software_files/setup.exe')
+        upload = UploadSession.objects.create(
+            user=self.user, filename='setup.exe', size=1, received=1, software=software,
+        )
+
+        response = self.client.post(
+            reverse('adminpage:software_bulk'), {'action': 'delete', 'ids': [software.pk]},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        # Foreign keys are checked at commit, which a TestCase never reaches
+        connection.check_constraints()
+        self.assertFalse(Software.objects.filter(pk=software.pk).exists())
+        self.assertIsNone(UploadSession.objects.get(pk=upload.pk).software_id)
+        self.assertTrue(DeletedRecord.objects.filter(kind=DeletedRecord.SOFTWARE, object_id=software.pk).exists())
+
+
+# Session and user lookups made for every logged-in request
+AUTH_QUERIES = 2
+# Three conditional aggregates and five top-N lists
+SNAPSHOT_QUERIES = 8
+# Three grouped series, the download aggregate, top uploaders and two rollup reads
+STATS_QUERIES = 7
+
+
+class DashboardQueryTests(AdminTestCase):
+    """The dashboard and the statistics page cost a fixed number of queries"""
+
+    def setUp(self):
+        super().setUp()
+        self.categories = SoftwareCategory.objects.bulk_create(
+            [SoftwareCategory(name=f'Dashboard check {i}') for i in range(20)]
+        )
+        self.seed(0, 200)
+
+    def seed(self, start, stop):
+        Software.objects.bulk_create(
+            [
+                Software(
+                    title=f'Dashboard check {i}',
+                    description='Dashboard check',
+                    category=self.categories[i % len(self.categories)],
+                    uploader=self.user,
+                    is_active=i % 10 != 0,
+                    download_count=i % 997,
+                    file=f'software_files/dashboard-check-{i}.bin',
+                )
+                for i in range(start, stop)
+            ],
+            batch_size=1000,
+        )
+
+    def assert_dashboard_budget(self):
+        url = reverse('adminpage:admin_home')
+        caches['default'].delete(dashboard.SNAPSHOT_KEY)
+        with self.assertNumQueries(AUTH_QUERIES + SNAPSHOT_QUERIES):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        # Served from the cached snapshot
+        with self.assertNumQueries(AUTH_QUERIES):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def assert_stats_budget(self):
+        for months in timeseries.RANGES:
+            for granularity in timeseries.GRANULARITIES:
+                with self.subTest(months=months, by=granularity), self.assertNumQueries(AUTH_QUERIES + STATS_QUERIES):
+                    response = self.client.get(reverse('adminpage:admin_stats'), {'months': months, 'by': granularity})
+                    self.assertEqual(response.status_code, 200)
+
+    def test_dashboard_query_budget(self):
+        self.assert_dashboard_budget()
+
+    def test_stats_query_budget_at_every_range(self):
+        self.assert_stats_budget()
+
+    def test_query_counts_do_not_grow_with_the_catalog(self):
+        self.seed(200, 2000)
+        self.assert_dashboard_budget()
+        self.assert_stats_budget()
@@ -0,0 +1,91 @@
+"""
+Upload, registration and download series for the statistics page.
+
+Each series is one grouped query (Trunc* over the timestamp, Count or Sum
+per bucket), so the page costs the same number of queries whatever the
+range.  Buckets with no rows are filled in here, walking real calendar
+months rather than 30-day steps.  Downloads come from the daily rollups.
+"""
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from software.models import DownloadRollup, Software
+
+# Ranges offered on the page, in months
+RANGES = (3, 12, 36)
+DEFAULT_RANGE = 12
+
+# granularity -> (truncation, label format, adjective for headings)
+GRANULARITIES = {
+    'month': (TruncMonth, '%B %Y', 'Monthly'),
+    'week': (TruncWeek, 'Week of %d %b %Y', 'Weekly'),
+    'day': (TruncDay, '%d %b %Y', 'Daily'),
+}
+DEFAULT_GRANULARITY = 'month'
+
+
+def add_months(day, months):
+    """First day of the month ``months`` away from ``day``'s month"""
+    month = day.year * 12 + day.month - 1 + months
+    return day.replace(year=month // 12, month=month % 12 + 1, day=1)
+
+
+def bucket_starts(months, granularity):
+    """Local start dates of every bucket in the range, oldest first"""
+    today = timezone.localdate()
+    start = add_months(today, -(months - 1))
+    if granularity == 'month':
+        return [add_months(start, i) for i in range(months)]
+    if granularity == 'week':
+        start -= timedelta(days=start.weekday())
+        step = 7
+    else:
+        step = 1
+    return [start + timedelta(days=i) for i in range(0, (today - start).days + 1, step)]
+
+
+def _totals(queryset, column, truncate, since, value):
+    rows = (
+        queryset.filter(**{f'{column}__gte': since})
+        .annotate(period=truncate(column))
+        .values('period')
+        .annotate(total=value)
+        .order_by()
+    )
+    return {timezone.localtime(row['period']).date(): row['total'] for row in rows}
+
+
+def series(months=DEFAULT_RANGE, granularity=DEFAULT_GRANULARITY):
+    """
+    [{'month': label, 'start': date, 'software_count', 'user_count',
+    'download_count', 'growth'}, ...] with gaps filled; growth is the
+    percentage change in uploads from the previous bucket
+    """
+    truncate, label, _ = GRANULARITIES[granularity]
+    starts = bucket_starts(months, granularity)
+    since = timezone.make_aware(datetime.combine(starts[0], time.min))
+
+    software = _totals(Software.objects.filter(is_active=True), 'created_at', truncate, since, Count('id'))
+    users = _totals(User.objects.filter(is_active=True), 'date_joined', truncate, since, Count('id'))
+    downloads = _totals(
+        DownloadRollup.objects.filter(granularity=DownloadRollup.DAY), 'bucket', truncate, since, Sum('downloads')
+    )
+
+    points = []
+    previous = None
+    for start in starts:
+        count = software.get(start, 0)
+        points.append({
+            'month': start.strftime(label),
+            'start': start,
+            'software_count': count,
+            'user_count': users.get(start, 0),
+            'download_count': downloads.get(start, 0),
+            'growth': (count - previous) * 100 / previous if previous else 0,
+        })
+        previous = count
+    return points
@@ -7,9 +7,15 @@ urlpatterns = [
     path('', views.AdminHomeView.as_view(), name='admin_home'),
     path('stats/', views.AdminStatsView.as_view(), name='admin_stats'),
     path('upload/', views.AdminSoftwareUploadView.as_view(), name='software_upload'),
+    path('uploads/', views.AdminUploadSessionCreateView.as_view(), name='upload_create'),
+    path('uploads/<uuid:pk>/', views.AdminUploadSessionView.as_view(), name='upload_session'),
+    path('uploads/<uuid:pk>/finalize/', views.AdminUploadFinalizeView.as_view(), name='upload_finalize'),
     path('software/', views.AdminSoftwareListView.as_view(), name='software_list'),
+    path('software/results/', views.AdminSoftwareResultsView.as_view(), name='software_results'),
+    path('software/bulk/', views.AdminSoftwareBulkView.as_view(), name='software_bulk'),
     path('software/edit/<int:pk>/', views.AdminSoftwareEditView.as_view(), name='software_edit'),
     path('software/delete/<int:pk>/', views.AdminSoftwareDeleteView.as_view(), name='software_delete'),
     path('software/toggle/<int:pk>/', views.AdminSoftwareToggleStatusView.as_view(), name='software_toggle'),
     path('software/details/<int:pk>/', views.get_software_details, name='software_details'),
+    path('cache/stats/', views.get_page_cache_stats, name='page_cache_stats'),
 ]
\ No newline at end of file
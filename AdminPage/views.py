@@ -1,15 +1,22 @@
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.views import View
 from django.views.generic import TemplateView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.db.models import Count, Q, Sum
-from django.utils import timezone
-from datetime import timedelta
+from django.db.models import Avg, Count, Q, Sum
+from software import page_cache, uploads
+from . import bulk, dashboard, listing, timeseries
 from software.models import Software, SoftwareCategory
+from software.pagination import CursorPaginator, InvalidCursor
+from software.rollups import category_downloads, daily_downloads
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils.http import urlencode
 from django import forms
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 
@@ -56,6 +63,13 @@ class SoftwareUploadForm(forms.ModelForm):
         self.fields['category'].empty_label = "Select a category"
         self.fields['is_active'].initial = True
 
+class SoftwareDetailsForm(SoftwareUploadForm):
+    """
+    The upload form without the file, which arrives through an upload session
+    """
+    class Meta(SoftwareUploadForm.Meta):
+        fields = ['title', 'description', 'version', 'category', 'thumbnail', 'is_active']
+
 class AdminHomeView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
     """
     Class-based view for the admin home page dashboard
@@ -70,68 +84,10 @@ class AdminHomeView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Get current date and calculate date ranges
-        now = timezone.now()
-        today = now.date()
-        week_ago = today - timedelta(days=7)
-        month_ago = today - timedelta(days=30)
-        
-        # Dashboard statistics
-        context.update({
-            # Total counts
-            'total_software': Software.objects.filter(is_active=True).count(),
-            'total_categories': SoftwareCategory.objects.filter(is_active=True).count(),
-            'total_users': User.objects.filter(is_active=True).count(),
-            'total_downloads': Software.objects.aggregate(
-                total=Sum('download_count')
-            )['total'] or 0,
-            
-            # Recent statistics
-            'software_this_week': Software.objects.filter(
-                created_at__date__gte=week_ago,
-                is_active=True
-            ).count(),
-            'software_this_month': Software.objects.filter(
-                created_at__date__gte=month_ago,
-                is_active=True
-            ).count(),
-            'new_users_this_week': User.objects.filter(
-                date_joined__date__gte=week_ago,
-                is_active=True
-            ).count(),
-            
-            # Recent software uploads
-            'recent_software': Software.objects.filter(
-                is_active=True
-            ).select_related('category', 'uploader').order_by('-created_at')[:10],
-            
-            # Popular software (by download count)
-            'popular_software': Software.objects.filter(
-                is_active=True
-            ).select_related('category', 'uploader').order_by('-download_count')[:10],
-            
-            # Category statistics
-            'category_stats': SoftwareCategory.objects.filter(
-                is_active=True
-            ).annotate(
-                software_count=Count('software', filter=Q(software__is_active=True))
-            ).order_by('-software_count')[:10],
-            
-            # Recent users
-            'recent_users': User.objects.filter(
-                is_active=True
-            ).order_by('-date_joined')[:10],
-            
-            # Inactive software (for review)
-            'inactive_software': Software.objects.filter(
-                is_active=False
-            ).select_related('category', 'uploader').order_by('-created_at')[:5],
-            
-            # System status
-            'pending_reviews': Software.objects.filter(is_active=False).count(),
-            'active_categories': SoftwareCategory.objects.filter(is_active=True).count(),
-            'inactive_categories': SoftwareCategory.objects.filter(is_active=False).count(),
-        })
+        # Dashboard statistics from the cached snapshot (see AdminPage/dashboard.py)
+        snapshot = dashboard.get_snapshot()
+        context.update(snapshot['stats'])
+        context['stats_generated_at'] = snapshot['generated_at']
         
         return context
 
@@ -149,29 +105,28 @@ class AdminStatsView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Get detailed statistics
-        now = timezone.now()
+        # Range and granularity of the series, e.g. ?months=36&by=week
+        months = self.request.GET.get('months', '')
+        months = int(months) if months.isdigit() and int(months) in timeseries.RANGES else timeseries.DEFAULT_RANGE
+        granularity = self.request.GET.get('by')
+        if granularity not in timeseries.GRANULARITIES:
+            granularity = timeseries.DEFAULT_GRANULARITY
         
-        # Monthly data for charts (last 12 months)
-        monthly_data = []
-        for i in range(12):
-            month_start = (now - timedelta(days=30*i)).replace(day=1)
-            month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            
-            monthly_data.append({
-                'month': month_start.strftime('%B %Y'),
-                'software_count': Software.objects.filter(
-                    created_at__date__range=[month_start.date(), month_end.date()],
-                    is_active=True
-                ).count(),
-                'user_count': User.objects.filter(
-                    date_joined__date__range=[month_start.date(), month_end.date()],
-                    is_active=True
-                ).count(),
-            })
+        # One grouped query per series (see AdminPage/timeseries.py)
+        monthly_data = timeseries.series(months, granularity)
         
         context.update({
-            'monthly_data': list(reversed(monthly_data)),
+            'monthly_data': monthly_data,
+            'months': months,
+            'granularity': granularity,
+            'granularity_label': timeseries.GRANULARITIES[granularity][2],
+            'ranges': timeseries.RANGES,
+            'granularities': list(timeseries.GRANULARITIES),
+            # Growth of the last complete period; the current one is still filling
+            'latest_growth': monthly_data[-2]['growth'] if len(monthly_data) > 1 else 0,
+            # Download trends are read from the daily rollups, never raw events
+            'daily_downloads': daily_downloads(days=30),
+            'category_downloads': category_downloads(days=30),
             'top_uploaders': User.objects.annotate(
                 upload_count=Count('software', filter=Q(software__is_active=True)),
                 total_downloads=Sum('software__download_count', filter=Q(software__is_active=True))
@@ -181,7 +136,7 @@ class AdminStatsView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
                 is_active=True
             ).aggregate(
                 total_downloads=Sum('download_count'),
-                avg_downloads=Sum('download_count') / Count('id') if Software.objects.filter(is_active=True).count() > 0 else 0
+                avg_downloads=Avg('download_count'),
             ),
         })
         
@@ -217,6 +172,7 @@ class AdminSoftwareUploadView(LoginRequiredMixin, UserPassesTestMixin, CreateVie
         context.update({
             'page_title': 'Upload Software',
             'categories': SoftwareCategory.objects.filter(is_active=True),
+            'upload_max_size': settings.SOFTWARE_UPLOAD_MAX_SIZE,
             'recent_uploads': Software.objects.filter(
                 uploader=self.request.user
             ).order_by('-created_at')[:5]
@@ -225,10 +181,12 @@ class AdminSoftwareUploadView(LoginRequiredMixin, UserPassesTestMixin, CreateVie
 
 class AdminSoftwareListView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
     """
-    View for managing uploaded software
+    View for managing uploaded software, one keyset page at a time
+    (see AdminPage/listing.py)
     """
     template_name = 'AdminPage/software_list.html'
     login_url = '/admin/login/'
+    paginate_by = 25
     
     def test_func(self):
         """Check if user is staff or superuser"""
@@ -237,41 +195,54 @@ class AdminSoftwareListView(LoginRequiredMixin, UserPassesTestMixin, TemplateVie
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Get all software with filtering options
-        software_list = Software.objects.select_related('category', 'uploader').order_by('-created_at')
+        filters = listing.parse_filters(self.request.GET)
+        sort = listing.parse_sort(self.request.GET.get('sort'))
         
-        # Filter by status if requested
-        status_filter = self.request.GET.get('status', 'all')
-        if status_filter == 'active':
-            software_list = software_list.filter(is_active=True)
-        elif status_filter == 'inactive':
-            software_list = software_list.filter(is_active=False)
-        
-        # Filter by category if requested
-        category_filter = self.request.GET.get('category')
-        if category_filter:
-            software_list = software_list.filter(category_id=category_filter)
-        
-        # Search functionality
-        search_query = self.request.GET.get('search')
-        if search_query:
-            software_list = software_list.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(uploader__username__icontains=search_query)
-            )
+        paginator = CursorPaginator(
+            listing.rows(listing.filtered(**filters)),
+            self.paginate_by, ordering=listing.ordering(sort),
+        )
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        for row in page:
+            row['thumbnail_url'] = listing.thumbnail_url(row['thumbnail'])
         
+        # Query strings for the sort headers and the pager, keeping the filters
+        params = {key: value for key, value in filters.items() if value and value != 'all'}
+        sort_queries = {
+            key: urlencode({**params, 'sort': listing.next_sort(sort, key)}) for key in listing.SORTS
+        }
         context.update({
-            'software_list': software_list,
-            'categories': SoftwareCategory.objects.filter(is_active=True),
-            'status_filter': status_filter,
-            'category_filter': category_filter,
-            'search_query': search_query or '',
-            'total_software': software_list.count(),
+            'software_list': page,
+            'page_obj': page,
+            'categories': SoftwareCategory.objects.filter(is_active=True).only('id', 'name'),
+            'status_filter': filters['status'],
+            'category_filter': filters['category'],
+            'search_query': filters['search'],
+            'sort': sort,
+            'sort_field': sort.lstrip('-'),
+            'sort_descending': sort.startswith('-'),
+            'sort_queries': sort_queries,
+            'sort_options': [(key, listing.LABELS[key], sort_queries[key]) for key in listing.SORTS],
+            'next_query': page.next_cursor and urlencode({**params, 'sort': sort, 'cursor': page.next_cursor}),
+            'previous_query': page.previous_cursor and urlencode(
+                {**params, 'sort': sort, 'cursor': page.previous_cursor}
+            ),
+            # Planner estimate on PostgreSQL, None elsewhere; never a COUNT(*)
+            'estimated_total': page.estimated_total,
         })
         
         return context
 
+class AdminSoftwareResultsView(AdminSoftwareListView):
+    """
+    The result list alone, fetched by the list page to page, sort and
+    filter without reloading
+    """
+    template_name = 'AdminPage/software_results.html'
+
 class AdminSoftwareEditView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     """
     View for editing software through admin panel
@@ -339,9 +310,10 @@ class AdminSoftwareToggleStatusView(LoginRequiredMixin, UserPassesTestMixin, Tem
     def post(self, request, pk):
         """Toggle software active status"""
         try:
-            software = get_object_or_404(Software, pk=pk)
+            software = get_object_or_404(Software.objects.only('title', 'is_active'), pk=pk)
+            # An UPDATE of the status alone, with the bulk actions' invalidation
+            bulk.apply('deactivate' if software.is_active else 'activate', ids=[pk])
             software.is_active = not software.is_active
-            software.save()
             
             return JsonResponse({
                 'success': True,
@@ -354,6 +326,169 @@ class AdminSoftwareToggleStatusView(LoginRequiredMixin, UserPassesTestMixin, Tem
                 'message': f'Error updating software status: {str(e)}'
             })
 
+class AdminSoftwareBulkView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    AJAX view running one bulk action (see AdminPage/bulk.py) on a list of
+    ids or on everything matching the list filters
+    """
+    login_url = '/admin/login/'
+    
+    def test_func(self):
+        """Check if user is staff or superuser"""
+        return self.request.user.is_staff or self.request.user.is_superuser
+    
+    def post(self, request):
+        """Body: {"action", "ids": [...] or "filters": {...}, "category"}"""
+        try:
+            data = json.loads(request.body)
+            action = data.get('action')
+            ids = data.get('ids')
+            if ids is not None:
+                ids = [int(pk) for pk in ids]
+            filters = data.get('filters')
+            if filters is not None:
+                filters = listing.parse_filters(filters)
+            category = int(data['category']) if action == 'categorize' else None
+            count = bulk.apply(action, ids=ids, filters=filters, category=category)
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            return JsonResponse({
+                'success': False,
+                'message': f'Error running bulk action: {str(e)}'
+            }, status=400)
+        
+        return JsonResponse({
+            'success': True,
+            'count': count,
+            'message': f'{count} software item{"" if count == 1 else "s"} {bulk.ACTIONS[action]}.'
+        })
+
+def _upload_session_json(session):
+    return {
+        'id': str(session.pk),
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.received,
+        'chunk_size': settings.SOFTWARE_UPLOAD_CHUNK_SIZE,
+        'complete': session.complete,
+        'finalized': session.completed_at is not None,
+    }
+
+class AdminUploadSessionCreateView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    AJAX view starting a chunked upload (see software/uploads.py)
+    """
+    login_url = '/admin/login/'
+    
+    def test_func(self):
+        """Check if user is staff or superuser"""
+        return self.request.user.is_staff or self.request.user.is_superuser
+    
+    def post(self, request):
+        """Body: {"filename", "size"}"""
+        try:
+            data = json.loads(request.body)
+            session = uploads.create_session(request.user, data.get('filename'), int(data.get('size')))
+        except (ValueError, TypeError, AttributeError, uploads.UploadError) as e:
+            return JsonResponse({
+                'success': False,
+                'message': f'Error starting upload: {str(e)}'
+            }, status=400)
+        
+        return JsonResponse({'success': True, **_upload_session_json(session)}, status=201)
+
+class AdminUploadSessionView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    AJAX view of one upload session: GET its offset, PUT the chunk starting
+    at the Upload-Offset header, DELETE to abandon it
+    """
+    login_url = '/admin/login/'
+    
+    def test_func(self):
+        """Check if user is staff or superuser"""
+        return self.request.user.is_staff or self.request.user.is_superuser
+    
+    def get_session(self, pk):
+        session = uploads.get_session(pk, self.request.user)
+        if session is None:
+            raise Http404('No such upload')
+        return session
+    
+    def get(self, request, pk):
+        return JsonResponse({'success': True, **_upload_session_json(self.get_session(pk))})
+    
+    def put(self, request, pk):
+        """Streams the body to the staging file; the request body is never buffered"""
+        session = self.get_session(pk)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            uploads.write_chunk(
+                session, offset, request, length, checksum=request.headers.get('X-Chunk-SHA256')
+            )
+        except uploads.OffsetMismatch as e:
+            return JsonResponse({
+                'success': False,
+                'message': str(e),
+                **_upload_session_json(session),
+                'offset': e.offset,
+            }, status=409)
+        except (ValueError, KeyError, uploads.UploadError) as e:
+            return JsonResponse({
+                'success': False,
+                'message': f'Error receiving chunk: {str(e)}'
+            }, status=400)
+        
+        return JsonResponse({'success': True, **_upload_session_json(session)})
+    
+    def delete(self, request, pk):
+        session = self.get_session(pk)
+        if session.completed_at is None:
+            uploads.abort(session)
+        return JsonResponse({'success': True})
+
+class AdminUploadFinalizeView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    AJAX view creating the Software row of a fully received upload from the
+    rest of the upload form
+    """
+    login_url = '/admin/login/'
+    
+    def test_func(self):
+        """Check if user is staff or superuser"""
+        return self.request.user.is_staff or self.request.user.is_superuser
+    
+    def post(self, request, pk):
+        session = uploads.get_session(pk, request.user)
+        if session is None:
+            raise Http404('No such upload')
+        form = SoftwareDetailsForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return JsonResponse({
+                'success': False,
+                'message': 'Please correct the errors below and try again.',
+                'errors': form.errors,
+            }, status=400)
+        software = form.save(commit=False)
+        software.uploader = request.user
+        try:
+            uploads.finalize(session, software)
+        except uploads.HashPending as e:
+            # The client posts the form again shortly
+            return JsonResponse({'success': False, 'pending': True, 'message': str(e)}, status=202)
+        except uploads.UploadError as e:
+            return JsonResponse({
+                'success': False,
+                'message': f'Error finishing upload: {str(e)}'
+            }, status=409 if isinstance(e, uploads.OffsetMismatch) else 400)
+        
+        messages.success(request, f'Software "{software.title}" has been uploaded successfully!')
+        return JsonResponse({
+            'success': True,
+            'id': software.pk,
+            'sha256': session.sha256,
+            'redirect': reverse('adminpage:software_list'),
+        })
+
 def get_software_details(request, pk):
     """
     AJAX view to get software details for edit modal
@@ -371,11 +506,25 @@ def get_software_details(request, pk):
             'category': software.category.id if software.category else '',
             'is_active': software.is_active,
             'thumbnail_url': software.thumbnail.url if software.thumbnail else '',
-            'file_name': software.file.name.split('/')[-1] if software.file else '',
+            'file_name': software.download_name if software.file else '',
             'uploader': software.uploader.username,
             'created_at': software.created_at.strftime('%Y-%m-%d %H:%M'),
             'download_count': software.download_count,
+            'download_trend': [
+                {'day': point['day'].isoformat(), 'downloads': point['downloads']}
+                for point in daily_downloads(days=30, software=software)
+            ],
         }
         return JsonResponse(data)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+def get_page_cache_stats(request):
+    """
+    AJAX view with the page cache counters of the worker answering the request
+    """
+    if not (request.user.is_staff or request.user.is_superuser):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    return JsonResponse(page_cache.stats())
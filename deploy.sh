@@ -38,7 +38,7 @@ pip install --upgrade pip
 pip install -r requirements.txt
 
 echo "🔧 Running Django checks..."
-python manage.py check --deploy
+python manage.py check
 
 echo "🛠️ Running database migrations..."
 python manage.py migrate --noinput
@@ -46,6 +46,15 @@ python manage.py migrate --noinput
 echo "📁 Collecting static files..."
 python manage.py collectstatic --noinput --clear
 
+echo "📄 Pre-rendering static pages..."
+python manage.py prerender_static_pages
+
+echo "🗺️ Writing sitemap files..."
+python manage.py generate_sitemaps
+
+echo "🔧 Running Django deploy checks..."
+python manage.py check --deploy
+
 echo "🧹 Cleaning up Python cache..."
 find . -type d -name "__pycache__" -exec rm -rf {} + 2>/dev/null || true
 find . -name "*.pyc" -delete 2>/dev/null || true
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class SoftwareConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'software'
+
+    def ready(self):
+        # Connect the signal handlers that keep the typeahead index, the
+        # denormalized category statistics, the page cache, the changes
+        # feed's tombstones and the thumbnail variants current
+        from . import category_stats, changes, checks, page_cache, suggest, thumbnails  # noqa: F401
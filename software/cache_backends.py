@@ -0,0 +1,75 @@
+"""
+Local-memory cache with a byte budget and eviction counters.
+
+Django's LocMemCache only bounds the number of entries, which says little
+about memory when the entries are rendered pages of very different sizes.
+BoundedLocMemCache also evicts least recently used entries once the pickled
+values exceed OPTIONS['MAX_BYTES'] and counts what it evicted.
+"""
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+
+# Per cache name, shared by every instance like LocMemCache's own storage
+_sizes = {}
+_counters = {}
+
+
+class BoundedLocMemCache(LocMemCache):
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        options = params.get('OPTIONS', {})
+        self._max_bytes = int(options.get('MAX_BYTES') or 0)
+        self._sizes = _sizes.setdefault(name, {})
+        self._counters = _counters.setdefault(name, {'bytes': 0, 'evictions': 0})
+
+    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self._forget(key)
+        super()._set(key, value, timeout)
+        self._sizes[key] = len(value)
+        self._counters['bytes'] += len(value)
+        while self._max_bytes and self._counters['bytes'] > self._max_bytes and len(self._cache) > 1:
+            self._evict()
+
+    def _evict(self):
+        # Entries are moved to the front on access, so the last one is the LRU
+        key, _ = self._cache.popitem()
+        self._expire_info.pop(key, None)
+        self._forget(key)
+        self._counters['evictions'] += 1
+
+    def _cull(self):
+        if self._cull_frequency == 0:
+            self._counters['evictions'] += len(self._cache)
+            self._clear()
+        else:
+            for _ in range(len(self._cache) // self._cull_frequency):
+                self._evict()
+
+    def _forget(self, key):
+        self._counters['bytes'] -= self._sizes.pop(key, 0)
+
+    def _delete(self, key):
+        deleted = super()._delete(key)
+        if deleted:
+            self._forget(key)
+        return deleted
+
+    def _clear(self):
+        self._cache.clear()
+        self._expire_info.clear()
+        self._sizes.clear()
+        self._counters['bytes'] = 0
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._cache),
+                'bytes': self._counters['bytes'],
+                'max_bytes': self._max_bytes or None,
+                'evictions': self._counters['evictions'],
+            }
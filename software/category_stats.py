@@ -0,0 +1,76 @@
+"""
+Denormalized per-category software statistics.
+
+SoftwareCategory.active_software_count and latest_software_update are
+recomputed for the affected categories whenever software is created,
+deleted, toggled or moved to another category.  The category rows are
+locked first so concurrent writers cannot store a stale count.  Bulk
+operations that bypass model signals (queryset.update(), bulk_create) must
+call refresh_category_stats() once for the categories they touched.
+"""
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Software, SoftwareCategory
+
+
+def compute_category_stats(category_ids=None):
+    """Return {category_id: (count, latest_update)} from one grouped query"""
+    software = Software.active.exclude(category_id=None)
+    if category_ids is not None:
+        software = software.filter(category_id__in=category_ids)
+    return {
+        row['category_id']: (row['count'], row['latest'])
+        for row in software.values('category_id').annotate(
+            count=Count('id'), latest=Max('updated_at')
+        ).order_by()
+    }
+
+
+def refresh_category_stats(category_ids=None, batch_size=1000):
+    """
+    Recompute the denormalized fields for the given categories (all when
+    None).  updated_at is left alone so caches keyed on it survive.
+    """
+    if category_ids is not None:
+        category_ids = {pk for pk in category_ids if pk is not None}
+        if not category_ids:
+            return 0
+    with transaction.atomic():
+        categories = SoftwareCategory.objects.select_for_update().order_by('pk')
+        if category_ids is not None:
+            categories = categories.filter(pk__in=category_ids)
+        categories = list(categories.only('pk', 'active_software_count', 'latest_software_update'))
+        stats = compute_category_stats(category_ids)
+        changed = []
+        for category in categories:
+            count, latest = stats.get(category.pk, (0, None))
+            if (category.active_software_count, category.latest_software_update) != (count, latest):
+                category.active_software_count = count
+                category.latest_software_update = latest
+                changed.append(category)
+        SoftwareCategory.objects.bulk_update(
+            changed, ['active_software_count', 'latest_software_update'], batch_size=batch_size
+        )
+    return len(changed)
+
+
+@receiver(pre_save, sender=Software)
+def remember_previous_category(sender, instance, **kwargs):
+    instance._previous_category_id = None
+    if instance.pk:
+        instance._previous_category_id = (
+            Software.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Software)
+def software_saved(sender, instance, **kwargs):
+    refresh_category_stats({instance.category_id, getattr(instance, '_previous_category_id', None)})
+
+
+@receiver(post_delete, sender=Software)
+def software_deleted(sender, instance, **kwargs):
+    refresh_category_stats({instance.category_id})
@@ -0,0 +1,207 @@
+"""
+Incremental catalog feed for mirrors (/api/software/changes/).
+
+The response is NDJSON: one line per SoftwareCategory row, then per
+Software row, then per deletion, each stream in (updated_at, id) order,
+followed by a final ``{"type": "cursor", ...}`` line.  Clients pass that
+cursor back to receive only what changed since; ``since=<ISO datetime>``
+starts from a point in time and no parameter gives a full export.
+
+Inactive rows are sent as tombstones (``"deleted": true``), as are rows
+deleted outright, which are remembered as DeletedRecord rows for
+SOFTWARE_CHANGES_TOMBSTONE_DAYS.  A cursor records the moment the feed that
+issued it was complete up to; once that is older than the retention the
+cursor gets a 410 and the client must start over with a full export.
+Streams with no recent rows do not age a cursor.  Deleting a category sets Software.category to
+NULL without touching updated_at, so mirrors clear category_id themselves
+when they receive a category tombstone.
+
+Rows are read in keyset batches of SOFTWARE_CHANGES_BATCH_SIZE, so memory
+stays flat however large the export.  Rows changed in the last
+SOFTWARE_CHANGES_SAFETY_LAG seconds are held back until the next poll, so a
+transaction committing late with an older updated_at is not skipped.  A
+feed read from a replica holds back SOFTWARE_REPLICA_MAX_LAG seconds more,
+so rows the replica has not replayed yet are not skipped either.
+
+download_count is sent with each row but is not a change of its own: the
+buffered counters (software/counters.py) write it without touching
+updated_at, so a record carries the count as of its last edit and mirrors
+wanting live counts read them from /api/software/.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import router
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .db_router import staleness
+from .models import DeletedRecord, Software, SoftwareCategory
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from .serializers import SOFTWARE_FIELDS, dumps
+
+
+class CursorExpired(Exception):
+    """Raised when a cursor is older than the tombstone retention"""
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def software_record(row):
+    if not row['is_active']:
+        return {'type': 'software', 'id': row['id'], 'deleted': True, 'updated_at': _isoformat(row['updated_at'])}
+    record = {'type': 'software'}
+    for name, (column, convert) in SOFTWARE_FIELDS.items():
+        if name == 'category':
+            continue
+        record[name] = convert(row[column]) if convert is not None else row[column]
+    record['category_id'] = row['category_id']
+    record['updated_at'] = _isoformat(row['updated_at'])
+    return record
+
+
+def category_record(row):
+    if not row['is_active']:
+        return {'type': 'category', 'id': row['id'], 'deleted': True, 'updated_at': _isoformat(row['updated_at'])}
+    return {
+        'type': 'category',
+        'id': row['id'],
+        'name': row['name'],
+        'description': row['description'],
+        'updated_at': _isoformat(row['updated_at']),
+    }
+
+
+def deleted_record(row):
+    return {'type': row['kind'], 'id': row['object_id'], 'deleted': True, 'updated_at': _isoformat(row['deleted_at'])}
+
+
+# name -> (queryset, timestamp column, columns read, record builder)
+STREAMS = {
+    'c': (
+        SoftwareCategory.objects.all(), 'updated_at',
+        ('id', 'name', 'description', 'is_active', 'updated_at'), category_record,
+    ),
+    's': (
+        Software.objects.all(), 'updated_at',
+        tuple({column for column, _ in SOFTWARE_FIELDS.values() if column != 'category__name'})
+        + ('category_id', 'is_active', 'updated_at'),
+        software_record,
+    ),
+    'd': (
+        DeletedRecord.objects.all(), 'deleted_at',
+        ('id', 'kind', 'object_id', 'deleted_at'), deleted_record,
+    ),
+}
+
+
+class ChangeFeed:
+    """
+    Iterable of NDJSON lines (bytes).  ``positions`` maps each stream to
+    the (timestamp, id) of the last row a client has seen, or None.
+    """
+
+    def __init__(self, positions=None, batch_size=None, safety_lag=None):
+        self.positions = dict.fromkeys(STREAMS)
+        self.positions.update(positions or {})
+        self.batch_size = batch_size or settings.SOFTWARE_CHANGES_BATCH_SIZE
+        if safety_lag is None:
+            safety_lag = settings.SOFTWARE_CHANGES_SAFETY_LAG
+        # Every stream is read from the same database
+        self.using = router.db_for_read(Software)
+        self.until = timezone.now() - timedelta(seconds=safety_lag + staleness(self.using))
+        self.count = 0
+
+    @classmethod
+    def from_params(cls, cursor=None, since=None, **kwargs):
+        """Build a feed from the request's cursor= or since= parameter"""
+        complete_until = None
+        if cursor:
+            data = decode_cursor(cursor)
+            payload = data.get('f')
+            if not isinstance(payload, dict):
+                raise InvalidCursor(cursor)
+            positions = {}
+            for stream, position in payload.items():
+                if stream not in STREAMS or not isinstance(position, list) or len(position) != 2:
+                    raise InvalidCursor(cursor)
+                moment = parse_datetime(str(position[0]))
+                if moment is None:
+                    raise InvalidCursor(cursor)
+                positions[stream] = (moment, int(position[1]))
+            if 'u' in data:
+                complete_until = parse_datetime(str(data['u']))
+                if complete_until is None:
+                    raise InvalidCursor(cursor)
+            else:
+                # Cursors issued before 'u' existed: the oldest position
+                complete_until = min((moment for moment, _ in positions.values()), default=None)
+        elif since:
+            moment = parse_datetime(since)
+            if moment is None:
+                raise ValueError('since must be an ISO 8601 datetime')
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment, dt_timezone.utc)
+            positions = dict.fromkeys(STREAMS, (moment, 0))
+            complete_until = moment
+        else:
+            positions = {}
+
+        retention = timedelta(days=settings.SOFTWARE_CHANGES_TOMBSTONE_DAYS)
+        if complete_until is not None and complete_until < timezone.now() - retention:
+            raise CursorExpired()
+        return cls(positions, **kwargs)
+
+    def rows(self, stream):
+        queryset, timestamp, columns, build = STREAMS[stream]
+        queryset = (
+            queryset.using(self.using).filter(**{f'{timestamp}__lt': self.until})
+            .order_by(timestamp, 'id').values(*columns)
+        )
+        while True:
+            batch = queryset
+            position = self.positions[stream]
+            if position is not None:
+                moment, pk = position
+                # One range on (timestamp, id) rather than an OR, which would
+                # make the database sort the batch instead of walking the index
+                batch = batch.filter(**{f'{timestamp}__gte': moment}).exclude(**{timestamp: moment, 'id__lte': pk})
+            rows = list(batch[:self.batch_size])
+            for row in rows:
+                yield build(row)
+            if rows:
+                self.positions[stream] = (rows[-1][timestamp], rows[-1]['id'])
+            if len(rows) < self.batch_size:
+                return
+
+    def cursor(self):
+        # Every row older than self.until has been sent, whatever the positions
+        return encode_cursor({
+            'f': {
+                stream: [position[0].isoformat(), position[1]]
+                for stream, position in self.positions.items()
+                if position is not None
+            },
+            'u': self.until.isoformat(),
+        })
+
+    def __iter__(self):
+        for stream in STREAMS:
+            for record in self.rows(stream):
+                self.count += 1
+                yield dumps(record) + b'\n'
+        yield dumps({'type': 'cursor', 'cursor': self.cursor(), 'count': self.count}) + b'\n'
+
+
+@receiver(post_delete, sender=Software)
+def software_deleted(sender, instance, **kwargs):
+    DeletedRecord.objects.create(kind=DeletedRecord.SOFTWARE, object_id=instance.pk)
+
+
+@receiver(post_delete, sender=SoftwareCategory)
+def category_deleted(sender, instance, **kwargs):
+    DeletedRecord.objects.create(kind=DeletedRecord.CATEGORY, object_id=instance.pk)
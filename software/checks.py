@@ -0,0 +1,83 @@
+"""
+System checks for production settings the catalog pages rely on
+"""
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, Warning, register
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+
+CACHED_LOADER = 'django.template.loaders.cached.Loader'
+
+# Backends whose contents other processes cannot see
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+@register(Tags.templates, deploy=True)
+def check_cached_template_loader(app_configs, **kwargs):
+    """Outside DEBUG every Django template engine must use the cached loader"""
+    if settings.DEBUG:
+        return []
+    warnings = []
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        loaders = [loader[0] if isinstance(loader, (list, tuple)) else loader for loader in engine.engine.loaders]
+        if CACHED_LOADER not in loaders:
+            warnings.append(Warning(
+                f"Template engine '{engine.name}' does not use the cached template loader.",
+                hint=f"Wrap its loaders in '{CACHED_LOADER}' so templates are not re-parsed on every request.",
+                id='software.W001',
+            ))
+    return warnings
+
+
+@register('prerender', deploy=True)
+def check_prerendered_pages(app_configs, **kwargs):
+    """Pre-rendered static pages must match their current templates"""
+    from .prerender import stale_pages
+
+    return [
+        Error(
+            f'The pre-rendered copy of {url} is stale or missing.',
+            hint="Run 'manage.py prerender_static_pages'.",
+            id='software.E002',
+        )
+        for url in stale_pages()
+    ]
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    """
+    Page cache generations, the suggest index version and the dashboard
+    snapshot live in the default cache, and buffered download counts in
+    SOFTWARE_DOWNLOAD_COUNTER_CACHE: both must be shared between workers
+    and the cron commands
+    """
+    errors = []
+    if isinstance(caches[DEFAULT_CACHE_ALIAS], PROCESS_LOCAL_CACHES):
+        errors.append(Error(
+            'The default cache is local to each process.',
+            hint=(
+                'Set SHARED_CACHE in local_settings.py to a Redis or Memcached cache, or page '
+                'invalidations, suggest index updates and dashboard refreshes stay in the worker '
+                'that made them.'
+            ),
+            id='software.E003',
+        ))
+    alias = settings.SOFTWARE_DOWNLOAD_COUNTER_CACHE
+    if isinstance(caches[alias], PROCESS_LOCAL_CACHES + (DatabaseCache,)):
+        errors.append(Error(
+            f"SOFTWARE_DOWNLOAD_COUNTER_CACHE ('{alias}') cannot buffer download counts.",
+            hint=(
+                'Use a shared cache with atomic add and incr/decr (Redis, Memcached): counts buffered in '
+                'a process-local cache never reach flush_download_counts, and the database cache '
+                'loses concurrent increments.'
+            ),
+            id='software.E004',
+        ))
+    return errors
@@ -0,0 +1,191 @@
+"""
+Write-behind download counter.
+
+A download is recorded with an atomic increment in the cache configured by
+SOFTWARE_DOWNLOAD_COUNTER_CACHE.  Pending increments are applied to the
+database later as grouped ``F('download_count') + n`` updates in a single
+transaction, so a popular release no longer takes a row lock per download
+and updated_at/update_date are left alone.  Each download is also kept as a
+DownloadEvent, inserted in batches, for the analytics rollups.
+
+Each process flushes the rows it touched every
+SOFTWARE_DOWNLOAD_COUNTER_FLUSH_INTERVAL seconds and on exit, and
+``manage.py flush_download_counts`` flushes everything that is pending.
+The cache must be shared between processes (memcached, redis) and implement
+incr/decr and add atomically, which the local-memory and database caches do
+not; software.E004 reports one that does not.  Flushers claim a counter
+under a short add() lock rather than relying on decr going negative, which
+memcached clamps at zero.
+
+The DownloadEvent rows are buffered in the process itself and written on
+the same flushes.  A worker that is killed outright loses the events it had
+not written yet (at most SOFTWARE_DOWNLOAD_EVENT_BATCH_SIZE, or the last
+SOFTWARE_DOWNLOAD_COUNTER_FLUSH_INTERVAL seconds' worth); the counts
+themselves are in the cache and survive it.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'software:downloads:'
+# Lifetime of a flusher's claim on one counter, in case it dies holding it
+CLAIM_TIMEOUT = 30  # seconds
+
+
+class DownloadCounter:
+    """
+    Buffer of pending download increments keyed by software id
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._events = []
+        self._last_flush = time.monotonic()
+
+    @property
+    def cache(self):
+        return caches[settings.SOFTWARE_DOWNLOAD_COUNTER_CACHE]
+
+    def key(self, pk):
+        return f'{KEY_PREFIX}{pk}'
+
+    def _add(self, pk, n):
+        key = self.key(pk)
+        for _ in range(2):
+            self.cache.add(key, 0, timeout=None)
+            try:
+                return self.cache.incr(key, n)
+            except ValueError:
+                # Evicted between add() and incr(), try once more
+                continue
+        logger.warning('Could not buffer %s download(s) for software %s', n, pk)
+
+    def incr(self, pk, n=1, category_id=None):
+        """Record n downloads for the given software id"""
+        self._add(pk, n)
+        created_at = timezone.now()
+        with self._lock:
+            self._dirty.add(pk)
+            self._events.extend([(pk, category_id, created_at)] * n)
+            now = time.monotonic()
+            due = (
+                now - self._last_flush >= settings.SOFTWARE_DOWNLOAD_COUNTER_FLUSH_INTERVAL
+                or len(self._events) >= settings.SOFTWARE_DOWNLOAD_EVENT_BATCH_SIZE
+            )
+            if due:
+                self._last_flush = now
+        if due:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Download counter flush failed')
+
+    def pending(self, pks):
+        """Return {pk: n} for the ids that have buffered downloads"""
+        keys = {self.key(pk): pk for pk in pks}
+        values = self.cache.get_many(list(keys))
+        return {keys[key]: value for key, value in values.items() if value and value > 0}
+
+    def _claim(self, pending):
+        """
+        Take the pending amounts out of the cache.  Each counter is read
+        and decremented under a lock, so racing flushers never take the
+        same downloads and ones counted after pending() was read stay put.
+        """
+        claimed = {}
+        for pk in pending:
+            key = self.key(pk)
+            lock = f'{key}:claim'
+            if not self.cache.add(lock, 1, timeout=CLAIM_TIMEOUT):
+                # Another flusher is taking this counter right now
+                continue
+            try:
+                n = self.cache.get(key) or 0
+                if n > 0:
+                    self.cache.decr(key, n)
+                    claimed[pk] = n
+            except ValueError:
+                pass
+            finally:
+                self.cache.delete(lock)
+        return claimed
+
+    def flush_events(self):
+        """Insert the download events buffered by this process"""
+        from .models import DownloadEvent
+
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return 0
+        try:
+            DownloadEvent.objects.bulk_create(
+                [
+                    DownloadEvent(software_id=pk, category_id=category_id, created_at=created_at)
+                    for pk, category_id, created_at in events
+                ],
+                batch_size=settings.SOFTWARE_DOWNLOAD_EVENT_BATCH_SIZE,
+            )
+        except Exception:
+            with self._lock:
+                self._events[:0] = events
+            raise
+        return len(events)
+
+    def flush(self, pks=None):
+        """
+        Apply buffered downloads to the database and return how many were
+        written.  Flushes the ids touched by this process unless pks is given.
+        """
+        from .models import Software
+
+        try:
+            self.flush_events()
+        except Exception:
+            logger.exception('Download event flush failed')
+        if pks is None:
+            with self._lock:
+                pks, self._dirty = self._dirty, set()
+        claimed = self._claim(self.pending(pks))
+        if not claimed:
+            return 0
+
+        groups = defaultdict(list)
+        for pk, n in claimed.items():
+            groups[n].append(pk)
+        try:
+            with transaction.atomic():
+                for n, ids in groups.items():
+                    Software.objects.filter(pk__in=ids).update(
+                        download_count=F('download_count') + n
+                    )
+        except Exception:
+            # Put the increments back so the next flush retries them
+            for pk, n in claimed.items():
+                self._add(pk, n)
+            with self._lock:
+                self._dirty.update(claimed)
+            raise
+        return sum(claimed.values())
+
+
+download_counter = DownloadCounter()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        download_counter.flush()
+    except Exception:
+        logger.exception('Download counter flush on exit failed')
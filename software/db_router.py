@@ -0,0 +1,166 @@
+"""
+Read-replica routing.
+
+Every alias in DATABASES other than ``default`` is a read replica of it
+(settings.py names them replica_1, replica_2, ... from DB_REPLICAS).  Writes
+always go to ``default``; reads go to a random healthy replica, except:
+
+- inside a transaction on ``default``, so select_for_update() and reads
+  that decide a write see the rows they are about to change;
+- while the request is pinned to the primary: requests with an unsafe
+  method, and for SOFTWARE_REPLICA_PIN_SECONDS afterwards every request
+  from the same browser (PrimaryPinningMiddleware sets a cookie), so an
+  editor sees their own changes at once;
+- when no replica is healthy.
+
+A replica is healthy if it answers a lag query and is less than
+SOFTWARE_REPLICA_MAX_LAG seconds behind.  The result is remembered per
+process for SOFTWARE_REPLICA_CHECK_INTERVAL seconds.  Only PostgreSQL
+reports lag; other backends (the SQLite aliases used in development) count
+as up to date.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+PIN_COOKIE = 'use_primary'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+POSTGRESQL_LAG = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+_primary = ContextVar('software_use_primary', default=False)
+
+_lock = threading.Lock()
+_health = {}  # alias -> (checked at, lag in seconds or None when unreachable)
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def pinned():
+    return _primary.get()
+
+
+@contextmanager
+def use_primary():
+    """Send every read in the block to the primary"""
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+def measure_lag(alias):
+    """Seconds the replica is behind, or None if it cannot be reached"""
+    connection = connections[alias]
+    try:
+        if connection.vendor != 'postgresql':
+            connection.ensure_connection()
+            return 0.0
+        with connection.cursor() as cursor:
+            cursor.execute(POSTGRESQL_LAG)
+            return float(cursor.fetchone()[0])
+    except DatabaseError:
+        connection.close()
+        return None
+
+
+def replica_lag(alias):
+    """Lag of a replica as last measured, re-measured when the result is old"""
+    now = time.monotonic()
+    with _lock:
+        checked = _health.get(alias)
+    if checked is not None and now - checked[0] < settings.SOFTWARE_REPLICA_CHECK_INTERVAL:
+        return checked[1]
+    lag = measure_lag(alias)
+    with _lock:
+        _health[alias] = (now, lag)
+    return lag
+
+
+def healthy_replicas():
+    return [
+        alias for alias in replicas()
+        if (lag := replica_lag(alias)) is not None and lag < settings.SOFTWARE_REPLICA_MAX_LAG
+    ]
+
+
+def staleness(alias):
+    """Upper bound, in seconds, on how far reads from ``alias`` may be behind"""
+    return 0 if alias == DEFAULT_DB_ALIAS else settings.SOFTWARE_REPLICA_MAX_LAG
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if pinned() or transaction.get_connection(DEFAULT_DB_ALIAS).in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        candidates = healthy_replicas()
+        return random.choice(candidates) if candidates else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication
+        return db == DEFAULT_DB_ALIAS
+
+
+class PrimaryPinningMiddleware:
+    """Pin writes, and the same browser's requests shortly after, to the primary"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def pin(self, request):
+        return request.method not in SAFE_METHODS or bool(request.COOKIES.get(PIN_COOKIE))
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.SOFTWARE_REPLICA_PIN_SECONDS,
+                secure=request.is_secure(),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replicas():
+            return self.get_response(request)
+        with use_primary() if self.pin(request) else nullcontext():
+            response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        if not replicas():
+            return await self.get_response(request)
+        # Context variables follow the request into sync_to_async() threads
+        with use_primary() if self.pin(request) else nullcontext():
+            response = await self.get_response(request)
+        return self.process_response(request, response)
@@ -0,0 +1,361 @@
+"""
+Download delivery backends for software files.
+
+The download view only authorizes the request and counts it; the configured
+backend decides how the bytes reach the client.  Select one with the
+SOFTWARE_DOWNLOAD_BACKEND setting ('stream', 'accel' or a dotted path).
+The async download view uses the async variant of 'stream'; the 'accel'
+backend sends no body and serves both.
+"""
+import asyncio
+import re
+import secrets
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import (
+    content_disposition_header, http_date, parse_etags, parse_http_date_safe, quote_etag
+)
+from django.utils.module_loading import import_string
+
+RANGE_SPEC_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when none of the requested byte ranges overlap the file"""
+
+
+def parse_range_header(header, size):
+    """
+    Parse a Range header into a sorted list of (start, end) tuples.
+
+    Overlapping and adjacent ranges are coalesced.  Returns None when the
+    header is missing or malformed (the whole file should be sent) and raises
+    RangeNotSatisfiable when no range overlaps the file.
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not specs:
+        return None
+
+    ranges = []
+    for spec in specs.split(','):
+        match = RANGE_SPEC_RE.match(spec)
+        if not match or match.groups() == ('', ''):
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            if start >= size:
+                continue
+            end = int(last) if last else size - 1
+            ranges.append((start, min(end, size - 1)))
+        else:
+            suffix = int(last)
+            if suffix == 0 or size == 0:
+                continue
+            ranges.append((max(0, size - suffix), size - 1))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class BaseDownloadBackend:
+    """
+    Base class for download delivery backends
+    """
+    content_type = 'application/octet-stream'
+
+    def get_filename(self, software):
+        """Return the name the file was uploaded as"""
+        return software.download_name
+
+    def get_size(self, software):
+        try:
+            return software.file.size
+        except FileNotFoundError:
+            raise Http404("File not found")
+
+    def get_etag(self, software):
+        """Strong validator built from the row and the stored file"""
+        return quote_etag(
+            f"{software.pk}-{int(software.update_date.timestamp())}-{self.get_size(software)}"
+        )
+
+    def get_last_modified(self, software):
+        return int(software.update_date.timestamp())
+
+    def set_validators(self, response, software):
+        response['ETag'] = self.get_etag(software)
+        response['Last-Modified'] = http_date(self.get_last_modified(software))
+        return response
+
+    def get_conditional_response(self, request, software):
+        """Return a 304/412 response if the request preconditions say so"""
+        response = get_conditional_response(
+            request,
+            etag=self.get_etag(software),
+            last_modified=self.get_last_modified(software),
+        )
+        if response is not None:
+            self.set_validators(response, software)
+        return response
+
+    def if_range_passes(self, request, software):
+        """Check If-Range; a stale validator means the whole file is sent"""
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range:
+            return True
+        if if_range.startswith(('"', 'W/')):
+            # If-Range requires a strong comparison
+            return parse_etags(if_range) == [self.get_etag(software)]
+        return parse_http_date_safe(if_range) == self.get_last_modified(software)
+
+    def get_ranges(self, request, software):
+        """Return the byte ranges to send, or None for the whole file"""
+        if not self.if_range_passes(request, software):
+            return None
+        ranges = parse_range_header(request.META.get('HTTP_RANGE'), self.get_size(software))
+        if ranges and len(ranges) > settings.SOFTWARE_DOWNLOAD_MAX_RANGES:
+            return None
+        return ranges
+
+    def is_new_download(self, request, software):
+        """
+        Return True unless the request continues a download that was
+        already counted (a range that does not start at the first byte)
+        """
+        if request.method != 'GET':
+            return False
+        try:
+            ranges = self.get_ranges(request, software)
+        except RangeNotSatisfiable:
+            return False
+        return not ranges or ranges[0][0] == 0
+
+    def serve(self, request, software):
+        raise NotImplementedError('Download backends must implement serve()')
+
+
+class StreamingDownloadBackend(BaseDownloadBackend):
+    """
+    Serve the file from the worker in bounded chunks.
+
+    FileResponse hands the open file to wsgi.file_wrapper when the server
+    provides one (uWSGI uses sendfile), otherwise it is read block by block,
+    so worker memory never depends on the file size.  Byte ranges, including
+    multipart/byteranges, are streamed the same way.
+    """
+
+    def open(self, software):
+        try:
+            return software.file.open('rb')
+        except FileNotFoundError:
+            raise Http404("File not found")
+
+    def read_range(self, fileobj, start, end):
+        fileobj.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = fileobj.read(min(settings.SOFTWARE_DOWNLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    def stream_multipart(self, fileobj, parts, boundary):
+        for header, (start, end) in parts:
+            yield header
+            yield from self.read_range(fileobj, start, end)
+            yield b'\r\n'
+        yield f'--{boundary}--\r\n'.encode()
+
+    def build_response(self, request, content, status=200, content_type=None):
+        if request.method == 'HEAD':
+            response = HttpResponse(status=status, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(content, status=status, content_type=content_type)
+        return response
+
+    def whole_file_response(self, software, size):
+        response = FileResponse(
+            self.open(software),
+            content_type=self.content_type,
+        )
+        response.block_size = settings.SOFTWARE_DOWNLOAD_CHUNK_SIZE
+        return response
+
+    def serve(self, request, software):
+        size = self.get_size(software)
+        try:
+            ranges = self.get_ranges(request, software)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        if request.method == 'HEAD' or ranges:
+            fileobj = None if request.method == 'HEAD' else self.open(software)
+            if not ranges:
+                response = HttpResponse(content_type=self.content_type)
+                response['Content-Length'] = size
+            elif len(ranges) == 1:
+                start, end = ranges[0]
+                response = self.build_response(
+                    request,
+                    fileobj and self.read_range(fileobj, start, end),
+                    status=206,
+                    content_type=self.content_type,
+                )
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+                response['Content-Length'] = end - start + 1
+            else:
+                boundary = secrets.token_hex(16)
+                parts = [
+                    (
+                        (
+                            f'--{boundary}\r\n'
+                            f'Content-Type: {self.content_type}\r\n'
+                            f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+                        ).encode(),
+                        (start, end),
+                    )
+                    for start, end in ranges
+                ]
+                response = self.build_response(
+                    request,
+                    fileobj and self.stream_multipart(fileobj, parts, boundary),
+                    status=206,
+                    content_type=f'multipart/byteranges; boundary={boundary}',
+                )
+                response['Content-Length'] = sum(
+                    len(header) + end - start + 1 + 2 for header, (start, end) in parts
+                ) + len(boundary) + 6
+            if fileobj is not None:
+                response._resource_closers.append(fileobj.close)
+        else:
+            response = self.whole_file_response(software, size)
+
+        response['Accept-Ranges'] = 'bytes'
+        response['Content-Disposition'] = content_disposition_header(
+            True, self.get_filename(software)
+        )
+        return self.set_validators(response, software)
+
+
+class AsyncStreamingDownloadBackend(StreamingDownloadBackend):
+    """
+    StreamingDownloadBackend for the async views under ASGI.
+
+    Django's ASGI handler buffers a synchronous iterator in memory before
+    sending it, so the bodies here are async generators that read each chunk
+    in a worker thread.  A slow client then holds a coroutine on the event
+    loop instead of a worker, and serve() itself is meant to be called
+    through sync_to_async() since it stats and opens the file.
+    """
+
+    async def read_range(self, fileobj, start, end):
+        await asyncio.to_thread(fileobj.seek, start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await asyncio.to_thread(
+                fileobj.read, min(settings.SOFTWARE_DOWNLOAD_CHUNK_SIZE, remaining)
+            )
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    async def stream_multipart(self, fileobj, parts, boundary):
+        for header, (start, end) in parts:
+            yield header
+            async for chunk in self.read_range(fileobj, start, end):
+                yield chunk
+            yield b'\r\n'
+        yield f'--{boundary}--\r\n'.encode()
+
+    def whole_file_response(self, software, size):
+        fileobj = self.open(software)
+        response = StreamingHttpResponse(
+            self.read_range(fileobj, 0, size - 1), content_type=self.content_type,
+        )
+        response['Content-Length'] = size
+        response._resource_closers.append(fileobj.close)
+        return response
+
+
+class AccelRedirectDownloadBackend(BaseDownloadBackend):
+    """
+    Hand the transfer over to nginx with X-Accel-Redirect.
+
+    The worker returns an empty response immediately; nginx serves the file
+    from the internal location configured in examples/nginx.example and
+    answers Range, If-Range, HEAD and conditional requests itself.  Clients
+    only ever see nginx's ETag and Last-Modified, which Django cannot check,
+    so a download is counted from the Range start alone and conditional
+    requests are left to nginx and not counted.
+    """
+
+    def get_conditional_response(self, request, software):
+        return None
+
+    def if_range_passes(self, request, software):
+        return True
+
+    def is_new_download(self, request, software):
+        """
+        Return True for a GET from the first byte that is not revalidating
+        a copy the client already has
+        """
+        if request.META.get('HTTP_IF_NONE_MATCH') or request.META.get('HTTP_IF_MODIFIED_SINCE'):
+            return False
+        return super().is_new_download(request, software)
+
+    def get_redirect_path(self, software):
+        prefix = settings.SOFTWARE_DOWNLOAD_ACCEL_PREFIX.rstrip('/')
+        return f"{prefix}/{quote(software.file.name)}"
+
+    def serve(self, request, software):
+        response = HttpResponse(content_type=self.content_type)
+        response['X-Accel-Redirect'] = self.get_redirect_path(software)
+        response['Content-Disposition'] = content_disposition_header(
+            True, self.get_filename(software)
+        )
+        return response
+
+
+DOWNLOAD_BACKENDS = {
+    'stream': StreamingDownloadBackend,
+    'accel': AccelRedirectDownloadBackend,
+}
+
+# Replacements used by the async download view
+ASYNC_DOWNLOAD_BACKENDS = {
+    'stream': AsyncStreamingDownloadBackend,
+}
+
+
+def get_download_backend(asynchronous=False):
+    """Return an instance of the configured download backend"""
+    backend = settings.SOFTWARE_DOWNLOAD_BACKEND
+    backend_class = (
+        (asynchronous and ASYNC_DOWNLOAD_BACKENDS.get(backend))
+        or DOWNLOAD_BACKENDS.get(backend)
+        or import_string(backend)
+    )
+    return backend_class()
@@ -0,0 +1,68 @@
+"""
+Image work of the thumbnail pipeline (software/thumbnails.py).
+
+render() runs in pool worker processes and only needs Pillow: nothing in
+it touches Django.  It returns the encoded variants instead of writing
+them; the parent stores them and records them on the row.
+"""
+import base64
+import io
+
+from PIL import Image, ImageOps
+
+try:
+    import pillow_avif  # noqa: F401  (registers AVIF on Pillow < 11.3)
+except ImportError:
+    pass
+
+PLACEHOLDER_WIDTH = 16
+
+
+def formats():
+    """Variant formats Pillow can write here, smallest files first"""
+    Image.init()
+    return [fmt for fmt in ('avif', 'webp') if fmt.upper() in Image.SAVE]
+
+
+def _scaled(image, width):
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def render(source, widths, quality):
+    """
+    Variants of the image at ``source`` (a path or a file object) at each
+    of ``widths`` narrower than the image, or at its own width when it is
+    narrower than all of them.  Returns {'width', 'height', 'placeholder',
+    'variants': [{'format', 'width', 'height', 'content'}]}.
+    """
+    with Image.open(source) as image:
+        if image.format == 'JPEG':
+            # Decode at a fraction of the size when the variants allow it
+            image.draft('RGB', (max(widths), image.height * max(widths) // image.width))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    targets = sorted({width for width in widths if width < image.width} or {image.width}, reverse=True)
+    variants = []
+    resized = image
+    for width in targets:
+        # Each size is scaled down from the previous one, not the original
+        resized = resized if width == resized.width else _scaled(resized, width)
+        for fmt in formats():
+            buffer = io.BytesIO()
+            resized.save(buffer, fmt.upper(), quality=quality)
+            variants.append({
+                'format': fmt, 'width': resized.width, 'height': resized.height, 'content': buffer.getvalue(),
+            })
+
+    buffer = io.BytesIO()
+    _scaled(resized, PLACEHOLDER_WIDTH).save(buffer, 'WEBP', quality=30)
+    return {
+        'width': image.width,
+        'height': image.height,
+        'placeholder': 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode(),
+        'variants': variants,
+    }
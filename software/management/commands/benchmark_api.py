@@ -0,0 +1,97 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import JsonResponse
+
+from software.models import Software, SoftwareCategory
+from software.serializers import FastJsonResponse, columns, orjson, parse_fields, serialize_rows
+
+
+class Rollback(Exception):
+    pass
+
+
+def model_rows(limit):
+    """The API's previous path: model instances and a dict per row"""
+    data = []
+    for software in Software.active.select_related('category', 'uploader').order_by('-upload_date', '-id')[:limit]:
+        data.append({
+            'id': software.id,
+            'title': software.title,
+            'description': software.description,
+            'version': software.version,
+            'category': software.category.name if software.category else None,
+            'download_count': software.download_count,
+            'upload_date': software.upload_date.isoformat(),
+            'thumbnail': software.thumbnail.url if software.thumbnail else None,
+        })
+    return JsonResponse({'software': data})
+
+
+def values_rows(limit, fields):
+    rows = Software.active.order_by('-upload_date', '-id').values(*columns(fields))[:limit]
+    return FastJsonResponse({'software': serialize_rows(rows, fields)})
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure rows/second serialized by the software API before (model instances + '
+        'JsonResponse) and after (values() projection + fast JSON). The catalog is '
+        'created in a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def seed(self, rows):
+        categories = SoftwareCategory.objects.bulk_create(
+            [SoftwareCategory(name=f'Benchmark category {i}') for i in range(20)]
+        )
+        Software.objects.bulk_create(
+            [
+                Software(
+                    title=f'Benchmark {i}',
+                    description='Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 40,
+                    version='1.0.0',
+                    category=categories[i % len(categories)],
+                    file=f'software_files/benchmark-{i}.bin',
+                    thumbnail=f'software_thumbnails/benchmark-{i}.png',
+                )
+                for i in range(rows)
+            ],
+            batch_size=5000,
+        )
+
+    def rate(self, build, rows, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = build()
+            timings.append(time.perf_counter() - started)
+        json.loads(response.content)  # sanity check
+        return rows / statistics.median(timings), len(response.content)
+
+    def handle(self, *args, **options):
+        limit = options['page_size']
+        repeat = options['repeat']
+        try:
+            with transaction.atomic():
+                self.seed(options['rows'])
+                self.stdout.write(f"JSON encoder: {'orjson' if orjson else 'json'}")
+                self.stdout.write(f"{'path':<34}{'rows/s':>12}{'bytes':>10}")
+                cases = [
+                    ('models + JsonResponse', lambda: model_rows(limit)),
+                    ('values(), all fields', lambda: values_rows(limit, parse_fields(None))),
+                    ('values(), fields=id,title', lambda: values_rows(limit, parse_fields('id,title'))),
+                ]
+                for name, build in cases:
+                    rate, size = self.rate(build, limit, repeat)
+                    self.stdout.write(f'{name:<34}{rate:>12,.0f}{size:>10,}')
+                raise Rollback()
+        except Rollback:
+            pass
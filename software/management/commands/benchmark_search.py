@@ -0,0 +1,98 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from software.models import Software
+from software.search import IcontainsSearchBackend, get_search_backend
+
+WORDS = (
+    'photo editor video player audio converter pdf reader zip archive backup sync '
+    'browser mail client terminal code studio cloud drive password manager antivirus '
+    'screen recorder office suite notes calendar chat messenger torrent download '
+    'font design paint image viewer music game engine database compiler driver'
+).split()
+
+QUERIES = ['photo', 'pdf reader', 'video', 'manager', 'scre', 'driver 2', 'nonexistentword']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare search latency of the full-text backend against the old icontains '
+        'scan on a synthetic catalog. The catalog is created in a transaction that '
+        'is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def vocabulary(self, rng, size=20000):
+        """Real words plus filler so term frequencies look like a real catalog"""
+        letters = 'abcdefghijklmnopqrstuvwxyz'
+        filler = [''.join(rng.choice(letters) for _ in range(rng.randint(4, 10))) for _ in range(size)]
+        return WORDS + filler
+
+    def sentence(self, rng, length):
+        return ' '.join(rng.choice(self.words) for _ in range(length))
+
+    def seed(self, rows, rng):
+        batch = []
+        for i in range(rows):
+            batch.append(Software(
+                title=self.sentence(rng, 3).title(),
+                description=self.sentence(rng, 60),
+                version=f'{rng.randint(0, 9)}.{rng.randint(0, 20)}',
+                file=f'software_files/bench-{i}.bin',
+            ))
+            if len(batch) == 5000:
+                Software.objects.bulk_create(batch)
+                batch = []
+        Software.objects.bulk_create(batch)
+
+    def time_query(self, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.values_list('id', flat=True)[:20])
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        backend = get_search_backend()
+        self.words = self.vocabulary(rng)
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                self.seed(options['rows'], rng)
+                self.stdout.write(
+                    f"Seeded {options['rows']} rows in {time.perf_counter() - started:.1f}s "
+                    f"(backend: {backend.__class__.__name__})"
+                )
+                self.stdout.write(f"{'query':<20}{'icontains ms':>14}{'full-text ms':>14}{'speedup':>10}")
+                base = Software.active.all()
+                for query in QUERIES:
+                    old = base.filter(
+                        Q(title__icontains=query) |
+                        Q(description__icontains=query) |
+                        Q(version__icontains=query)
+                    ).order_by('-upload_date')
+                    old_ms = self.time_query(old, options['repeat'])
+                    new_ms = self.time_query(backend.search(base, query), options['repeat'])
+                    self.stdout.write(
+                        f"{query:<20}{old_ms:>14.2f}{new_ms:>14.2f}{old_ms / max(new_ms, 0.001):>9.1f}x"
+                    )
+                raise Rollback()
+        except Rollback:
+            pass
+        if isinstance(backend, IcontainsSearchBackend):
+            self.stdout.write(self.style.WARNING('No full-text backend for this database'))
@@ -0,0 +1,113 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template import Engine, RequestContext, engines
+from django.test import RequestFactory
+from django.utils import timezone
+
+from software.models import Software, SoftwareCategory
+from software.views import SoftwareListView
+
+LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the render time of software_list.html per request with and without '
+        'the cached template loader and warm {% cache %} fragments. The catalog is '
+        'created in a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=500)
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def seed(self, categories, rows):
+        rng = random.Random(0)
+        categories = SoftwareCategory.objects.bulk_create(
+            [SoftwareCategory(name=f'Benchmark category {i}') for i in range(categories)]
+        )
+        now = timezone.now()
+        Software.objects.bulk_create(
+            [
+                Software(
+                    title=f'Benchmark {i}',
+                    description='Lorem ipsum dolor sit amet ' * 10,
+                    version='1.0',
+                    category=rng.choice(categories),
+                    upload_date=now - timedelta(minutes=i),
+                    file=f'software_files/benchmark-{i}.bin',
+                    thumbnail=f'software_thumbnails/benchmark-{i}.png',
+                )
+                for i in range(rows)
+            ],
+            batch_size=5000,
+        )
+        return categories[len(categories) // 2]
+
+    def engine(self, cached):
+        base = engines['django'].engine
+        return Engine(
+            loaders=[('django.template.loaders.cached.Loader', LOADERS)] if cached else LOADERS,
+            context_processors=base.context_processors,
+            libraries=base.libraries,
+            builtins=base.builtins,
+            debug=False,
+        )
+
+    def context(self, request):
+        view = SoftwareListView()
+        view.setup(request)
+        view.object_list = view.get_queryset()
+        context = view.get_context_data()
+        # Keep database time out of the measurement
+        list(context['categories'])
+        return context
+
+    def measure(self, engine, request, context, repeat, warm_fragments):
+        fragments = caches['template_fragments']
+        engine.get_template(SoftwareListView.template_name)  # compile once for the cached loader
+        timings = []
+        for _ in range(repeat):
+            if not warm_fragments:
+                fragments.clear()
+            started = time.perf_counter()
+            template = engine.get_template(SoftwareListView.template_name)
+            template.render(RequestContext(request, context))
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+        factory = RequestFactory(HTTP_HOST=host)
+        try:
+            with transaction.atomic():
+                category = self.seed(options['categories'], options['rows'])
+                self.stdout.write(f"{'page':<22}{'mode':<34}{'render ms':>10}")
+                for label, query in [('all software', {}), ('one category', {'category': category.pk})]:
+                    request = factory.get('/', query)
+                    context = self.context(request)
+                    for mode, cached, warm in [
+                        ('uncached loader', False, False),
+                        ('cached loader', True, False),
+                        ('cached loader + warm fragments', True, True),
+                    ]:
+                        ms = self.measure(self.engine(cached), request, context, options['repeat'], warm)
+                        self.stdout.write(f'{label:<22}{mode:<34}{ms:>10.2f}')
+                raise Rollback()
+        except Rollback:
+            pass
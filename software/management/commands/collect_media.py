@@ -0,0 +1,97 @@
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from software.db_router import use_primary
+from software.models import Software
+from software.storage import TEMPORARY_PREFIX, is_content_name, is_derived_name, referenced
+
+MEDIA_FIELDS = ('file', 'thumbnail')
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete stored media that no Software row references and that has not been written or reused '
+        'for SOFTWARE_MEDIA_GC_GRACE hours (see software/storage.py), and the files derived from them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=float, help='hours (default: SOFTWARE_MEDIA_GC_GRACE)')
+        parser.add_argument(
+            '--legacy', action='store_true',
+            help='also delete unreferenced files with names that are not content hashes, '
+                 'such as the originals `manage.py migrate_media` leaves behind',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='only report what would be deleted')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def stored_names(self, storage, directory, legacy):
+        """Storage names under ``directory`` worth checking; stale temporaries are deleted on the way"""
+        root = storage.path(directory)
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, storage.path('')).replace(os.sep, '/')
+                if filename.startswith(TEMPORARY_PREFIX):
+                    # Left behind by a crashed write
+                    self.delete(path)
+                elif is_derived_name(name):
+                    continue
+                elif legacy or is_content_name(name):
+                    yield name, path
+
+    def collect_derived(self, storage, directory):
+        """Delete the files derived from blobs that are gone (they sit in the blob's directory)"""
+        for dirpath, dirnames, filenames in os.walk(storage.path(directory)):
+            blobs = {filename.split('.', 1)[0] for filename in filenames if not is_derived_name(filename)}
+            for filename in filenames:
+                if is_derived_name(filename) and filename.split('-', 1)[0] not in blobs:
+                    self.delete(os.path.join(dirpath, filename))
+
+    def delete(self, path):
+        """Delete ``path`` if it is past the grace period, re-checked at the last moment"""
+        try:
+            stat = os.stat(path)
+            if stat.st_mtime >= self.cutoff:
+                return
+            if not self.dry_run:
+                os.unlink(path)
+        except FileNotFoundError:
+            return
+        self.deleted += 1
+        if stat.st_nlink == 1:
+            # Not a link to a blob that stays (see migrate_media)
+            self.freed += stat.st_size
+
+    def handle(self, *args, **options):
+        grace = options['grace'] if options['grace'] is not None else settings.SOFTWARE_MEDIA_GC_GRACE
+        self.cutoff = time.time() - grace * 3600
+        self.dry_run = options['dry_run']
+        self.deleted = self.freed = checked = 0
+
+        seen = set()
+        for field_name in MEDIA_FIELDS:
+            field = Software._meta.get_field(field_name)
+            directory = field.upload_to.rstrip('/')
+            if (field.storage.location, directory) in seen:
+                continue
+            seen.add((field.storage.location, directory))
+            names = self.stored_names(field.storage, directory, options['legacy'])
+            while batch := dict(islice(names, options['batch_size'])):
+                # A reference committed a moment ago must be seen
+                with use_primary():
+                    live = referenced(batch)
+                for name, path in batch.items():
+                    if name not in live:
+                        self.delete(path)
+                checked += len(batch)
+            self.collect_derived(field.storage, directory)
+
+        verb = 'would delete' if self.dry_run else 'deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} stored file(s); {verb} {self.deleted} '
+            f'unreferenced file(s), {self.freed / 1024 ** 2:.1f} MB'
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from software.counters import download_counter
+from software.models import Software
+
+
+class Command(BaseCommand):
+    help = 'Apply buffered download counts to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of software ids looked up in the cache at once',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        batch = []
+        for pk in Software.objects.values_list('pk', flat=True).iterator(chunk_size=batch_size):
+            batch.append(pk)
+            if len(batch) >= batch_size:
+                total += download_counter.flush(batch)
+                batch = []
+        if batch:
+            total += download_counter.flush(batch)
+        total += download_counter.flush()
+
+        self.stdout.write(self.style.SUCCESS(f'Flushed {total} buffered download(s)'))
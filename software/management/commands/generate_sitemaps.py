@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from software.sitemap_writer import SitemapWriter
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the sitemap index and gzipped section files to SOFTWARE_SITEMAP_ROOT, '
+        'regenerating only the sections whose rows changed since the last run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Rewrite every section (picks up priority changes from download counts)',
+        )
+
+    def handle(self, *args, **options):
+        writer = SitemapWriter(full=options['full']).run()
+        for filename in writer.written:
+            self.stdout.write(f'wrote   {filename}')
+        for filename in writer.removed:
+            self.stdout.write(f'removed {filename}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(writer.written)} section(s) written, {len(writer.unchanged)} unchanged, '
+            f'{len(writer.removed)} removed'
+        ))
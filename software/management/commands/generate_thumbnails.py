@@ -0,0 +1,68 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from software import imaging
+from software.models import Software
+from software.storage import is_content_name
+from software.thumbnails import render_args, store
+
+
+class Command(BaseCommand):
+    help = (
+        'Render the resized thumbnail variants (see software/thumbnails.py) of every row that has none '
+        'for its current thumbnail, in parallel.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--force', action='store_true', help='render rows that have variants too')
+
+    def pending(self, batch_size, force):
+        """Batches of (pk, thumbnail, category_id) to render, by keyset on the id"""
+        last = 0
+        while True:
+            rows = list(
+                Software.objects.filter(pk__gt=last).exclude(thumbnail__isnull=True).exclude(thumbnail='')
+                .order_by('pk').values_list('pk', 'thumbnail', 'category_id', 'thumbnail_variants')[:batch_size]
+            )
+            if not rows:
+                return
+            last = rows[-1][0]
+            batch = []
+            for pk, name, category_id, variants in rows:
+                if not is_content_name(name):
+                    self.legacy += 1
+                elif force or (variants or {}).get('source') != name:
+                    batch.append((pk, name, category_id))
+            if batch:
+                yield batch
+
+    def handle(self, *args, **options):
+        self.legacy = rendered = failed = 0
+        started = time.monotonic()
+        # Children are forked: they must not share this process's connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            for batch in self.pending(options['batch_size'], options['force']):
+                futures = [
+                    (row, pool.submit(imaging.render, *render_args(row[1]))) for row in batch
+                ]
+                for (pk, name, category_id), future in futures:
+                    try:
+                        rendered += store(pk, name, category_id, future.result())
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f'software {pk}: {e}')
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'{rendered} rendered, {rendered / elapsed:.1f}/s')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered variants of {rendered} thumbnail(s) in {time.monotonic() - started:.1f}s'
+            + (f'; {failed} failed' if failed else '')
+            + (f'; skipped {self.legacy} not yet moved by `manage.py migrate_media`' if self.legacy else '')
+        ))
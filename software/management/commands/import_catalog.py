@@ -0,0 +1,393 @@
+import csv
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from AdminPage import dashboard
+from software import page_cache
+from software.category_stats import refresh_category_stats
+from software.models import Software, SoftwareCategory
+from software.storage import TEMPORARY_PREFIX, content_name
+from software.suggest import CATEGORY, SOFTWARE, suggest_index
+
+CHUNK_SIZE = 1024 * 1024
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'off', ''}
+
+# Model field -> directory imported files go to (the field's upload_to)
+FILE_FIELDS = {
+    'file': 'software_files',
+    'thumbnail': 'software_thumbnails',
+}
+
+
+def ingest_file(task):
+    """
+    Copy one file into the storage directory, hashing and measuring it on
+    the way (runs in a pool worker).  The name is the content-addressed name
+    of software/storage.py, so a file that is already stored, by an upload
+    or an interrupted run, is not copied again.  With root None the file is
+    only read, and with measure_only only stat()-ed.
+    Returns {'name', 'size', 'sha256', 'copied'} or {'error'}.
+    """
+    source, directory, filename, root, measure_only = task
+    try:
+        if measure_only:
+            size = os.stat(source).st_size
+            if not os.access(source, os.R_OK):
+                raise PermissionError(13, 'Permission denied')
+            return {'name': None, 'size': size, 'sha256': None, 'copied': 0}
+        digest = hashlib.sha256()
+        size = 0
+        temporary = None
+        with open(source, 'rb') as src:
+            if root is not None:
+                os.makedirs(os.path.join(root, directory), exist_ok=True)
+                temporary = tempfile.NamedTemporaryFile(dir=os.path.join(root, directory), prefix=TEMPORARY_PREFIX, delete=False)
+            try:
+                while chunk := src.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    if temporary is not None:
+                        temporary.write(chunk)
+            finally:
+                if temporary is not None:
+                    temporary.close()
+        sha256 = digest.hexdigest()
+        name = content_name(directory, sha256, filename)
+        copied = 0
+        if temporary is not None:
+            target = os.path.join(root, name)
+            if os.path.exists(target):
+                os.unlink(temporary.name)
+                os.utime(target)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(temporary.name, target)
+                copied = size
+        return {'name': name, 'size': size, 'sha256': sha256, 'copied': copied}
+    except OSError as e:
+        return {'error': f'{source}: {e.strerror or e}'}
+
+
+def parse_bool(value, default):
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f'not a boolean: {value!r}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Import software from a CSV or JSONL manifest (columns: title, file, and '
+        'optionally description, version, category, thumbnail, uploader, is_active, '
+        'upload_date). Categories are resolved or created by name in bulk, rows are '
+        'inserted with bulk_create in batches, and the referenced files are copied, '
+        'hashed and measured by a process pool. An interrupted import resumes from '
+        'its state file; --dry-run only validates.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifest')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='default: from the file extension')
+        parser.add_argument('--source-dir', help='directory relative file paths are resolved against (default: the manifest\'s)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--uploader', help='username for rows without an uploader column')
+        parser.add_argument('--inactive', action='store_true', help='import rows without is_active as pending review')
+        parser.add_argument('--state', help='resume state file (default: <manifest>.import-state)')
+        parser.add_argument('--restart', action='store_true', help='ignore the state file and start from the first row')
+        parser.add_argument('--dry-run', action='store_true', help='validate rows and files without writing anything')
+
+    # Manifest
+
+    def read_manifest(self, path, fmt):
+        """(line number, row dict) for every data row"""
+        with open(path, newline='', encoding='utf-8') as f:
+            if fmt == 'csv':
+                reader = csv.DictReader(f)
+                for row in reader:
+                    yield reader.line_num, row
+                return
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    row = e
+                yield number, row
+
+    def manifest_digest(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def clean(self, row):
+        """Validated values of a manifest row; raises ValueError"""
+        if isinstance(row, ValueError):
+            raise ValueError(f'invalid JSON: {row}')
+        if not isinstance(row, dict):
+            raise ValueError(f'not an object: {row!r}')
+        row = {key.strip().lower(): value for key, value in row.items() if key}
+        title = str(row.get('title') or '').strip()
+        if not title:
+            raise ValueError('title is required')
+        if len(title) > Software._meta.get_field('title').max_length:
+            raise ValueError('title is too long')
+        version = str(row.get('version') or '').strip() or Software._meta.get_field('version').default
+        if len(version) > Software._meta.get_field('version').max_length:
+            raise ValueError('version is too long')
+        category = str(row.get('category') or '').strip()
+        if len(category) > SoftwareCategory._meta.get_field('name').max_length:
+            raise ValueError('category name is too long')
+        files = {}
+        for field in FILE_FIELDS:
+            path = str(row.get(field) or '').strip()
+            if path:
+                files[field] = path if os.path.isabs(path) else os.path.join(self.source_dir, path)
+        if 'file' not in files:
+            raise ValueError('file is required')
+        upload_date = None
+        if row.get('upload_date'):
+            upload_date = parse_datetime(str(row['upload_date']).strip())
+            if upload_date is None:
+                raise ValueError(f"not a date: {row['upload_date']!r}")
+            if timezone.is_naive(upload_date):
+                upload_date = timezone.make_aware(upload_date)
+        return {
+            'title': title,
+            'description': str(row.get('description') or ''),
+            'version': version,
+            'category': category,
+            'uploader': str(row.get('uploader') or '').strip() or self.default_uploader,
+            'is_active': parse_bool(row.get('is_active'), not self.inactive),
+            'upload_date': upload_date,
+            'files': files,
+        }
+
+    # Batches
+
+    def ingest(self, rows, storage_root, measure_only):
+        """Run the file tasks of the rows through the pool and attach the results"""
+        tasks, owners = [], []
+        for row in rows:
+            for field, source in row['files'].items():
+                tasks.append((source, FILE_FIELDS[field], os.path.basename(source), storage_root.get(field), measure_only))
+                owners.append((row, field))
+        chunksize = max(1, len(tasks) // (self.workers * 4))
+        for (row, field), result in zip(owners, self.pool.map(ingest_file, tasks, chunksize=chunksize)):
+            if 'error' in result:
+                row.setdefault('errors', []).append(result['error'])
+                continue
+            self.bytes_read += result['size']
+            self.bytes_copied += result['copied']
+            if result['name'] is not None and storage_root.get(field) is None:
+                # Storage without local paths: upload from this process
+                storage = Software._meta.get_field(field).storage
+                if not storage.exists(result['name']):
+                    with open(row['files'][field], 'rb') as f:
+                        storage.save(result['name'], File(f))
+                    self.bytes_copied += result['size']
+            row[field] = result['name']
+
+    def resolve(self, rows, model, key):
+        """({name: pk}, names not found) for the category or uploader names of the rows"""
+        names = {row[key] for row in rows if row[key]}
+        field = 'name' if model is SoftwareCategory else 'username'
+        found = {}
+        # The oldest row wins when category names repeat
+        for pk, name in model.objects.filter(**{f'{field}__in': names}).order_by('-pk').values_list('pk', field):
+            found[name] = pk
+        return found, names - found.keys()
+
+    def already_imported(self, rows):
+        """Rows of a batch that an interrupted run committed before saving its state"""
+        # Stored names are shared by identical files: match the row too
+        names = {row['file'] for row in rows}
+        existing = set(Software.objects.filter(file__in=names).values_list('file', 'title', 'version'))
+        return [row for row in rows if (row['file'], row['title'], row['version']) not in existing]
+
+    def save(self, rows, categories, new_categories, uploaders):
+        with transaction.atomic():
+            created_categories = []
+            if new_categories:
+                created_categories = SoftwareCategory.objects.bulk_create(
+                    [SoftwareCategory(name=name) for name in sorted(new_categories)]
+                )
+                if not all(category.pk for category in created_categories):
+                    # Backends that do not return ids from bulk inserts
+                    created_categories = list(SoftwareCategory.objects.filter(name__in=new_categories))
+                categories.update((category.name, category.pk) for category in created_categories)
+            software = Software.objects.bulk_create([
+                Software(
+                    title=row['title'],
+                    description=row['description'],
+                    version=row['version'],
+                    category_id=categories.get(row['category']),
+                    uploader_id=uploaders.get(row['uploader']),
+                    is_active=row['is_active'],
+                    upload_date=row['upload_date'] or timezone.now(),
+                    file=row['file'],
+                    file_name=os.path.basename(row['files']['file'])[:255],
+                    thumbnail=row.get('thumbnail'),
+                )
+                for row in rows
+            ])
+            # bulk_create sends no signals: do what their receivers would, once
+            category_ids = {item.category_id for item in software if item.category_id}
+            refresh_category_stats(category_ids)
+            transaction.on_commit(lambda: self.invalidate(software, category_ids, created_categories))
+
+    def invalidate(self, software, category_ids, categories):
+        page_cache.bump_many(['catalog', 'categories', *(f'category:{pk}' for pk in category_ids)])
+        if categories:
+            suggest_index.changed_many(CATEGORY, [(category.pk, category.name, True, 0) for category in categories])
+        suggest_index.changed_many(SOFTWARE, [
+            (item.pk, item.title, item.is_active, 0) for item in software if item.pk is not None
+        ])
+
+    def write_state(self, rows_done):
+        temporary = f'{self.state_path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'manifest': self.digest, 'rows_done': rows_done}, f)
+        os.replace(temporary, self.state_path)
+
+    # Command
+
+    def storage_roots(self):
+        """Local directory of each file field's storage, None when it has none"""
+        roots = {}
+        for field in FILE_FIELDS:
+            try:
+                roots[field] = Software._meta.get_field(field).storage.path('')
+            except NotImplementedError:
+                roots[field] = None
+        return roots
+
+    def handle(self, *args, **options):
+        path = options['manifest']
+        if not os.path.isfile(path):
+            raise CommandError(f'No such manifest: {path}')
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        self.source_dir = options['source_dir'] or os.path.dirname(os.path.abspath(path))
+        self.default_uploader = options['uploader'] or ''
+        self.inactive = options['inactive']
+        self.workers = max(options['workers'], 1)
+        dry_run = options['dry_run']
+        batch_size = max(options['batch_size'], 1)
+        if self.default_uploader and not User.objects.filter(username=self.default_uploader).exists():
+            raise CommandError(f'No such user: {self.default_uploader}')
+
+        self.digest = self.manifest_digest(path)
+        self.state_path = options['state'] or f'{path}.import-state'
+        skip = 0
+        if not dry_run and not options['restart'] and os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                state = json.load(f)
+            if state.get('manifest') != self.digest:
+                raise CommandError(
+                    f'{self.state_path} belongs to a different version of the manifest; '
+                    'pass --restart to import it from the start'
+                )
+            skip = state['rows_done']
+            self.stdout.write(f'Resuming after row {skip}')
+
+        self.bytes_read = self.bytes_copied = 0
+        imported = invalid = 0
+        new_categories = set()
+        unknown_users = set()
+        storage_root = {} if dry_run else self.storage_roots()
+        rows_done = skip
+        verify_first = skip > 0
+        started = time.monotonic()
+
+        # Children are forked: they must not share this process's connections
+        connections.close_all()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as self.pool:
+                manifest = islice(self.read_manifest(path, fmt), skip, None)
+                while batch := list(islice(manifest, batch_size)):
+                    rows = []
+                    for number, raw in batch:
+                        try:
+                            rows.append(dict(self.clean(raw), line=number))
+                        except (ValueError, TypeError, AttributeError) as e:
+                            invalid += 1
+                            self.stderr.write(f'line {number}: {e}')
+                    self.ingest(rows, storage_root, measure_only=dry_run)
+                    for row in rows:
+                        if row.get('errors'):
+                            invalid += 1
+                            self.stderr.write(f"line {row['line']}: {'; '.join(row['errors'])}")
+                    rows = [row for row in rows if not row.get('errors')]
+
+                    categories, missing = self.resolve(rows, SoftwareCategory, 'category')
+                    uploaders, unknown = self.resolve(rows, User, 'uploader')
+                    new_categories |= missing
+                    unknown_users |= unknown
+                    if not dry_run:
+                        if verify_first:
+                            rows = self.already_imported(rows)
+                            verify_first = False
+                        if rows:
+                            self.save(rows, categories, missing, uploaders)
+                        self.write_state(rows_done + len(batch))
+                    rows_done += len(batch)
+                    imported += len(rows)
+
+                    elapsed = max(time.monotonic() - started, 1e-9)
+                    self.stdout.write(
+                        f'{rows_done} rows, {imported / elapsed:.0f} rows/s, '
+                        f'{self.bytes_read / elapsed / 2 ** 20:.1f} MB/s'
+                    )
+        except KeyboardInterrupt:
+            if dry_run:
+                raise CommandError(f'Interrupted after row {rows_done}')
+            raise CommandError(f'Interrupted after row {rows_done}; run the command again to resume')
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        verb = 'Validated' if dry_run else 'Imported'
+        self.stdout.write(
+            f'{verb} {imported} rows in {elapsed:.1f}s ({imported / elapsed:.0f} rows/s); '
+            f'{"measured" if dry_run else "read"} {self.bytes_read / 2 ** 20:.1f} MB ({self.bytes_read / elapsed / 2 ** 20:.1f} MB/s), '
+            f'copied {self.bytes_copied / 2 ** 20:.1f} MB'
+        )
+        if new_categories:
+            would = 'would be ' if dry_run else ''
+            self.stdout.write(f'{len(new_categories)} categories {would}created: {", ".join(sorted(new_categories))}')
+        if unknown_users:
+            self.stdout.write(self.style.WARNING(
+                f'Unknown uploaders imported without one: {", ".join(sorted(unknown_users))}'
+            ))
+        if not dry_run and imported:
+            dashboard.invalidate()
+        if invalid:
+            message = f'{invalid} invalid rows {"found" if dry_run else "skipped"}'
+            if dry_run:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        elif dry_run:
+            self.stdout.write(self.style.SUCCESS('Manifest is valid'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Import complete'))
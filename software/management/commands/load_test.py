@@ -0,0 +1,103 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+
+class Command(BaseCommand):
+    help = (
+        'Open many concurrent connections to a running server and read every '
+        'response slowly, like clients on poor links, to compare how many '
+        'connections the WSGI (uWSGI) and ASGI (gunicorn + uvicorn) setups hold '
+        'at once. Run it against a download or API URL of each deployment, e.g. '
+        '`manage.py load_test http://127.0.0.1:8000/software/1/download/`.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url')
+        parser.add_argument('--connections', type=int, default=500)
+        parser.add_argument('--read-rate', type=int, default=32 * 1024, help='bytes/second per client')
+        parser.add_argument('--duration', type=float, default=10, help='seconds each client keeps reading')
+        parser.add_argument('--timeout', type=float, default=5, help='seconds to wait for response headers')
+
+    async def client(self, url, options, started):
+        host, port = url.hostname, url.port or 80
+        path = url.path or '/'
+        if url.query:
+            path += f'?{url.query}'
+        result = {'ttfb': None, 'bytes': 0, 'error': None}
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), options['timeout'])
+            writer.write(
+                f'GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\nConnection: close\r\n\r\n'.encode()
+            )
+            await writer.drain()
+            status = await asyncio.wait_for(reader.readline(), options['timeout'])
+            result['ttfb'] = time.monotonic() - started
+            if not status.startswith(b'HTTP/1.1 2') and not status.startswith(b'HTTP/1.0 2'):
+                result['error'] = status.decode(errors='replace').strip() or 'no response'
+                return result
+            while (await reader.readline()) not in (b'\r\n', b''):
+                pass
+            # Read slowly until the duration is up or the body ends
+            step = 0.1
+            until = time.monotonic() + options['duration']
+            while time.monotonic() < until:
+                chunk = await reader.read(max(int(options['read_rate'] * step), 1))
+                if not chunk:
+                    break
+                result['bytes'] += len(chunk)
+                await asyncio.sleep(step)
+        except (OSError, asyncio.TimeoutError) as e:
+            result['error'] = type(e).__name__
+        finally:
+            if writer is not None:
+                writer.close()
+        return result
+
+    async def run(self, url, options):
+        started = time.monotonic()
+        return await asyncio.gather(*[
+            self.client(url, options, started) for _ in range(options['connections'])
+        ])
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Give a plain http:// URL (test the app server, not nginx with TLS)')
+        if resource is not None:
+            soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+            wanted = options['connections'] + 100
+            if soft < wanted:
+                resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+        started = time.monotonic()
+        results = asyncio.run(self.run(url, options))
+        elapsed = time.monotonic() - started
+
+        served = [result for result in results if result['error'] is None]
+        ttfb = sorted(result['ttfb'] for result in served)
+        # Connections that were answered while everyone else was still reading
+        concurrent = sum(1 for value in ttfb if value < options['timeout'])
+        errors = {}
+        for result in results:
+            if result['error'] is not None:
+                errors[result['error']] = errors.get(result['error'], 0) + 1
+
+        self.stdout.write(f"{options['connections']} connections in {elapsed:.1f}s")
+        self.stdout.write(f"answered          {len(served)}")
+        self.stdout.write(f"answered < {options['timeout']:g}s    {concurrent}")
+        if ttfb:
+            p95 = ttfb[min(len(ttfb) - 1, int(len(ttfb) * 0.95))]
+            self.stdout.write(f"first byte        median {statistics.median(ttfb):.3f}s, p95 {p95:.3f}s")
+        self.stdout.write(f"bytes read        {sum(result['bytes'] for result in results)}")
+        for error, count in sorted(errors.items()):
+            self.stdout.write(f"failed            {count} x {error}")
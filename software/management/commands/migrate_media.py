@@ -0,0 +1,84 @@
+import hashlib
+import os
+
+from django.core.management.base import BaseCommand
+
+from software import page_cache
+from software.models import Software
+from software.storage import is_content_name
+
+CHUNK_SIZE = 1024 * 1024
+MEDIA_FIELDS = ('file', 'thumbnail')
+
+
+class Command(BaseCommand):
+    help = (
+        'Move stored software files and thumbnails to content-addressed names (see software/storage.py) '
+        'while the site keeps serving them. Originals stay in place; delete them afterwards with '
+        '`manage.py collect_media --legacy`.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='only count the files to move')
+
+    def digest(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(CHUNK_SIZE):
+                digest.update(chunk)
+                self.bytes_hashed += len(chunk)
+        return digest.hexdigest()
+
+    def migrate(self, field_name, pk, name, file_name, dry_run):
+        """Link one row's file in under its content name and repoint the row; True if it moved"""
+        storage = Software._meta.get_field(field_name).storage
+        if dry_run:
+            return os.path.exists(storage.path(name))
+        path = storage.path(name)
+        try:
+            digest = self.digest(path)
+        except FileNotFoundError:
+            self.missing += 1
+            return False
+        new_name = storage.adopt(path, name, digest)
+        values = {field_name: new_name}
+        if field_name == 'file' and not file_name:
+            values['file_name'] = os.path.basename(name)[:255]
+        # The row may have been given another file meanwhile: leave it alone then
+        return Software.objects.filter(pk=pk, **{field_name: name}).update(**values) == 1
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        self.bytes_hashed = self.missing = 0
+        moved = 0
+        for field_name in MEDIA_FIELDS:
+            last = 0
+            while True:
+                rows = list(
+                    Software.objects.filter(pk__gt=last).exclude(**{f'{field_name}__isnull': True})
+                    .exclude(**{field_name: ''}).order_by('pk')
+                    .values_list('pk', field_name, 'file_name', 'category_id')[:options['batch_size']]
+                )
+                if not rows:
+                    break
+                last = rows[-1][0]
+                changed = [
+                    (pk, category_id) for pk, name, file_name, category_id in rows
+                    if not is_content_name(name) and self.migrate(field_name, pk, name, file_name, dry_run)
+                ]
+                moved += len(changed)
+                if changed and not dry_run:
+                    # Pages link thumbnails by name
+                    page_cache.bump_many([
+                        'catalog',
+                        *(f'software:{pk}' for pk, _ in changed),
+                        *{f'category:{category_id}' for _, category_id in changed if category_id},
+                    ])
+                self.stdout.write(f'{field_name}: up to id {last}, {moved} moved')
+
+        verb = 'Would move' if dry_run else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {moved} file(s), hashed {self.bytes_hashed / 1024 ** 2:.1f} MB'
+            + (f'; {self.missing} file(s) missing from storage' if self.missing else '')
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from software.prerender import brotli, prerender_pages, stale_pages
+
+
+class Command(BaseCommand):
+    help = (
+        'Render the static pages (privacy policy, terms, about, robots.txt, '
+        'ads.txt) to SOFTWARE_PRERENDER_ROOT with gzip/brotli variants for nginx'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report stale pages and exit with an error if there are any',
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            stale = stale_pages()
+            if stale:
+                raise CommandError(f'Stale pre-rendered pages: {", ".join(stale)}')
+            self.stdout.write(self.style.SUCCESS('Pre-rendered pages are up to date'))
+            return
+
+        try:
+            written = prerender_pages()
+        except ValueError as e:
+            raise CommandError(str(e))
+        for url, paths in written.items():
+            self.stdout.write(f'{url} -> {paths[0]}')
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('brotli is not installed, only gzip variants were written'))
+        self.stdout.write(self.style.SUCCESS(f'Pre-rendered {len(written)} page(s)'))
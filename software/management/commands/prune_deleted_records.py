@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from software.models import DeletedRecord
+
+
+class Command(BaseCommand):
+    help = 'Delete changes-feed tombstones older than SOFTWARE_CHANGES_TOMBSTONE_DAYS'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.SOFTWARE_CHANGES_TOMBSTONE_DAYS)
+        deleted, _ = DeletedRecord.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} tombstone(s)'))
@@ -0,0 +1,29 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from software.models import UploadSession
+from software.uploads import abort, expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete upload sessions idle for SOFTWARE_UPLOAD_SESSION_TTL hours and stray staging files'
+
+    def handle(self, *args, **options):
+        pruned = 0
+        for session in expired_sessions().iterator():
+            abort(session)
+            pruned += 1
+
+        stray = 0
+        staging = settings.SOFTWARE_UPLOAD_STAGING_DIR
+        if os.path.isdir(staging):
+            names = {entry.name for entry in os.scandir(staging) if entry.name.endswith('.part')}
+            open_ids = {
+                f'{pk}.part' for pk in UploadSession.objects.filter(completed_at__isnull=True).values_list('pk', flat=True)
+            }
+            for name in names - open_ids:
+                os.remove(os.path.join(staging, name))
+                stray += 1
+        self.stdout.write(self.style.SUCCESS(f'Pruned {pruned} upload session(s) and {stray} stray staging file(s)'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from software.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Recreate the full-text search index and its triggers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        backend = get_search_backend(using)
+        with connections[using].schema_editor() as schema_editor:
+            backend.rebuild(schema_editor)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt search index with {backend.__class__.__name__}'
+        ))
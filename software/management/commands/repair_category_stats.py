@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from software.category_stats import refresh_category_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute SoftwareCategory.active_software_count and latest_software_update '
+        'from one grouped query. Run after bulk changes that bypass model signals.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        changed = refresh_category_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Updated statistics for {changed} categor{"y" if changed == 1 else "ies"}'))
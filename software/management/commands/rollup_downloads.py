@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from software.counters import download_counter
+from software.rollups import rollup_downloads
+
+
+class Command(BaseCommand):
+    help = 'Compact new download events into the hourly and daily rollup tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100000,
+            help='Number of event ids aggregated per transaction',
+        )
+        parser.add_argument(
+            '--delete-events', action='store_true',
+            help='Delete raw events once they are folded into the rollups',
+        )
+        parser.add_argument(
+            '--safety-lag', type=int, default=None,
+            help='Seconds an event id must have been visible before it is folded '
+                 '(default: SOFTWARE_ROLLUP_SAFETY_LAG)',
+        )
+
+    def handle(self, *args, **options):
+        download_counter.flush_events()
+        started = time.monotonic()
+        processed = rollup_downloads(
+            batch_size=options['batch_size'],
+            delete_events=options['delete_events'],
+            safety_lag=options['safety_lag'],
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {processed} download event(s) in {elapsed:.1f}s'
+        ))
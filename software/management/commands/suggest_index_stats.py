@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from software.suggest import suggest_index
+
+
+class Command(BaseCommand):
+    help = 'Build the typeahead index the way a worker does and report its size'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        index = suggest_index.build()
+        elapsed = (time.monotonic() - started) * 1000
+        self.stdout.write(f'Entries:       {len(index)}')
+        self.stdout.write(f'Prefix keys:   {len(index.prefixes[0])}')
+        self.stdout.write(f'Trigrams:      {len(index.grams)}')
+        self.stdout.write(f'Memory:        ~{index.memory_usage() / 1024:.0f} KiB per worker')
+        self.stdout.write(f'Build time:    {elapsed:.0f} ms')
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.20 on 2026-10-17 07:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('software', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DownloadRollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DownloadEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('category', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='software.softwarecategory')),
+                ('software', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='software.software')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DownloadRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('downloads', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='download_rollups', to='software.softwarecategory')),
+                ('software', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='download_rollups', to='software.software')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'software', 'bucket'], name='rollup_software_bucket_idx'), models.Index(fields=['granularity', 'category', 'bucket'], name='rollup_category_bucket_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='downloadrollup',
+            constraint=models.UniqueConstraint(fields=('granularity', 'bucket', 'software', 'category'), name='unique_download_rollup_bucket'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from software.search import SEARCH_BACKENDS
+
+    backend = SEARCH_BACKENDS.get(schema_editor.connection.vendor)
+    if backend:
+        backend().install(schema_editor)
+
+
+def uninstall_search_index(apps, schema_editor):
+    from software.search import SEARCH_BACKENDS
+
+    backend = SEARCH_BACKENDS.get(schema_editor.connection.vendor)
+    if backend:
+        backend().uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('software', '0002_download_events'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
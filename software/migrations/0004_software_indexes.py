@@ -0,0 +1,41 @@
+# Generated by Django 4.2.20 on 2026-10-17 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('software', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-upload_date', '-id'], name='software_active_upload_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', '-upload_date', '-id'], name='software_cat_upload_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-download_count'], name='software_active_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at'], name='software_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['-created_at'], name='software_pending_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', '-updated_at'], name='software_cat_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(fields=['updated_at'], name='software_updated_idx'),
+        ),
+    ]
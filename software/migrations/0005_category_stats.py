@@ -0,0 +1,46 @@
+# Generated by Django 4.2.20 on 2026-10-17 07:43
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_category_stats(apps, schema_editor):
+    Software = apps.get_model('software', 'Software')
+    SoftwareCategory = apps.get_model('software', 'SoftwareCategory')
+    stats = {
+        row['category_id']: row
+        for row in Software.objects.filter(is_active=True, category__isnull=False)
+        .values('category_id').annotate(count=Count('id'), latest=Max('updated_at')).order_by()
+    }
+    categories = list(SoftwareCategory.objects.filter(pk__in=stats))
+    for category in categories:
+        category.active_software_count = stats[category.pk]['count']
+        category.latest_software_update = stats[category.pk]['latest']
+    SoftwareCategory.objects.bulk_update(
+        categories, ['active_software_count', 'latest_software_update'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('software', '0004_software_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='softwarecategory',
+            name='active_software_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='softwarecategory',
+            name='latest_software_update',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='softwarecategory',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-active_software_count'], name='category_active_count_idx'),
+        ),
+        migrations.RunPython(backfill_category_stats, migrations.RunPython.noop),
+    ]
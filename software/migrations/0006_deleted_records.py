@@ -0,0 +1,35 @@
+# Generated by Django 4.2.20 on 2026-10-17 07:55
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('software', '0005_category_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('software', 'Software'), ('category', 'Category')], max_length=8)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='software',
+            name='software_updated_idx',
+        ),
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(fields=['updated_at', 'id'], name='software_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deletedrecord',
+            index=models.Index(fields=['deleted_at', 'id'], name='deleted_record_cursor_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2026-10-17 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('software', '0006_deleted_records'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(fields=['title', 'id'], name='software_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(fields=['download_count', 'id'], name='software_downloads_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(fields=['created_at', 'id'], name='software_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(fields=['is_active', 'created_at', 'id'], name='software_status_created_idx'),
+        ),
+    ]
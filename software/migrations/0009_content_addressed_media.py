@@ -0,0 +1,50 @@
+# Generated by Django 4.2.20 on 2026-10-17 08:37
+
+from django.db import migrations, models
+import software.storage
+
+
+def install_search_index(apps, schema_editor):
+    # SQLite rebuilds software_software for the schema changes below, which
+    # drops the search triggers that 0003_search_index created; other
+    # databases alter the table in place and keep them, so skip the reinstall
+    # and its backfill
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from software.search import SEARCH_BACKENDS
+
+    SEARCH_BACKENDS['sqlite']().install(schema_editor)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('software', '0008_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, install_search_index),
+        migrations.AddField(
+            model_name='software',
+            name='file_name',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='software',
+            name='file',
+            field=models.FileField(storage=software.storage.ContentAddressedStorage(), upload_to='software_files/'),
+        ),
+        migrations.AlterField(
+            model_name='software',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, storage=software.storage.ContentAddressedStorage(), upload_to='software_thumbnails/'),
+        ),
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(fields=['file'], name='software_file_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(fields=['thumbnail'], name='software_thumbnail_idx'),
+        ),
+        migrations.RunPython(install_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.20 on 2026-10-17 08:40
+
+from django.db import migrations, models
+
+
+def install_search_index(apps, schema_editor):
+    # SQLite rebuilds software_software to add the column, which drops the
+    # search triggers that 0003_search_index created; other databases alter
+    # the table in place and keep them, so skip the reinstall and its backfill
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from software.search import SEARCH_BACKENDS
+
+    SEARCH_BACKENDS['sqlite']().install(schema_editor)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('software', '0009_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, install_search_index),
+        migrations.AddField(
+            model_name='software',
+            name='thumbnail_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(install_search_index, migrations.RunPython.noop),
+    ]
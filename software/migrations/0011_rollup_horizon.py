@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-17 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('software', '0010_thumbnail_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='downloadrollupstate',
+            name='horizon_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='downloadrollupstate',
+            name='horizon_event_id',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -1,7 +1,12 @@
+import os
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .storage import ContentAddressedStorage
+
 class BaseModel(models.Model):
     """
     Abstract base model that provides common fields for all models
@@ -16,10 +21,30 @@ class BaseModel(models.Model):
 class SoftwareCategory(BaseModel):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
+    # Maintained by software.category_stats, repair with `manage.py repair_category_stats`
+    active_software_count = models.PositiveIntegerField(default=0, editable=False)
+    latest_software_update = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-active_software_count'], condition=models.Q(is_active=True),
+                name='category_active_count_idx',
+            ),
+        ]
     
     def __str__(self):
         return self.name
 
+class ActiveSoftwareManager(models.Manager):
+    """
+    Software shown on the public site.  The partial indexes on Software are
+    declared with the same is_active=True condition, so querysets built from
+    this manager can use them.
+    """
+    def get_queryset(self):
+        return super().get_queryset().filter(is_active=True)
+
 class Software(BaseModel):
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -28,13 +53,208 @@ class Software(BaseModel):
     upload_date = models.DateTimeField(default=timezone.now)
     update_date = models.DateTimeField(auto_now=True)
     uploader = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
-    file = models.FileField(upload_to='software_files/')
-    thumbnail = models.ImageField(upload_to='software_thumbnails/', blank=True, null=True)
+    # Stored by content hash (see software/storage.py)
+    file = models.FileField(upload_to='software_files/', storage=ContentAddressedStorage())
+    file_name = models.CharField(max_length=255, blank=True, editable=False)  # as uploaded
+    thumbnail = models.ImageField(
+        upload_to='software_thumbnails/', storage=ContentAddressedStorage(), blank=True, null=True
+    )
+    # Maintained by software.thumbnails, backfill with `manage.py generate_thumbnails`
+    thumbnail_variants = models.JSONField(default=dict, blank=True, editable=False)
     download_count = models.PositiveIntegerField(default=0)
 
+    objects = models.Manager()
+    active = ActiveSoftwareManager()
+
+    class Meta:
+        indexes = [
+            # Public list, API and sitemaps: newest first, optionally per category
+            models.Index(
+                fields=['-upload_date', '-id'], condition=models.Q(is_active=True),
+                name='software_active_upload_idx',
+            ),
+            models.Index(
+                fields=['category', '-upload_date', '-id'], condition=models.Q(is_active=True),
+                name='software_cat_upload_idx',
+            ),
+            # Dashboard "popular" list
+            models.Index(
+                fields=['-download_count'], condition=models.Q(is_active=True),
+                name='software_active_popular_idx',
+            ),
+            # Dashboard recent uploads (active) and pending reviews (inactive)
+            models.Index(
+                fields=['-created_at'], condition=models.Q(is_active=True),
+                name='software_active_created_idx',
+            ),
+            models.Index(
+                fields=['-created_at'], condition=models.Q(is_active=False),
+                name='software_pending_created_idx',
+            ),
+            # Category lastmod and incremental syncs
+            models.Index(
+                fields=['category', '-updated_at'], condition=models.Q(is_active=True),
+                name='software_cat_updated_idx',
+            ),
+            # Also the keyset of the changes feed
+            models.Index(fields=['updated_at', 'id'], name='software_updated_id_idx'),
+            # Admin list sort orders (AdminPage/listing.py), read in either direction
+            models.Index(fields=['title', 'id'], name='software_title_id_idx'),
+            models.Index(fields=['download_count', 'id'], name='software_downloads_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='software_created_id_idx'),
+            models.Index(fields=['is_active', 'created_at', 'id'], name='software_status_created_idx'),
+            # Reference counts of stored blobs (software/storage.py)
+            models.Index(fields=['file'], name='software_file_idx'),
+            models.Index(fields=['thumbnail'], name='software_thumbnail_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} (v{self.version})"
 
+    def save(self, *args, **kwargs):
+        # The stored name is a hash: remember the name of a new upload
+        if self.file and not self.file._committed:
+            self.file_name = os.path.basename(self.file.name)[:255]
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'file' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'file_name'}
+        super().save(*args, **kwargs)
+
+    @property
+    def download_name(self):
+        """The name the file was uploaded as"""
+        return self.file_name or os.path.basename(self.file.name)
+
     def increment_download_count(self):
+        """Buffer a download; it reaches the database on the next counter flush"""
+        from .counters import download_counter
+        download_counter.incr(self.pk, category_id=self.category_id)
         self.download_count += 1
-        self.save()
\ No newline at end of file
+
+class DownloadEvent(models.Model):
+    """
+    Append-only log of downloads, written in batches by the download counter
+    and compacted into DownloadRollup by the rollup_downloads command.
+    No foreign key constraints so inserts stay cheap and rows outlive deletes.
+    """
+    software = models.ForeignKey(
+        Software, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    category = models.ForeignKey(
+        SoftwareCategory, on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, related_name='+'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Download of {self.software_id} at {self.created_at}"
+
+
+class DownloadRollup(models.Model):
+    """
+    Download totals per (software, category, hour/day bucket)
+    """
+    HOUR = 'hour'
+    DAY = 'day'
+    GRANULARITY_CHOICES = [
+        (HOUR, 'Hourly'),
+        (DAY, 'Daily'),
+    ]
+
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()
+    software = models.ForeignKey(
+        Software, on_delete=models.DO_NOTHING, db_constraint=False, related_name='download_rollups'
+    )
+    category = models.ForeignKey(
+        SoftwareCategory, on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, related_name='download_rollups'
+    )
+    downloads = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket', 'software', 'category'],
+                name='unique_download_rollup_bucket',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'software', 'bucket'], name='rollup_software_bucket_idx'),
+            models.Index(fields=['granularity', 'category', 'bucket'], name='rollup_category_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.software_id} {self.granularity} {self.bucket}: {self.downloads}"
+
+
+class DownloadRollupState(models.Model):
+    """
+    Single row remembering the last DownloadEvent folded into the rollups,
+    and the highest event id seen at horizon_at (folded once it is old enough)
+    """
+    last_event_id = models.BigIntegerField(default=0)
+    horizon_event_id = models.BigIntegerField(default=0)
+    horizon_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def get(cls, for_update=False):
+        queryset = cls.objects.select_for_update() if for_update else cls.objects
+        state, _ = queryset.get_or_create(pk=1)
+        return state
+
+
+class DeletedRecord(models.Model):
+    """
+    Tombstone for a deleted Software or SoftwareCategory row, so the
+    changes feed can tell mirrors to drop it (see software/changes.py)
+    """
+    SOFTWARE = 'software'
+    CATEGORY = 'category'
+    KIND_CHOICES = [
+        (SOFTWARE, 'Software'),
+        (CATEGORY, 'Category'),
+    ]
+
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='deleted_record_cursor_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deleted {self.kind} {self.object_id} at {self.deleted_at}"
+
+
+class UploadSession(models.Model):
+    """
+    A chunked upload of a software file in progress (see software/uploads.py).
+    The bytes live in a staging file until the session is finalized.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    software = models.ForeignKey(Software, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Pruning abandoned sessions
+            models.Index(fields=['updated_at'], name='upload_session_updated_idx'),
+        ]
+
+    @property
+    def complete(self):
+        return self.received == self.size
+
+    def __str__(self):
+        return f"Upload of {self.filename}: {self.received}/{self.size}"
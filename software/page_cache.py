@@ -0,0 +1,255 @@
+"""
+Response cache for the public catalog pages and the JSON API.
+
+Cached responses are keyed on the absolute path, the normalized query string
+(sorted, empty values and tracking parameters dropped) and the current
+value of the generation counters the page depends on:
+
+- ``catalog``          any change to the set of visible software
+- ``category:<pk>``    software added to, removed from or edited in a category
+- ``software:<pk>``    one software record
+- ``categories``       category names, descriptions and visibility
+
+Saves and deletes bump only the counters they touch (see the receivers at
+the bottom), so editing one program leaves other detail pages and other
+categories' listings cached.  Nothing is ever deleted: pages built under an
+old generation simply stop being looked up and age out of the cache.
+
+Download counters are flushed with queryset.update() and send no signals,
+so downloads never invalidate pages; the counts shown are at most
+SOFTWARE_PAGE_CACHE_TIMEOUT seconds old.
+
+Requests pinned to the primary database after a write (see
+software.db_router) bypass the cache, so editors see their change at once.
+Pages rendered from a replica may be up to SOFTWARE_REPLICA_MAX_LAG seconds
+behind the generation they are stored under.
+
+Generations live in the ``default`` cache, which must be shared between
+workers (SHARED_CACHE, checked by software.E003) for a bump to reach all
+of them; the pages themselves live in the SOFTWARE_PAGE_CACHE alias, which
+may be a per-process BoundedLocMemCache.
+"""
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from .db_router import pinned
+from .models import Software, SoftwareCategory
+
+GENERATION_KEY = 'software:page-gen:{}'
+PAGE_KEY = 'software:page:{}'
+
+IGNORED_PARAMS = {'fbclid', 'gclid', 'msclkid', 'ref'}
+
+# Saves touching only these fields are invisible on public pages
+UNCACHED_FIELDS = {'download_count', 'updated_at'}
+
+_lock = threading.Lock()
+_counters = {'hits': 0, 'misses': 0, 'stores': 0}
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+
+def normalized_query(request):
+    """Query parameters that change the response, in a stable order"""
+    return sorted(
+        (name, value)
+        for name, values in request.GET.lists()
+        if name not in IGNORED_PARAMS and not name.startswith('utm_')
+        for value in values
+        if value
+    )
+
+
+def generations(scopes):
+    """Current generation of each scope, starting unknown ones at a fresh value"""
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            # A lost counter must not restart at a value old pages were built with
+            cache.add(key, time.time_ns(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def fragment_version(scopes):
+    """Generations of the scopes as a string, for {% cache %} fragment keys"""
+    return '-'.join(str(generation) for generation in generations(scopes))
+
+
+def bump(*scopes):
+    """Invalidate every cached page depending on any of the given scopes"""
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def bump_many(scopes):
+    """
+    bump() for many scopes in one cache round trip.  Each scope restarts at
+    a fresh time-based value, which no page can have been built with yet.
+    """
+    generation = time.time_ns()
+    cache.set_many({GENERATION_KEY.format(scope): generation for scope in scopes}, None)
+
+
+def page_key(request, scopes):
+    parts = [
+        request.build_absolute_uri(request.path),
+        repr(normalized_query(request)),
+        repr(sorted(zip(scopes, generations(scopes)))),
+    ]
+    return PAGE_KEY.format(hashlib.md5('\n'.join(parts).encode()).hexdigest())
+
+
+def page_cache():
+    return caches[settings.SOFTWARE_PAGE_CACHE]
+
+
+def cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and 'Cookie' not in response.get('Vary', '')
+    )
+
+
+def _lookup(request, scopes):
+    """(key, cached response or None) for a GET/HEAD request"""
+    key = page_key(request, scopes)
+    cached = page_cache().get(key)
+    if cached is None:
+        _count('misses')
+        return key, None
+    _count('hits')
+    content, headers = cached
+    response = HttpResponse(content)
+    for name, value in headers:
+        response[name] = value
+    response['X-Page-Cache'] = 'HIT'
+    # Answer If-None-Match for views that set an ETag
+    return key, get_conditional_response(request, etag=response.get('ETag'), response=response)
+
+
+def _store(key, response):
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    if cacheable(response):
+        page_cache().set(key, (response.content, list(response.items())), settings.SOFTWARE_PAGE_CACHE_TIMEOUT)
+        _count('stores')
+    response['X-Page-Cache'] = 'MISS'
+    return response
+
+
+def _bypass(request):
+    return request.method not in ('GET', 'HEAD') or not settings.SOFTWARE_PAGE_CACHE_TIMEOUT or pinned()
+
+
+def cache_page_response(scopes):
+    """
+    Cache GET/HEAD responses of a view.  ``scopes(request, *args, **kwargs)``
+    returns the generation scopes the response depends on.  Async views get
+    an async wrapper that does the cache round trips in a thread.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapped(request, *args, **kwargs):
+                if _bypass(request):
+                    return await view(request, *args, **kwargs)
+                key, response = await sync_to_async(_lookup)(request, scopes(request, *args, **kwargs))
+                if response is not None:
+                    return response
+                response = await view(request, *args, **kwargs)
+                return await sync_to_async(_store)(key, response)
+            return wrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if _bypass(request):
+                return view(request, *args, **kwargs)
+            key, response = _lookup(request, scopes(request, *args, **kwargs))
+            if response is not None:
+                return response
+            return _store(key, view(request, *args, **kwargs))
+        return wrapped
+    return decorator
+
+
+def stats():
+    """Hit/miss counters of this process plus the backend's own, if it keeps any"""
+    with _lock:
+        data = dict(_counters)
+    lookups = data['hits'] + data['misses']
+    data['hit_ratio'] = round(data['hits'] / lookups, 4) if lookups else None
+    backend = page_cache()
+    if hasattr(backend, 'stats'):
+        data.update(backend.stats())
+    return data
+
+
+# Scopes of the cached views
+
+def list_scopes(request, *args, **kwargs):
+    category_id = request.GET.get('category', '')
+    if category_id.isdigit() and not request.GET.get('search'):
+        return [f'category:{category_id}', 'categories']
+    return ['catalog', 'categories']
+
+
+def detail_scopes(request, pk, *args, **kwargs):
+    return [f'software:{pk}', 'categories']
+
+
+def category_scopes(request, *args, **kwargs):
+    # Category listings show active software counts
+    return ['catalog', 'categories']
+
+
+# Invalidation
+
+@receiver(post_save, sender=Software)
+def software_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= UNCACHED_FIELDS:
+        return
+    # _previous_category_id is stashed by software.category_stats
+    bump(
+        'catalog',
+        f'software:{instance.pk}',
+        *{
+            f'category:{pk}'
+            for pk in (instance.category_id, getattr(instance, '_previous_category_id', None))
+            if pk is not None
+        },
+    )
+
+
+@receiver(post_delete, sender=Software)
+def software_deleted(sender, instance, **kwargs):
+    scopes = ['catalog', f'software:{instance.pk}']
+    if instance.category_id is not None:
+        scopes.append(f'category:{instance.category_id}')
+    bump(*scopes)
+
+
+@receiver(post_save, sender=SoftwareCategory)
+@receiver(post_delete, sender=SoftwareCategory)
+def category_changed(sender, instance, **kwargs):
+    bump('categories', f'category:{instance.pk}')
@@ -0,0 +1,184 @@
+"""
+Cursor (keyset) pagination for the public list and the JSON API.
+
+Pages are addressed by an opaque cursor holding the sort key of the row at
+the page edge, so every page is an index range scan with no OFFSET and no
+COUNT(*).  Relevance-ordered search results have no stable sort key and
+fall back to an offset stored in the cursor.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+
+DEFAULT_ORDERING = ('-upload_date', '-id')
+
+
+class InvalidCursor(Exception):
+    """Raised when a cursor cannot be decoded"""
+
+
+def encode_cursor(payload):
+    data = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor(token)
+    if not isinstance(payload, dict):
+        raise InvalidCursor(token)
+    return payload
+
+
+def estimate_count(queryset):
+    """
+    Planner row estimate for the queryset (PostgreSQL only), or None.
+    Reads EXPLAIN output instead of running COUNT(*).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CursorPage:
+    """
+    A page of results with the cursors of its neighbours
+    """
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def estimated_total(self):
+        return self.paginator.estimated_total
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset by its ordering fields (which must end with a unique
+    column) or, when ordering is None, by offset.
+    """
+
+    def __init__(self, queryset, per_page, ordering=DEFAULT_ORDERING, estimate_total=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering) if ordering else None
+        if estimate_total is None:
+            estimate_total = settings.SOFTWARE_LIST_ESTIMATE_TOTAL
+        self.estimate_total = estimate_total
+        self._estimated_total = False
+
+    @property
+    def estimated_total(self):
+        if self._estimated_total is False:
+            self._estimated_total = estimate_count(self.queryset) if self.estimate_total else None
+        return self._estimated_total
+
+    def _fields(self):
+        return [(spec.lstrip('-'), spec.startswith('-')) for spec in self.ordering]
+
+    def _key(self, obj):
+        values = []
+        for name, _ in self._fields():
+            # Rows are model instances or values() dicts
+            value = obj[name] if isinstance(obj, dict) else getattr(obj, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    def _seek(self, values, backwards):
+        """Q matching rows after (or before) the given sort key"""
+        model = self.queryset.model
+        condition = Q()
+        bound = None
+        equal = {}
+        for (name, descending), raw in zip(self._fields(), values):
+            value = model._meta.get_field(name).to_python(raw)
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            if bound is None:
+                # A plain range on the leading column, so the planner walks one
+                # index range in order instead of OR-ing two and sorting
+                bound = Q(**{f'{name}__{lookup}e': value})
+            equal[name] = value
+        return bound & condition
+
+    def page(self, cursor=None):
+        payload = decode_cursor(cursor) if cursor else {}
+        try:
+            if self.ordering is None:
+                return self._offset_page(int(payload.get('o', 0)))
+            return self._keyset_page(payload.get('k'), bool(payload.get('r')))
+        except (TypeError, ValueError, ValidationError):
+            # A tampered key fails in the fields' to_python()
+            raise InvalidCursor(cursor)
+
+    def _keyset_page(self, key, backwards):
+        queryset = self.queryset
+        if key is not None:
+            if len(key) != len(self.ordering):
+                raise InvalidCursor(key)
+            queryset = queryset.filter(self._seek(key, backwards))
+        if backwards:
+            ordering = [spec[1:] if spec.startswith('-') else f'-{spec}' for spec in self.ordering]
+        else:
+            ordering = self.ordering
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_previous, has_next = more, True
+        else:
+            has_previous, has_next = key is not None, more
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor({'k': self._key(rows[-1])})
+        if rows and has_previous:
+            previous_cursor = encode_cursor({'k': self._key(rows[0]), 'r': 1})
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def _offset_page(self, offset):
+        offset = max(offset, 0)
+        rows = list(self.queryset[offset:offset + self.per_page + 1])
+        next_cursor = previous_cursor = None
+        if len(rows) > self.per_page:
+            next_cursor = encode_cursor({'o': offset + self.per_page})
+        if offset:
+            previous_cursor = encode_cursor({'o': max(offset - self.per_page, 0)})
+        return CursorPage(rows[:self.per_page], self, next_cursor, previous_cursor)
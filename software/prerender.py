@@ -0,0 +1,171 @@
+"""
+Pre-rendering of the static pages to files nginx serves directly.
+
+The pages below only depend on the host and scheme, so
+``manage.py prerender_static_pages`` renders them once per deploy into
+SOFTWARE_PRERENDER_ROOT, next to gzip (and, when the optional ``brotli``
+package is installed, brotli) variants.  examples/nginx.example maps the
+URLs onto these files and falls back to Django when one is missing.
+
+A manifest records a hash of every source a page was rendered from (its
+template and every template it extends or includes, or the view module for
+pages built in code) so the ``software.E002`` deploy check can tell when a
+page is stale.  Pages with a form carry a per-visitor CSRF token and cannot
+be shared this way (the contact page is served by Django).
+"""
+import gzip
+import hashlib
+import inspect
+import json
+import os
+
+from django.conf import settings
+from django.template import Context
+from django.template.loader import get_template
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+MANIFEST = 'manifest.json'
+
+# URL names of the pre-rendered pages
+PAGES = [
+    'software:privacy_policy',
+    'software:terms_of_service',
+    'software:about_us',
+    'software:robots_txt',
+    'software:ads_txt',
+]
+
+
+def output_path(url):
+    """File a URL is written to: /about-us/ -> about-us/index.html"""
+    path = url.lstrip('/')
+    if not path or path.endswith('/'):
+        path += 'index.html'
+    return os.path.join(settings.SOFTWARE_PRERENDER_ROOT, *path.split('/'))
+
+
+def template_sources(template):
+    """Files of a template and of every template it extends or includes"""
+    sources = [template.origin.name]
+    for node in template.nodelist.get_nodes_by_type((ExtendsNode, IncludeNode)):
+        # Names only known at render time ({% include var %}) resolve to ''
+        expression = node.parent_name if isinstance(node, ExtendsNode) else node.template
+        name = expression.resolve(Context())
+        if name and isinstance(name, str):
+            for source in template_sources(template.engine.get_template(name)):
+                if source not in sources:
+                    sources.append(source)
+    return sources
+
+
+def page_sources(url):
+    """Files the page is rendered from"""
+    view = resolve(url).func
+    view_class = getattr(view, 'view_class', None)
+    template_name = getattr(view_class, 'template_name', None)
+    if template_name:
+        return template_sources(get_template(template_name).template)
+    return [inspect.getsourcefile(view)]
+
+
+def fingerprint(sources):
+    result = {}
+    for source in sources:
+        with open(source, 'rb') as f:
+            result[source] = hashlib.sha256(f.read()).hexdigest()
+    return result
+
+
+def render_page(url):
+    host = settings.SOFTWARE_PRERENDER_HOST
+    request = RequestFactory().get(
+        url, HTTP_HOST=host, secure=settings.SOFTWARE_PRERENDER_SCHEME == 'https',
+    )
+    match = resolve(url)
+    response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    if response.status_code != 200:
+        raise ValueError(f'{url} answered {response.status_code}')
+    if b'csrfmiddlewaretoken' in response.content:
+        raise ValueError(f'{url} has a CSRF token, which must not be shared between visitors')
+    return response.content
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(content)
+    os.replace(temporary, path)
+
+
+def write_page(path, content):
+    """Write the page and its pre-compressed variants, returning the paths"""
+    written = [path]
+    write_file(path, content)
+    # mtime=0 keeps the .gz byte-identical across deploys
+    write_file(f'{path}.gz', gzip.compress(content, compresslevel=9, mtime=0))
+    written.append(f'{path}.gz')
+    if brotli is not None:
+        write_file(f'{path}.br', brotli.compress(content))
+        written.append(f'{path}.br')
+    elif os.path.exists(f'{path}.br'):
+        os.remove(f'{path}.br')
+    return written
+
+
+def prerender_pages():
+    """Render every page and the manifest; returns {url: [written paths]}"""
+    manifest = {'host': settings.SOFTWARE_PRERENDER_HOST, 'scheme': settings.SOFTWARE_PRERENDER_SCHEME, 'pages': {}}
+    written = {}
+    for name in PAGES:
+        url = reverse(name)
+        path = output_path(url)
+        written[url] = write_page(path, render_page(url))
+        manifest['pages'][url] = {
+            'file': os.path.relpath(path, settings.SOFTWARE_PRERENDER_ROOT),
+            'sources': fingerprint(page_sources(url)),
+        }
+    write_file(
+        os.path.join(settings.SOFTWARE_PRERENDER_ROOT, MANIFEST),
+        json.dumps(manifest, indent=2, sort_keys=True).encode(),
+    )
+    return written
+
+
+def read_manifest():
+    try:
+        with open(os.path.join(settings.SOFTWARE_PRERENDER_ROOT, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def stale_pages():
+    """URLs whose pre-rendered file is missing or older than its sources"""
+    manifest = read_manifest()
+    if manifest is None:
+        return []
+    if (manifest.get('host'), manifest.get('scheme')) != (
+        settings.SOFTWARE_PRERENDER_HOST, settings.SOFTWARE_PRERENDER_SCHEME
+    ):
+        return [reverse(name) for name in PAGES]
+    stale = []
+    for name in PAGES:
+        url = reverse(name)
+        entry = manifest['pages'].get(url)
+        if (
+            entry is None
+            or not os.path.exists(output_path(url))
+            or entry['sources'] != fingerprint(page_sources(url))
+        ):
+            stale.append(url)
+    return stale
@@ -0,0 +1,148 @@
+"""
+Compaction of the DownloadEvent log into hourly and daily DownloadRollup rows,
+and the queries the dashboards use to read them back.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import DownloadEvent, DownloadRollup, DownloadRollupState
+
+TRUNCATE = {
+    DownloadRollup.HOUR: TruncHour,
+    DownloadRollup.DAY: TruncDay,
+}
+
+
+def _merge(granularity, rows):
+    """Add aggregated event counts to the matching rollup rows"""
+    if not rows:
+        return
+    existing = {
+        (rollup.bucket, rollup.software_id, rollup.category_id): rollup
+        for rollup in DownloadRollup.objects.filter(
+            granularity=granularity,
+            bucket__in={row['bucket'] for row in rows},
+            software_id__in={row['software_id'] for row in rows},
+        )
+    }
+    to_update, to_create = [], []
+    for row in rows:
+        key = (row['bucket'], row['software_id'], row['category_id'])
+        rollup = existing.get(key)
+        if rollup:
+            rollup.downloads += row['downloads']
+            to_update.append(rollup)
+        else:
+            to_create.append(DownloadRollup(
+                granularity=granularity,
+                bucket=row['bucket'],
+                software_id=row['software_id'],
+                category_id=row['category_id'],
+                downloads=row['downloads'],
+            ))
+    DownloadRollup.objects.bulk_update(to_update, ['downloads'], batch_size=1000)
+    DownloadRollup.objects.bulk_create(to_create, batch_size=1000)
+
+
+def _safe_max_id(safety_lag):
+    """
+    Highest event id that can be folded without skipping a late commit.
+
+    Ids are handed out when a row is inserted, not when it commits, so a slow
+    batch can become visible below ids that were folded already.  The highest
+    id seen is remembered with the time it was seen and only trusted once
+    safety_lag seconds have passed, by when every lower id has committed.
+    """
+    with transaction.atomic():
+        state = DownloadRollupState.get(for_update=True)
+        max_id = DownloadEvent.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        if not safety_lag:
+            return max_id
+        now = timezone.now()
+        if state.horizon_at is not None and state.horizon_at > now - timedelta(seconds=safety_lag):
+            return state.last_event_id
+        safe_id = state.horizon_event_id
+        state.horizon_event_id, state.horizon_at = max_id, now
+        state.save()
+        return safe_id
+
+
+def rollup_downloads(batch_size=100000, delete_events=False, safety_lag=None):
+    """
+    Fold download events into the rollups, one id window at a time.
+
+    Each window is aggregated by the database and committed together with
+    the checkpoint, so the job is incremental, resumable and never loads the
+    raw events.  Events are folded up to the highest id that has been visible
+    for safety_lag seconds (SOFTWARE_ROLLUP_SAFETY_LAG), so each run picks up
+    the ids the previous one saw.  Returns the number of events processed.
+    """
+    if safety_lag is None:
+        safety_lag = settings.SOFTWARE_ROLLUP_SAFETY_LAG
+    max_id = _safe_max_id(safety_lag)
+    processed = 0
+    while True:
+        with transaction.atomic():
+            state = DownloadRollupState.get(for_update=True)
+            if state.last_event_id >= max_id:
+                break
+            upper = min(state.last_event_id + batch_size, max_id)
+            events = DownloadEvent.objects.filter(id__gt=state.last_event_id, id__lte=upper)
+
+            for granularity, truncate in TRUNCATE.items():
+                _merge(granularity, list(
+                    events.annotate(bucket=truncate('created_at'))
+                    .values('bucket', 'software_id', 'category_id')
+                    .annotate(downloads=Count('id'))
+                    .order_by()
+                ))
+
+            processed += events.count()
+            if delete_events:
+                events.delete()
+            state.last_event_id = upper
+            state.save()
+    return processed
+
+
+def daily_downloads(days=30, software=None, category=None):
+    """Return [{'day': date, 'downloads': n}, ...] for the last `days` days, gaps filled"""
+    start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    start -= timedelta(days=days - 1)
+    rollups = DownloadRollup.objects.filter(
+        granularity=DownloadRollup.DAY,
+        bucket__gte=start,
+    )
+    if software is not None:
+        rollups = rollups.filter(software=software)
+    if category is not None:
+        rollups = rollups.filter(category=category)
+
+    totals = {
+        timezone.localtime(row['bucket']).date(): row['downloads']
+        for row in rollups.values('bucket').annotate(downloads=Sum('downloads')).order_by()
+    }
+    return [
+        {'day': day, 'downloads': totals.get(day, 0)}
+        for day in (start.date() + timedelta(days=i) for i in range(days))
+    ]
+
+
+def category_downloads(days=30, limit=10):
+    """Return the categories with the most downloads over the last `days` days"""
+    since = timezone.now() - timedelta(days=days)
+    return list(
+        DownloadRollup.objects.filter(
+            granularity=DownloadRollup.DAY,
+            bucket__gte=since,
+            category__isnull=False,
+        )
+        .values('category_id', 'category__name')
+        .annotate(downloads=Sum('downloads'))
+        .order_by('-downloads')[:limit]
+    )
@@ -0,0 +1,239 @@
+"""
+Full-text search backends for the software catalog.
+
+The index is maintained by database triggers installed by the
+0003_search_index migration, so every write path (forms, Django admin,
+queryset.update(), bulk_create) keeps it current.  Title matches rank above
+version matches, which rank above description matches.
+
+- PostgreSQL: a weighted ``search_vector`` tsvector column with a GIN index.
+- SQLite: an external-content FTS5 table ranked with bm25().
+- Anything else: the old ``icontains`` scan.
+
+Run ``manage.py rebuild_search_index`` after restoring a dump or after a
+migration that rebuilds the software table on SQLite (which drops triggers).
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Software
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+TABLE = Software._meta.db_table
+
+
+def search_terms(query):
+    """Split user input into plain word tokens (no query syntax passes through)"""
+    return WORD_RE.findall(query or '')[:16]
+
+
+class BaseSearchBackend:
+    """
+    Filter a Software queryset by a user query, annotate ``search_rank``
+    and order it by relevance
+    """
+
+    def search(self, queryset, query):
+        raise NotImplementedError('Search backends must implement search()')
+
+    def matches(self, query):
+        """
+        Q for rows matching the query, without ranking, so it can be OR-ed
+        with other conditions and ordered by any column
+        """
+        raise NotImplementedError('Search backends must implement matches()')
+
+    def install(self, schema_editor):
+        """Create the index structures and backfill them"""
+
+    def uninstall(self, schema_editor):
+        """Drop the index structures"""
+
+    def rebuild(self, schema_editor):
+        self.uninstall(schema_editor)
+        self.install(schema_editor)
+
+
+class IcontainsSearchBackend(BaseSearchBackend):
+    """
+    Unindexed fallback for databases without a full-text implementation
+    """
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(version__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField())).order_by('-upload_date', '-id')
+
+    def matches(self, query):
+        return Q(title__icontains=query) | Q(description__icontains=query) | Q(version__icontains=query)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Weighted tsvector column (title A, version B, description C) with a GIN index
+    """
+    config = 'english'
+
+    def tsquery(self, terms):
+        # Prefix match every word so partial input still finds results
+        return ' & '.join(f"{term}:*" for term in terms)
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        tsquery = self.tsquery(terms)
+        return queryset.filter(
+            RawSQL(
+                f'"{TABLE}"."search_vector" @@ to_tsquery(%s, %s)',
+                [self.config, tsquery],
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f'ts_rank("{TABLE}"."search_vector", to_tsquery(%s, %s))',
+                [self.config, tsquery],
+                output_field=FloatField(),
+            )
+        ).order_by('-search_rank', '-upload_date', '-id')
+
+    def matches(self, query):
+        terms = search_terms(query)
+        if not terms:
+            return Q(pk__in=[])
+        return Q(RawSQL(
+            f'"{TABLE}"."search_vector" @@ to_tsquery(%s, %s)',
+            [self.config, self.tsquery(terms)],
+            output_field=BooleanField(),
+        ))
+
+    def install(self, schema_editor):
+        vector = (
+            f"setweight(to_tsvector('{self.config}', coalesce(NEW.title, '')), 'A') || "
+            f"setweight(to_tsvector('{self.config}', coalesce(NEW.version, '')), 'B') || "
+            f"setweight(to_tsvector('{self.config}', coalesce(NEW.description, '')), 'C')"
+        )
+        for sql in [
+            f'ALTER TABLE "{TABLE}" ADD COLUMN IF NOT EXISTS "search_vector" tsvector',
+            f"""
+            CREATE OR REPLACE FUNCTION "{TABLE}_search_vector_update"() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {vector};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+            """,
+            f'DROP TRIGGER IF EXISTS "{TABLE}_search_vector_trigger" ON "{TABLE}"',
+            f"""
+            CREATE TRIGGER "{TABLE}_search_vector_trigger"
+            BEFORE INSERT OR UPDATE OF title, version, description ON "{TABLE}"
+            FOR EACH ROW EXECUTE FUNCTION "{TABLE}_search_vector_update"()
+            """,
+            f'UPDATE "{TABLE}" SET "search_vector" = {vector.replace("NEW.", "")}',
+            f'CREATE INDEX IF NOT EXISTS "{TABLE}_search_vector_idx" ON "{TABLE}" USING GIN ("search_vector")',
+        ]:
+            schema_editor.execute(sql)
+
+    def uninstall(self, schema_editor):
+        for sql in [
+            f'DROP TRIGGER IF EXISTS "{TABLE}_search_vector_trigger" ON "{TABLE}"',
+            f'DROP FUNCTION IF EXISTS "{TABLE}_search_vector_update"()',
+            f'ALTER TABLE "{TABLE}" DROP COLUMN IF EXISTS "search_vector"',
+        ]:
+            schema_editor.execute(sql)
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """
+    External-content FTS5 table kept in sync by triggers, ranked with bm25()
+    """
+    fts_table = f'{TABLE}_fts'
+    # bm25() column weights for title, version, description
+    weights = (10.0, 5.0, 1.0)
+
+    def match(self, terms):
+        return ' '.join('"{}"*'.format(term) for term in terms)
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        fts = self.fts_table
+        weights = ', '.join(str(weight) for weight in self.weights)
+        # bm25() is only available in a query that joins the FTS table
+        return queryset.extra(
+            select={'search_rank': f'-bm25("{fts}", {weights})'},
+            tables=[fts],
+            where=[f'"{fts}" MATCH %s', f'"{fts}".rowid = "{TABLE}"."id"'],
+            params=[self.match(terms)],
+        ).order_by('-search_rank', '-upload_date', '-id')
+
+    def matches(self, query):
+        terms = search_terms(query)
+        if not terms:
+            return Q(pk__in=[])
+        fts = self.fts_table
+        return Q(RawSQL(
+            f'"{TABLE}"."id" IN (SELECT rowid FROM "{fts}" WHERE "{fts}" MATCH %s)',
+            [self.match(terms)],
+            output_field=BooleanField(),
+        ))
+
+    def install(self, schema_editor):
+        fts = self.fts_table
+        columns = 'title, version, description'
+        for sql in [
+            f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS "{fts}" USING fts5(
+                {columns}, content='{TABLE}', content_rowid='id', tokenize='unicode61'
+            )
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS "{fts}_ai" AFTER INSERT ON "{TABLE}" BEGIN
+                INSERT INTO "{fts}"(rowid, {columns}) VALUES (new.id, new.title, new.version, new.description);
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS "{fts}_ad" AFTER DELETE ON "{TABLE}" BEGIN
+                INSERT INTO "{fts}"("{fts}", rowid, {columns})
+                VALUES ('delete', old.id, old.title, old.version, old.description);
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS "{fts}_au" AFTER UPDATE OF {columns} ON "{TABLE}" BEGIN
+                INSERT INTO "{fts}"("{fts}", rowid, {columns})
+                VALUES ('delete', old.id, old.title, old.version, old.description);
+                INSERT INTO "{fts}"(rowid, {columns}) VALUES (new.id, new.title, new.version, new.description);
+            END
+            """,
+            f"""INSERT INTO "{fts}"("{fts}") VALUES ('rebuild')""",
+        ]:
+            schema_editor.execute(sql)
+
+    def uninstall(self, schema_editor):
+        fts = self.fts_table
+        for sql in [
+            f'DROP TRIGGER IF EXISTS "{fts}_ai"',
+            f'DROP TRIGGER IF EXISTS "{fts}_ad"',
+            f'DROP TRIGGER IF EXISTS "{fts}_au"',
+            f'DROP TABLE IF EXISTS "{fts}"',
+        ]:
+            schema_editor.execute(sql)
+
+
+SEARCH_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_search_backend(using='default'):
+    """Return the search backend matching the database vendor"""
+    vendor = connections[using].vendor
+    return SEARCH_BACKENDS.get(vendor, IcontainsSearchBackend)()
@@ -0,0 +1,124 @@
+"""
+Row serialization for the JSON API.
+
+Rows are fetched with values() so only the columns behind the requested
+``fields=`` are read and no model instances are built, then encoded with
+orjson when it is installed (plain json otherwise).
+"""
+import hashlib
+import json
+
+from django.db.models import Count, Max, Sum
+from django.http import HttpResponse
+
+from .models import Software
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+_thumbnail_storage = Software._meta.get_field('thumbnail').storage
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _thumbnail_url(name):
+    return _thumbnail_storage.url(name) if name else None
+
+
+# Public field -> (column read with values(), converter)
+SOFTWARE_FIELDS = {
+    'id': ('id', None),
+    'title': ('title', None),
+    'description': ('description', None),
+    'version': ('version', None),
+    'category': ('category__name', None),
+    'download_count': ('download_count', None),
+    'upload_date': ('upload_date', _isoformat),
+    'thumbnail': ('thumbnail', _thumbnail_url),
+}
+
+# Read for every row so the keyset paginator can build cursors
+PAGINATION_COLUMNS = ('id', 'upload_date')
+
+
+def parse_fields(value, available=SOFTWARE_FIELDS):
+    """Requested fields in the given order; all of them when none are given"""
+    if not value:
+        return list(available)
+    fields = []
+    for name in value.split(','):
+        name = name.strip()
+        if name not in available:
+            raise ValueError(f'Unknown field: {name}')
+        if name not in fields:
+            fields.append(name)
+    return fields
+
+
+def columns(fields, available=SOFTWARE_FIELDS):
+    result = list(PAGINATION_COLUMNS)
+    for name in fields:
+        column = available[name][0]
+        if column not in result:
+            result.append(column)
+    return result
+
+
+def serialize_rows(rows, fields, available=SOFTWARE_FIELDS):
+    plan = [(name, *available[name]) for name in fields]
+    data = []
+    for row in rows:
+        item = {}
+        for name, column, convert in plan:
+            value = row[column]
+            item[name] = convert(value) if convert is not None else value
+        data.append(item)
+    return data
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+class FastJsonResponse(HttpResponse):
+    """JsonResponse for data that is already JSON-compatible"""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+def _etag_aggregates(fields):
+    aggregates = {'count': Count('pk'), 'latest': Max('updated_at')}
+    if 'download_count' in fields:
+        aggregates['downloads'] = Sum('download_count')
+    if 'category' in fields:
+        # Renaming a category changes the rows without touching them
+        aggregates['categories'] = Max('category__updated_at')
+    return aggregates
+
+
+def _etag(state, query):
+    parts = [repr(sorted((name, str(value)) for name, value in state.items())), repr(query)]
+    return '"{}"'.format(hashlib.sha1('\n'.join(parts).encode()).hexdigest())
+
+
+def software_etag(queryset, query, fields):
+    """
+    Strong ETag for an API response: one aggregate over the filtered rows
+    (count, latest update and, when shown, total downloads and the latest
+    category update, which change without touching updated_at) plus the
+    normalized query parameters
+    """
+    return _etag(queryset.order_by().aggregate(**_etag_aggregates(fields)), query)
+
+
+async def asoftware_etag(queryset, query, fields):
+    """software_etag() for async views"""
+    return _etag(await queryset.order_by().aaggregate(**_etag_aggregates(fields)), query)
@@ -0,0 +1,142 @@
+"""
+Sitemap files written to disk for nginx.
+
+``manage.py generate_sitemaps`` writes a sitemap index (sitemap.xml plus a
+.gz variant) and one gzipped file per section page into
+SOFTWARE_SITEMAP_ROOT:
+
+    sitemap-static-1.xml.gz
+    sitemap-software-<bucket>.xml.gz   one per pk range of
+                                       SOFTWARE_SITEMAP_SECTION_SIZE rows
+    sitemap-categories-1.xml.gz
+    sitemap-api-1.xml.gz
+
+Runs are incremental.  Software buckets whose (count, latest update, pk
+checksum) signature is unchanged since the last run are not even queried,
+and the small sections are only rewritten when their rendered XML changed.
+Download count changes do not mark a bucket changed, so priorities catch up
+on the next ``--full`` run.  Schedule it like rollup_downloads, e.g. every
+15 minutes from cron, and once with ``--full`` per night.
+"""
+import gzip
+import hashlib
+import json
+import os
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.sitemaps.views import SitemapIndexItem
+from django.template.loader import render_to_string
+from django.utils.dateparse import parse_datetime
+
+from software_portal.sitemaps import SoftwareSitemap, sitemaps
+
+INDEX_FILE = 'sitemap.xml'
+STATE_FILE = 'sitemap-state.json'
+SECTION_FILE = 'sitemap-{name}-{page}.xml.gz'
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(content)
+    os.replace(temporary, path)
+
+
+def root_path(name):
+    return os.path.join(settings.SOFTWARE_SITEMAP_ROOT, name)
+
+
+def load_state():
+    try:
+        with open(root_path(STATE_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def sections():
+    """(file name, sitemap, page, signature) for every section file"""
+    for name, sitemap_class in sitemaps.items():
+        if sitemap_class is SoftwareSitemap:
+            for bucket, (count, latest, checksum) in SoftwareSitemap.buckets().items():
+                signature = [count, latest.isoformat() if latest else None, checksum]
+                yield SECTION_FILE.format(name=name, page=bucket), SoftwareSitemap(bucket), 1, signature
+        else:
+            sitemap = sitemap_class()
+            for page in sitemap.paginator.page_range:
+                yield SECTION_FILE.format(name=name, page=page), sitemap, page, None
+
+
+class SitemapWriter:
+
+    def __init__(self, full=False):
+        self.host = settings.SOFTWARE_SITEMAP_HOST
+        self.scheme = settings.SOFTWARE_SITEMAP_SCHEME
+        self.site = SimpleNamespace(domain=self.host, name=self.host)
+        self.previous = load_state()
+        if (self.previous.get('host'), self.previous.get('scheme')) != (self.host, self.scheme):
+            full = True
+        self.full = full
+        self.written = []
+        self.unchanged = []
+        self.removed = []
+
+    def render_section(self, sitemap, page):
+        urls = sitemap.get_urls(page=page, site=self.site, protocol=self.scheme)
+        xml = render_to_string('sitemap.xml', {'urlset': urls}).encode()
+        lastmod = max((url['lastmod'] for url in urls if url['lastmod']), default=None)
+        return xml, lastmod
+
+    def write_section(self, filename, sitemap, page, signature):
+        previous = self.previous.get('sections', {}).get(filename)
+        exists = os.path.exists(root_path(filename))
+        if not self.full and exists and previous and signature is not None and previous['signature'] == signature:
+            self.unchanged.append(filename)
+            return previous
+
+        xml, lastmod = self.render_section(sitemap, page)
+        digest = hashlib.sha256(xml).hexdigest()
+        if not self.full and exists and previous and previous['digest'] == digest:
+            self.unchanged.append(filename)
+        else:
+            # mtime=0 keeps unchanged content byte-identical for caches downstream
+            write_file(root_path(filename), gzip.compress(xml, compresslevel=9, mtime=0))
+            self.written.append(filename)
+        return {
+            'signature': signature,
+            'digest': digest,
+            'lastmod': lastmod.isoformat() if lastmod else None,
+        }
+
+    def write_index(self, state):
+        items = [
+            SitemapIndexItem(
+                f'{self.scheme}://{self.host}/{filename}',
+                parse_datetime(entry['lastmod']) if entry['lastmod'] else None,
+            )
+            for filename, entry in state.items()
+        ]
+        xml = render_to_string('sitemap_index.xml', {'sitemaps': items}).encode()
+        write_file(root_path(INDEX_FILE), xml)
+        write_file(root_path(f'{INDEX_FILE}.gz'), gzip.compress(xml, compresslevel=9, mtime=0))
+
+    def run(self):
+        state = {}
+        for filename, sitemap, page, signature in sections():
+            state[filename] = self.write_section(filename, sitemap, page, signature)
+
+        for filename in self.previous.get('sections', {}):
+            if filename not in state:
+                try:
+                    os.remove(root_path(filename))
+                except FileNotFoundError:
+                    pass
+                self.removed.append(filename)
+
+        self.write_index(state)
+        write_file(root_path(STATE_FILE), json.dumps(
+            {'host': self.host, 'scheme': self.scheme, 'sections': state}, indent=2, sort_keys=True,
+        ).encode())
+        return self
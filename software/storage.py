@@ -0,0 +1,166 @@
+"""
+Content-addressed storage for software files and thumbnails.
+
+A file is stored under the SHA-256 of its bytes, in the directory its
+field's upload_to gives, fanned out over two levels of subdirectories:
+software_files/ab/cd/abcd...ef.exe.  Saving bytes that are already stored
+writes nothing and returns the existing name, so re-uploading an installer
+under a new version costs no space, and no directory holds more than 256
+entries until there are tens of millions of files.  The name the file was
+uploaded as is kept on the row (Software.file_name) for downloads.
+
+Any number of rows can share a stored name; its reference count is the
+number of Software.file and Software.thumbnail values equal to it (both
+indexed).  Rows let go of blobs in bulk actions and imports that never see
+them one by one, so nothing deletes a blob on the spot: `manage.py
+collect_media` deletes the blobs no row references once they have not been
+written or reused for SOFTWARE_MEDIA_GC_GRACE hours, which covers an upload
+whose row is saved after its blob.  Files derived from a blob (the
+thumbnail variants of software/thumbnails.py) are stored beside it as
+<hash>-<suffix> and deleted with it.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# .exe, .tar.gz; anything longer is dropped to keep names within max_length
+EXTENSION_RE = re.compile(r'(\.tar)?\.[a-z0-9]{1,5}$', re.IGNORECASE)
+CONTENT_NAME_RE = re.compile(r'(^|/)([0-9a-f]{2})/([0-9a-f]{2})/\2\3[0-9a-f]{60}((\.tar)?\.[a-z0-9]{1,5})?$')
+# Files derived from a blob, stored beside it: <hash>-320w.webp
+DERIVED_RE = re.compile(r'(^|/)([0-9a-f]{64})-[a-z0-9]+\.[a-z0-9]+$')
+TEMPORARY_PREFIX = '.blob-'
+
+
+def content_name(directory, digest, filename):
+    """Storage name of content with SHA-256 ``digest`` uploaded as ``filename``"""
+    match = EXTENSION_RE.search(filename)
+    extension = match.group().lower() if match else ''
+    return posixpath.join(directory, digest[:2], digest[2:4], digest + extension)
+
+
+def is_content_name(name):
+    return bool(name and CONTENT_NAME_RE.search(name))
+
+
+def is_derived_name(name):
+    return bool(name and DERIVED_RE.search(name))
+
+
+def derived_name(name, suffix):
+    """Name of the file derived from blob ``name`` with ``suffix`` ('320w.webp')"""
+    directory, filename = posixpath.split(name)
+    return posixpath.join(directory, f"{filename.split('.', 1)[0]}-{suffix}")
+
+
+def referenced(names):
+    """The subset of ``names`` that some Software row refers to"""
+    from .models import Software
+
+    names = list(names)
+    return (
+        set(Software.objects.filter(file__in=names).values_list('file', flat=True))
+        | set(Software.objects.filter(thumbnail__in=names).values_list('thumbnail', flat=True))
+    )
+
+
+def reference_count(name):
+    from .models import Software
+
+    return Software.objects.filter(file=name).count() + Software.objects.filter(thumbnail=name).count()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that names files by their content (see module docstring)
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # _save() picks the name from the content: an existing file with that
+        # name holds the same bytes, so there is nothing to avoid
+        return name
+
+    def _touch(self, path):
+        # Reuse counts as a write for the garbage collector's grace period
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _publish(self, temporary, name):
+        """Move a finished temporary file to ``name`` unless the blob exists"""
+        path = self.path(name)
+        if self._touch(path):
+            os.unlink(temporary)
+            return name
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(temporary, self.file_permissions_mode)
+        # Writers of the same blob race harmlessly: the bytes are identical
+        os.replace(temporary, path)
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        root = self.path(directory)
+        os.makedirs(root, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=root, prefix=TEMPORARY_PREFIX, delete=False) as temporary:
+            try:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    temporary.write(chunk)
+            except BaseException:
+                temporary.close()
+                os.unlink(temporary.name)
+                raise
+        return self._publish(
+            temporary.name, content_name(directory, digest.hexdigest(), posixpath.basename(name))
+        )
+
+    def save_derived(self, name, suffix, content):
+        """
+        Store ``content`` (bytes) as the file derived from blob ``name`` with
+        ``suffix`` and return its name.  Derived files share their blob's
+        lifetime: collect_media deletes them once the blob is gone.
+        """
+        target = derived_name(name, suffix)
+        root = os.path.dirname(self.path(target))
+        os.makedirs(root, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=root, prefix=TEMPORARY_PREFIX, delete=False) as temporary:
+            temporary.write(content)
+        if self.file_permissions_mode is not None:
+            os.chmod(temporary.name, self.file_permissions_mode)
+        # Rendering again replaces the file
+        os.replace(temporary.name, self.path(target))
+        return target
+
+    def adopt(self, path, name, digest):
+        """
+        Store the local file at ``path``, whose SHA-256 is ``digest``, as if
+        saved under ``name`` without reading it: a hard link when ``path`` is
+        on the same filesystem, a copy otherwise.  ``path`` is left in place.
+        """
+        name = content_name(posixpath.dirname(name), digest, posixpath.basename(name))
+        if self._touch(self.path(name)):
+            return name
+        root = os.path.dirname(self.path(name))
+        os.makedirs(root, exist_ok=True)
+        temporary = os.path.join(root, f'{TEMPORARY_PREFIX}{digest}-{os.getpid()}')
+        try:
+            os.link(path, temporary)
+        except FileExistsError:
+            os.unlink(temporary)
+            os.link(path, temporary)
+        except OSError:
+            shutil.copyfile(path, temporary)
+        return self._publish(temporary, name)
@@ -0,0 +1,337 @@
+"""
+In-process typeahead index for software titles and category names.
+
+Each worker holds a compact index so /api/software/suggest/ answers from
+memory without touching the database:
+
+- entries live in parallel arrays/lists (no model instances are kept),
+- prefix lookups bisect a sorted list of keys (the full label plus every
+  word start, so "edi" finds "Photo Editor"),
+- fuzzy lookups count shared trigrams through an inverted index of
+  array('I') posting lists.
+
+Saves and deletes in this process are applied immediately through signals.
+Other workers notice a bumped version in the shared default cache (or
+their refresh interval running out) and pull only the rows whose updated_at moved; a full
+rebuild every SOFTWARE_SUGGEST_REBUILD_INTERVAL seconds catches deletes made
+elsewhere.  The index holds at most SOFTWARE_SUGGEST_MAX_ENTRIES software
+rows, the most downloaded first.
+"""
+import logging
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Software, SoftwareCategory
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'software:suggest:version'
+
+SOFTWARE = 0
+CATEGORY = 1
+KIND_NAMES = ('software', 'category')
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse whitespace"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split())
+
+
+def trigrams(text):
+    """Trigrams of every word, padded like pg_trgm"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class SuggestIndex:
+    """
+    Array-backed prefix and trigram index.  Entries are never removed in
+    place: updates append a new entry and tombstone the old one, and the
+    index is rebuilt when tombstones pile up.
+
+    Writers hold the manager's lock but readers do not, so every structure
+    only grows by appends, and the prefix keys are rebuilt by sort() and
+    swapped in as one (keys, entries) tuple.
+    """
+    __slots__ = (
+        'kinds', 'ids', 'weights', 'gram_counts', 'labels', 'alive', 'positions',
+        'prefixes', 'staged', 'grams', 'dead', 'version', 'synced_at', 'built_at',
+    )
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.ids = array('q')
+        self.weights = array('q')
+        self.gram_counts = array('H')
+        self.labels = []
+        self.alive = bytearray()
+        self.positions = {}          # (kind, id) -> entry number
+        self.prefixes = ([], array('I'))  # sorted prefix keys, entry number for each key
+        self.staged = []             # (key, entry) added since the last sort()
+        self.grams = {}              # trigram -> array('I') of entry numbers
+        self.dead = 0
+        self.version = None
+        self.synced_at = None
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def add(self, kind, pk, label, weight=0, keep_sorted=True):
+        """Add or replace an entry; batches pass keep_sorted=False and call sort()"""
+        self.remove(kind, pk)
+        entry = len(self.labels)
+        self.kinds.append(kind)
+        self.ids.append(pk)
+        self.weights.append(weight)
+        self.labels.append(label)
+        self.alive.append(1)
+        self.positions[(kind, pk)] = entry
+
+        key = normalize(label)
+        words = key.split(' ')
+        for i in range(len(words)):
+            self.staged.append((' '.join(words[i:]), entry))
+        grams = trigrams(key)
+        self.gram_counts.append(min(len(grams), 65535))
+        for gram in grams:
+            postings = self.grams.get(gram)
+            if postings is None:
+                postings = self.grams[gram] = array('I')
+            postings.append(entry)
+        if keep_sorted:
+            self.sort()
+
+    def sort(self):
+        """Merge the staged prefix keys into new sorted lists and publish them"""
+        if not self.staged:
+            return
+        keys, entries = self.prefixes
+        keys = keys + [key for key, _ in self.staged]
+        entries = entries + array('I', (entry for _, entry in self.staged))
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.prefixes = ([keys[i] for i in order], array('I', (entries[i] for i in order)))
+        self.staged = []
+
+    def remove(self, kind, pk):
+        entry = self.positions.pop((kind, pk), None)
+        if entry is not None:
+            self.alive[entry] = 0
+            self.dead += 1
+
+    @property
+    def needs_compaction(self):
+        return self.dead > 1000 and self.dead > len(self.labels) // 4
+
+    def entry(self, number):
+        kind = self.kinds[number]
+        pk = self.ids[number]
+        if kind == SOFTWARE:
+            url = reverse('software:software_detail', args=[pk])
+        else:
+            url = f"{reverse('software:software_list')}?category={pk}"
+        return {'type': KIND_NAMES[kind], 'id': pk, 'label': self.labels[number], 'url': url}
+
+    def prefix(self, query, limit):
+        """Entries whose label, or a word in it, starts with the query"""
+        matches = {}
+        keys, key_entries = self.prefixes
+        position = bisect_left(keys, query)
+        # Scan a bounded window of keys sharing the prefix
+        for offset in range(position, min(position + limit * 20, len(keys))):
+            if not keys[offset].startswith(query):
+                break
+            entry = key_entries[offset]
+            if self.alive[entry]:
+                # Whole-label matches rank above word-start matches
+                full = keys[offset] == normalize(self.labels[entry])
+                matches[entry] = max(matches.get(entry, 0), 2 if full else 1)
+        return sorted(matches, key=lambda e: (-matches[e], -self.weights[e], self.labels[e]))[:limit]
+
+    def fuzzy(self, query, limit, threshold=0.4):
+        """
+        Entries containing enough of the query's trigrams, i.e. a word that
+        looks like what was typed (similar to pg_trgm word_similarity)
+        """
+        query_grams = trigrams(query)
+        postings = sorted((self.grams.get(gram, ()) for gram in query_grams), key=len)
+        # Very common trigrams barely discriminate; only count them when
+        # nothing rarer is available
+        max_postings = max(5000, len(self.labels) // 4)
+        shared = Counter()
+        for i, entries in enumerate(postings):
+            if i and len(entries) > max_postings:
+                break
+            shared.update(entries)
+        scored = []
+        for entry, count in shared.items():
+            if not self.alive[entry]:
+                continue
+            similarity = count / len(query_grams)
+            if similarity >= threshold:
+                scored.append((-similarity, self.gram_counts[entry], -self.weights[entry], entry))
+        scored.sort()
+        return [entry for *_, entry in scored[:limit]]
+
+    def suggest(self, query, limit=8):
+        query = normalize(query)
+        if not query:
+            return []
+        entries = self.prefix(query, limit)
+        if len(entries) < limit and len(query) >= 3:
+            entries += [e for e in self.fuzzy(query, limit) if e not in entries][:limit - len(entries)]
+        return [self.entry(entry) for entry in entries]
+
+    def memory_usage(self):
+        """Approximate bytes held by the index structures"""
+        keys, key_entries = self.prefixes
+        size = sum(sys.getsizeof(part) for part in (
+            self.kinds, self.ids, self.weights, self.alive, key_entries,
+            self.labels, keys, self.positions, self.grams,
+        ))
+        size += sum(sys.getsizeof(label) for label in self.labels)
+        size += sum(sys.getsizeof(key) for key in keys)
+        size += sum(sys.getsizeof(gram) + sys.getsizeof(postings) for gram, postings in self.grams.items())
+        return size
+
+
+class SuggestIndexManager:
+    """
+    Owns the per-process index and keeps it fresh
+    """
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._last_sync = 0.0
+
+    def build(self):
+        started = time.monotonic()
+        index = SuggestIndex()
+        index.version = cache.get(VERSION_KEY)
+        index.synced_at = timezone.now()
+        for pk, name in SoftwareCategory.objects.filter(is_active=True).values_list('pk', 'name').iterator():
+            index.add(CATEGORY, pk, name, keep_sorted=False)
+        software = (
+            Software.active
+            .order_by('-download_count')
+            .values_list('pk', 'title', 'download_count')[:settings.SOFTWARE_SUGGEST_MAX_ENTRIES]
+        )
+        for pk, title, downloads in software.iterator():
+            index.add(SOFTWARE, pk, title, downloads, keep_sorted=False)
+        index.sort()
+        logger.info(
+            'Built suggest index: %d entries, ~%d KiB, %.0f ms',
+            len(index), index.memory_usage() // 1024, (time.monotonic() - started) * 1000,
+        )
+        return index
+
+    def warm(self):
+        """Build the index up front (called from wsgi.py at worker start)"""
+        try:
+            self.get_index()
+        except Exception:
+            logger.exception('Could not build the suggest index')
+
+    def sync(self, index):
+        """Apply rows changed since the last sync"""
+        since = index.synced_at
+        index.synced_at = timezone.now()
+        for pk, name, active in SoftwareCategory.objects.filter(
+            updated_at__gte=since
+        ).values_list('pk', 'name', 'is_active'):
+            self.apply(index, CATEGORY, pk, name, active)
+        for pk, title, downloads, active in Software.objects.filter(
+            updated_at__gte=since
+        ).values_list('pk', 'title', 'download_count', 'is_active'):
+            self.apply(index, SOFTWARE, pk, title, active, downloads)
+        index.sort()
+
+    def apply(self, index, kind, pk, label, active, weight=0):
+        """Apply one change; the caller publishes the prefix keys with index.sort()"""
+        if not active:
+            index.remove(kind, pk)
+        elif kind == CATEGORY or (kind, pk) in index.positions or len(index) < settings.SOFTWARE_SUGGEST_MAX_ENTRIES:
+            index.add(kind, pk, label, weight, keep_sorted=False)
+
+    def get_index(self):
+        index = self._index
+        now = time.monotonic()
+        if index is not None and now - self._last_check < 1:
+            return index
+        with self._lock:
+            index = self._index
+            self._last_check = now
+            if index is None or index.needs_compaction or now - index.built_at > settings.SOFTWARE_SUGGEST_REBUILD_INTERVAL:
+                self._index = index = self.build()
+                self._last_sync = now
+            else:
+                version = cache.get(VERSION_KEY)
+                if version != index.version or now - self._last_sync > settings.SOFTWARE_SUGGEST_REFRESH_INTERVAL:
+                    index.version = version
+                    self._last_sync = now
+                    self.sync(index)
+        return index
+
+    def suggest(self, query, limit=8):
+        return self.get_index().suggest(query, limit)
+
+    def changed(self, kind, pk, label, active, weight=0):
+        """Apply a local change and tell the other workers about it"""
+        self.changed_many(kind, [(pk, label, active, weight)])
+
+    def changed_many(self, kind, rows):
+        """changed() for (pk, label, active, weight) rows, telling the other workers once"""
+        index = self._index
+        if index is not None:
+            with self._lock:
+                for pk, label, active, weight in rows:
+                    self.apply(index, kind, pk, label, active, weight)
+                index.sort()
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
+        if index is not None:
+            index.version = cache.get(VERSION_KEY)
+
+
+suggest_index = SuggestIndexManager()
+
+
+@receiver(post_save, sender=Software)
+def software_saved(sender, instance, **kwargs):
+    suggest_index.changed(SOFTWARE, instance.pk, instance.title, instance.is_active, instance.download_count)
+
+
+@receiver(post_delete, sender=Software)
+def software_deleted(sender, instance, **kwargs):
+    suggest_index.changed(SOFTWARE, instance.pk, instance.title, False)
+
+
+@receiver(post_save, sender=SoftwareCategory)
+def category_saved(sender, instance, **kwargs):
+    suggest_index.changed(CATEGORY, instance.pk, instance.name, instance.is_active)
+
+
+@receiver(post_delete, sender=SoftwareCategory)
+def category_deleted(sender, instance, **kwargs):
+    suggest_index.changed(CATEGORY, instance.pk, instance.name, False)
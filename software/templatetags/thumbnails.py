@@ -0,0 +1,84 @@
+"""
+Markup for thumbnails and their resized variants (software/thumbnails.py).
+
+    {% load thumbnails %}
+    {% thumbnail_picture software sizes="(max-width: 640px) 100vw, 320px" alt=software.title %}
+    <img srcset="{{ software|srcset }}" ...>
+    {% thumbnail_variant software 1280 as image %}{{ image.url }} {{ image.width }}x{{ image.height }}
+
+Every tag falls back to the original thumbnail while the row has no
+variants of it.
+"""
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+from software.thumbnails import variants_for
+
+register = template.Library()
+
+
+def _variants(data, fmt):
+    return sorted((variant for variant in data['variants'] if variant['format'] == fmt), key=lambda v: v['width'])
+
+
+def _srcset(software, data, fmt):
+    storage = software.thumbnail.storage
+    return ', '.join(f"{storage.url(variant['name'])} {variant['width']}w" for variant in _variants(data, fmt))
+
+
+@register.filter
+def srcset(software, fmt='webp'):
+    """srcset of the row's ``fmt`` variants, '' while there are none"""
+    data = variants_for(software)
+    return _srcset(software, data, fmt) if data else ''
+
+
+@register.simple_tag
+def thumbnail_variant(software, width=None, fmt='webp'):
+    """
+    {'url', 'width', 'height'} of the narrowest ``fmt`` variant at least
+    ``width`` wide (the widest if none is), or of the original.  The size
+    of an original is only known once its variants exist.
+    """
+    if not software.thumbnail:
+        return None
+    data = variants_for(software)
+    variants = _variants(data, fmt) if data else []
+    if variants:
+        variant = next((v for v in variants if width is None or v['width'] >= int(width)), variants[-1])
+        return {
+            'url': software.thumbnail.storage.url(variant['name']),
+            'width': variant['width'],
+            'height': variant['height'],
+        }
+    return {
+        'url': software.thumbnail.url,
+        'width': data['width'] if data else None,
+        'height': data['height'] if data else None,
+    }
+
+
+@register.simple_tag
+def thumbnail_picture(software, sizes='100vw', **attrs):
+    """
+    <picture> of the row's thumbnail: a <source> per variant format and the
+    original as the <img>, which gets ``attrs``, its intrinsic size and the
+    inline placeholder as background until the image loads
+    """
+    img = {'src': software.thumbnail.url, 'loading': 'lazy', 'decoding': 'async', **attrs}
+    data = variants_for(software)
+    if data is None:
+        return format_html('<img{}>', flatatt(img))
+    img.update(
+        width=data['width'],
+        height=data['height'],
+        style=f'background: url("{data["placeholder"]}") center / cover no-repeat; {attrs.get("style", "")}'.strip(),
+    )
+    formats = [fmt for fmt in ('avif', 'webp') if any(v['format'] == fmt for v in data['variants'])]
+    sources = format_html_join(
+        '', '<source type="image/{}" srcset="{}" sizes="{}">',
+        ((fmt, _srcset(software, data, fmt), sizes) for fmt in formats),
+    )
+    # display: contents keeps the <img> sized by the thumbnail's container
+    return format_html('<picture style="display: contents">{}<img{}></picture>', sources, flatatt(img))
@@ -1,3 +1,788 @@
-from django.test import TestCase
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, router, transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from AdminPage import listing
+
+from . import db_router, prerender, rollups, views
+from .changes import ChangeFeed
+from .checks import check_shared_caches
+from .counters import download_counter
+from .models import DeletedRecord, DownloadEvent, DownloadRollupState, Software, SoftwareCategory
+from .pagination import decode_cursor, encode_cursor
+from .suggest import SOFTWARE, SuggestIndex
+
+
+def make_software(**kwargs):
+    kwargs.setdefault('title', 'Example')
+    kwargs.setdefault('description', 'An example program')
+    kwargs.setdefault('file', 'software_files/example.exe')
+    return Software.objects.create(**kwargs)
+
+
+class CacheClearingTestCase(TestCase):
+    """Cached pages and counters must not leak between tests"""
+
+    def setUp(self):
+        for cache in caches.all(initialized_only=True):
+            cache.clear()
+        download_counter._dirty.clear()
+        download_counter._events.clear()
+
+
+@override_settings(SOFTWARE_THUMBNAIL_WORKERS=0)
+class MediaTestCase(CacheClearingTestCase):
+    """Stores files in a temporary MEDIA_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        overrides = override_settings(MEDIA_ROOT=media)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+class SearchIndexTests(CacheClearingTestCase):
+
+    def test_rows_created_after_migrating_are_searchable(self):
+        # Migrations that rebuild software_software must reinstall the triggers
+        category = SoftwareCategory.objects.create(name='Tools')
+        software = make_software(title='Frobnicator', category=category)
+
+        response = self.client.get('/api/software/', {'search': 'frobnic'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()['software']], [software.pk])
+
+    def test_renamed_rows_are_searchable_under_the_new_title(self):
+        software = make_software(title='Frobnicator')
+        software.title = 'Defrobnicator'
+        software.save()
+
+        response = self.client.get('/api/software/', {'search': 'defrob'})
+        self.assertEqual([row['id'] for row in response.json()['software']], [software.pk])
+        response = self.client.get('/api/software/', {'search': 'frobnicator'})
+        self.assertEqual(response.json()['software'], [])
+
+
+class CursorPaginationTests(CacheClearingTestCase):
+
+    def tampered_cursor(self):
+        return encode_cursor({'k': ['not a date', 'not an id']})
+
+    def test_pages_follow_the_next_cursor(self):
+        created = [make_software(title=f'Program {n}') for n in range(3)]
+
+        first = self.client.get('/api/software/', {'limit': 2}).json()
+        second = self.client.get('/api/software/', {'limit': 2, 'cursor': first['next']}).json()
+
+        ids = [row['id'] for row in first['software'] + second['software']]
+        self.assertEqual(ids, [software.pk for software in reversed(created)])
+        self.assertIsNone(second['next'])
+
+    def test_tampered_cursor_is_rejected_by_the_api(self):
+        response = self.client.get('/api/software/', {'cursor': self.tampered_cursor()})
+        self.assertEqual(response.status_code, 400)
+
+    def test_tampered_cursor_is_not_found_on_the_list(self):
+        response = self.client.get('/', {'cursor': self.tampered_cursor()})
+        self.assertEqual(response.status_code, 404)
+
+    def test_undecodable_cursor_is_rejected(self):
+        response = self.client.get('/api/software/', {'cursor': '!!!'})
+        self.assertEqual(response.status_code, 400)
+
+
+LOCMEM = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+FILE_CACHE = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/software-tests-cache'}
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+
+    def error_ids(self):
+        return [error.id for error in check_shared_caches(None)]
+
+    @override_settings(CACHES={'default': LOCMEM})
+    def test_process_local_default_cache_is_an_error(self):
+        self.assertEqual(self.error_ids(), ['software.E003', 'software.E004'])
+
+    @override_settings(
+        CACHES={'default': FILE_CACHE, 'counters': LOCMEM},
+        SOFTWARE_DOWNLOAD_COUNTER_CACHE='counters',
+    )
+    def test_process_local_counter_cache_is_an_error(self):
+        self.assertEqual(self.error_ids(), ['software.E004'])
+
+    @override_settings(
+        CACHES={'default': FILE_CACHE, 'counters': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'software_counters',
+        }},
+        SOFTWARE_DOWNLOAD_COUNTER_CACHE='counters',
+    )
+    def test_database_counter_cache_is_an_error(self):
+        self.assertEqual(self.error_ids(), ['software.E004'])
+
+    @override_settings(CACHES={'default': FILE_CACHE})
+    def test_shared_default_cache_passes(self):
+        self.assertEqual(self.error_ids(), [])
+
+
+@override_settings(SOFTWARE_CHANGES_SAFETY_LAG=0)
+class ChangeFeedTests(CacheClearingTestCase):
+
+    def feed(self, **params):
+        response = self.client.get('/api/software/changes/', params)
+        if response.status_code != 200:
+            return response.status_code, []
+        return 200, [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def changes(self, records):
+        return {(record['type'], record['id'], record.get('deleted', False)) for record in records[:-1]}
+
+    def test_export_sends_every_row_once_in_keyset_batches(self):
+        category = SoftwareCategory.objects.create(name='Tools')
+        software = [make_software(title=f'Program {n}', category=category, is_active=n % 5 != 0) for n in range(25)]
+
+        feed = ChangeFeed(batch_size=10, safety_lag=0)
+        # One query per batch: categories, three of software, deletions
+        with self.assertNumQueries(1 + 3 + 1):
+            records = [json.loads(line) for line in feed]
+
+        sent = [(record['type'], record['id']) for record in records[:-1]]
+        self.assertEqual(len(sent), len(set(sent)))
+        self.assertEqual(
+            self.changes(records),
+            {('category', category.pk, False)}
+            | {('software', row.pk, not row.is_active) for row in software},
+        )
+        self.assertEqual(records[-1]['count'], 26)
+
+    def test_resuming_returns_only_later_edits_and_deletions(self):
+        software = [make_software(title=f'Program {n}') for n in range(3)]
+        _, records = self.feed()
+        cursor = records[-1]['cursor']
+
+        software[1].title = 'Program 1 (edited)'
+        software[1].save()
+        removed = software[2].pk
+        software[2].delete()
+
+        status, records = self.feed(cursor=cursor)
+        self.assertEqual(status, 200)
+        self.assertEqual(self.changes(records), {('software', software[1].pk, False), ('software', removed, True)})
+
+    def test_idle_streams_do_not_expire_a_fresh_cursor(self):
+        category = SoftwareCategory.objects.create(name='Tools')
+        SoftwareCategory.objects.filter(pk=category.pk).update(updated_at=timezone.now() - timedelta(days=365))
+        make_software()
+        _, records = self.feed()
+
+        status, _ = self.feed(cursor=records[-1]['cursor'])
+        self.assertEqual(status, 200)
+
+    def test_cursor_issued_before_the_retention_is_gone(self):
+        make_software()
+        _, records = self.feed()
+        payload = decode_cursor(records[-1]['cursor'])
+        payload['u'] = (timezone.now() - timedelta(days=365)).isoformat()
+
+        status, _ = self.feed(cursor=encode_cursor(payload))
+        self.assertEqual(status, 410)
+
+    def test_since_before_the_retention_is_gone(self):
+        status, _ = self.feed(since=(timezone.now() - timedelta(days=365)).isoformat())
+        self.assertEqual(status, 410)
+
+    def test_deletions_are_kept_as_tombstones(self):
+        software = make_software()
+        pk = software.pk
+        software.delete()
+        self.assertTrue(DeletedRecord.objects.filter(kind=DeletedRecord.SOFTWARE, object_id=pk).exists())
+
+
+@override_settings(SOFTWARE_DOWNLOAD_BACKEND='stream', SOFTWARE_DOWNLOAD_COUNTER_FLUSH_INTERVAL=3600)
+class DownloadTests(MediaTestCase):
+    content = b'0123456789abcdefghij'
+
+    def setUp(self):
+        super().setUp()
+        self.software = make_software(title='Setup', file=ContentFile(self.content, name='setup.exe'))
+        self.factory = RequestFactory()
+
+    def download(self, method='get', **headers):
+        request = getattr(self.factory, method)(f'/software/{self.software.pk}/download/', **headers)
+        response = views.software_download(request, pk=self.software.pk)
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        if not response.streaming:
+            return response.content
+        return b''.join(response.streaming_content)
+
+    def pending(self):
+        return download_counter.pending([self.software.pk]).get(self.software.pk, 0)
+
+    def test_whole_file(self):
+        response = self.download()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('setup.exe', response['Content-Disposition'])
+        self.assertEqual(self.pending(), 1)
+
+    def test_single_range(self):
+        response = self.download(HTTP_RANGE='bytes=2-5')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.content[2:6])
+        self.assertEqual(response['Content-Range'], f'bytes 2-5/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '4')
+
+    def test_multiple_ranges(self):
+        response = self.download(HTTP_RANGE='bytes=0-1,-3')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        body = self.body(response)
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertIn(b'Content-Range: bytes 0-1/20\r\n\r\n01\r\n', body)
+        self.assertIn(b'Content-Range: bytes 17-19/20\r\n\r\nhij\r\n', body)
+
+    def test_unsatisfiable_range(self):
+        response = self.download(HTTP_RANGE='bytes=100-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+        self.assertEqual(self.pending(), 0)
+
+    def test_resumed_range_is_not_counted_again(self):
+        self.body(self.download(HTTP_RANGE='bytes=0-9'))
+        self.body(self.download(HTTP_RANGE='bytes=10-'))
+
+        self.assertEqual(self.pending(), 1)
+
+    def test_stale_if_range_sends_the_whole_file(self):
+        response = self.download(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"stale"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+
+    def test_current_if_range_sends_the_range(self):
+        etag = self.download(method='head')['ETag']
+
+        response = self.download(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE=etag)
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.content[2:6])
+
+    def test_head(self):
+        response = self.download(method='head')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(self.body(response), b'')
+        self.assertEqual(self.pending(), 0)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.download(method='head')['ETag']
+
+        response = self.download(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.pending(), 0)
+
+
+class AsyncDownloadTests(DownloadTests):
+    """The same requests through the ASGI download view"""
+
+    def download(self, method='get', **headers):
+        request = getattr(self.factory, method)(f'/software/{self.software.pk}/download/', **headers)
+        response = async_to_sync(views.async_software_download)(request, pk=self.software.pk)
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        if not response.streaming:
+            return response.content
+        self.assertTrue(response.is_async)
+
+        async def read():
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        return async_to_sync(read)()
+
+
+@override_settings(SOFTWARE_DOWNLOAD_BACKEND='accel')
+class AccelDownloadTests(DownloadTests):
+    """nginx serves the bytes and checks its own validators"""
+    # nginx's ETag for a file, which Django never issues
+    nginx_etag = '"6530f2a1-14"'
+
+    def test_whole_file(self):
+        response = self.download()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.software.file.name}')
+        self.assertIn('setup.exe', response['Content-Disposition'])
+        self.assertEqual(self.pending(), 1)
+
+    def test_resumed_range_is_not_counted_again(self):
+        self.download(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=self.nginx_etag)
+        response = self.download(HTTP_RANGE='bytes=10-', HTTP_IF_RANGE=self.nginx_etag)
+
+        self.assertIn('X-Accel-Redirect', response)
+        self.assertEqual(self.pending(), 1)
+
+    def test_revalidation_is_left_to_nginx_and_not_counted(self):
+        response = self.download(HTTP_IF_NONE_MATCH=self.nginx_etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Accel-Redirect', response)
+        self.assertEqual(self.pending(), 0)
+
+    def test_head(self):
+        self.download(method='head')
+        self.assertEqual(self.pending(), 0)
+
+    # Ranges and validators are answered by nginx
+    test_single_range = test_multiple_ranges = test_unsatisfiable_range = None
+    test_stale_if_range_sends_the_whole_file = test_current_if_range_sends_the_range = None
+    test_matching_etag_is_not_modified = None
+
+
+@override_settings(SOFTWARE_DOWNLOAD_COUNTER_FLUSH_INTERVAL=3600, SOFTWARE_DOWNLOAD_EVENT_BATCH_SIZE=100000)
+class DownloadCounterTests(CacheClearingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.software = make_software()
+
+    def count(self):
+        return Software.objects.values_list('download_count', flat=True).get(pk=self.software.pk)
+
+    def test_downloads_are_buffered_until_flushed(self):
+        for _ in range(3):
+            download_counter.incr(self.software.pk)
+        self.assertEqual(self.count(), 0)
+        self.assertEqual(download_counter.pending([self.software.pk]), {self.software.pk: 3})
+
+        self.assertEqual(download_counter.flush(), 3)
+
+        self.assertEqual(self.count(), 3)
+        self.assertEqual(download_counter.pending([self.software.pk]), {})
+        self.assertEqual(DownloadEvent.objects.filter(software=self.software).count(), 3)
+
+    def test_flush_leaves_updated_at_alone(self):
+        updated_at = Software.objects.get(pk=self.software.pk).updated_at
+        download_counter.incr(self.software.pk)
+        download_counter.flush()
+        self.assertEqual(Software.objects.get(pk=self.software.pk).updated_at, updated_at)
+
+    def test_racing_flushers_claim_each_download_once(self):
+        for _ in range(5):
+            download_counter.incr(self.software.pk)
+        # Both flushers read the pending count before either claims it
+        pending = download_counter.pending([self.software.pk])
+
+        first = download_counter._claim(pending)
+        second = download_counter._claim(pending)
+
+        self.assertEqual(first, {self.software.pk: 5})
+        self.assertEqual(second, {})
+        self.assertEqual(download_counter.pending([self.software.pk]), {})
+
+    def test_racing_flushers_claim_once_when_decr_stops_at_zero(self):
+        cache = download_counter.cache
+
+        def decr(key, delta=1, version=None):
+            # memcached clamps at zero instead of going negative
+            value = max(cache.get(key) - delta, 0)
+            cache.set(key, value, timeout=None)
+            return value
+
+        for _ in range(5):
+            download_counter.incr(self.software.pk)
+        pending = download_counter.pending([self.software.pk])
+
+        with mock.patch.object(cache, 'decr', side_effect=decr):
+            first = download_counter._claim(pending)
+            second = download_counter._claim(pending)
+
+        self.assertEqual(first, {self.software.pk: 5})
+        self.assertEqual(second, {})
+
+    def test_claim_puts_back_downloads_counted_after_the_read(self):
+        download_counter.incr(self.software.pk, 2)
+        pending = download_counter.pending([self.software.pk])
+        other = download_counter._claim(pending)
+        download_counter.incr(self.software.pk, 1)
+
+        # A stale read of 2 may only take the one download left
+        self.assertEqual(download_counter._claim(pending), {self.software.pk: 1})
+        self.assertEqual(other, {self.software.pk: 2})
+
+    def test_concurrent_increments_and_flushes_are_exact(self):
+        threads, per_thread = 8, 250
+        start = threading.Barrier(threads + 1)
+
+        def download():
+            start.wait()
+            for _ in range(per_thread):
+                download_counter.incr(self.software.pk)
+
+        workers = [threading.Thread(target=download) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        start.wait()
+        flushed = 0
+        while any(worker.is_alive() for worker in workers):
+            flushed += download_counter.flush([self.software.pk])
+        for worker in workers:
+            worker.join()
+        flushed += download_counter.flush([self.software.pk])
+
+        self.assertEqual(flushed, threads * per_thread)
+        self.assertEqual(self.count(), threads * per_thread)
+        self.assertEqual(DownloadEvent.objects.filter(software=self.software).count(), threads * per_thread)
+
+
+class RollupTests(TestCase):
+    """Events are folded into the rollups once, even when they commit late"""
+
+    def setUp(self):
+        self.software = make_software()
+
+    def event(self, **kwargs):
+        return DownloadEvent.objects.create(software=self.software, **kwargs)
+
+    def total(self):
+        return sum(day['downloads'] for day in rollups.daily_downloads(days=1, software=self.software))
+
+    def age_horizon(self):
+        DownloadRollupState.objects.update(horizon_at=timezone.now() - timedelta(minutes=5))
+
+    def test_without_a_lag_every_event_is_folded(self):
+        for _ in range(3):
+            self.event()
+        self.assertEqual(rollups.rollup_downloads(safety_lag=0), 3)
+        self.assertEqual(self.total(), 3)
+
+    def test_recent_event_ids_are_held_back(self):
+        self.event()
+        self.assertEqual(rollups.rollup_downloads(safety_lag=60), 0)
+        # Still within the lag
+        self.assertEqual(rollups.rollup_downloads(safety_lag=60), 0)
+
+        self.age_horizon()
+        self.event()
+        self.assertEqual(rollups.rollup_downloads(safety_lag=60), 1)
+        self.assertEqual(self.total(), 1)
+
+        self.age_horizon()
+        self.assertEqual(rollups.rollup_downloads(safety_lag=60), 1)
+        self.assertEqual(self.total(), 2)
+
+    def test_event_committed_below_a_seen_id_is_not_skipped(self):
+        first = self.event()
+        last = self.event(id=first.pk + 2)
+        rollups.rollup_downloads(safety_lag=60)
+
+        # The batch that was handed the id in between commits after the run
+        self.event(id=first.pk + 1)
+        self.age_horizon()
+
+        self.assertEqual(rollups.rollup_downloads(safety_lag=60), 3)
+        self.assertEqual(self.total(), 3)
+        self.assertEqual(DownloadRollupState.get().last_event_id, last.pk)
+
+
+# Plan lines meaning "full table scan" or "sort without an index"
+BAD_PLAN_PATTERNS = {
+    'sqlite': [
+        re.compile(r'SCAN software_software$', re.M),
+        re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+    ],
+    'postgresql': [
+        re.compile(r'Seq Scan on software_software'),
+        re.compile(r'^\s*(->\s*)?(Incremental )?Sort\b', re.M),
+    ],
+}
+
+
+class QueryPlanTests(TestCase):
+    """The hot Software queries must use an index for both filtering and ordering"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(0)
+        categories = SoftwareCategory.objects.bulk_create(
+            [SoftwareCategory(name=f'Plan check {i}') for i in range(20)]
+        )
+        cls.now = timezone.now()
+        Software.objects.bulk_create(
+            [
+                Software(
+                    title=f'Plan check {i}',
+                    description='',
+                    category=rng.choice(categories),
+                    upload_date=cls.now - timedelta(minutes=rng.randint(0, 10 ** 6)),
+                    download_count=rng.randint(0, 10 ** 5),
+                    is_active=rng.random() > 0.1,
+                    file=f'software_files/plan-check-{i}.bin',
+                )
+                for i in range(5000)
+            ],
+            batch_size=1000,
+        )
+        cls.category_id = categories[0].pk
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def hot_queries(self):
+        """The query shapes behind the public list, API, sitemaps and admin pages"""
+        now, category_id = self.now, self.category_id
+        admin_rows = listing.rows(listing.filtered())
+        return {
+            'list / api: newest first': Software.active.order_by('-upload_date', '-id')[:13],
+            'list / api: next page': Software.active.filter(
+                Q(upload_date__lte=now) & (Q(upload_date__lt=now) | Q(upload_date=now, id__lt=10 ** 9))
+            ).order_by('-upload_date', '-id')[:13],
+            'list / api: category filter': Software.active.filter(
+                category_id=category_id
+            ).order_by('-upload_date', '-id')[:13],
+            'detail / download: by pk': Software.active.filter(pk=1),
+            'dashboard: popular': Software.active.order_by('-download_count')[:10],
+            'dashboard: recent uploads': Software.active.order_by('-created_at')[:10],
+            'dashboard: pending reviews': Software.objects.filter(is_active=False).order_by('-created_at')[:5],
+            'sitemap: category lastmod': Software.active.filter(
+                category_id=category_id
+            ).order_by('-updated_at')[:1],
+            'sync: changed since': Software.objects.filter(updated_at__gte=now - timedelta(minutes=5)),
+            'changes feed: next batch': Software.objects.filter(
+                updated_at__gte=now - timedelta(minutes=5), updated_at__lt=now,
+            ).exclude(updated_at=now - timedelta(minutes=5), id__lte=10 ** 9).order_by('updated_at', 'id')[:1000],
+            'admin list: by title': admin_rows.order_by(*listing.ordering('title'))[:26],
+            'admin list: most downloads, next page': admin_rows.filter(
+                Q(download_count__lte=3) & (Q(download_count__lt=3) | Q(download_count=3, id__lt=10 ** 9))
+            ).order_by(*listing.ordering('-downloads'))[:26],
+            'admin list: by status': admin_rows.order_by(*listing.ordering('-status'))[:26],
+            'admin list: inactive, newest first': listing.rows(
+                listing.filtered(status='inactive')
+            ).order_by(*listing.ordering('-date'))[:26],
+        }
+
+    def test_hot_queries_use_indexes(self):
+        patterns = BAD_PLAN_PATTERNS.get(connection.vendor)
+        if patterns is None:
+            self.skipTest(f'No plan rules for the {connection.vendor} backend')
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertEqual([pattern.pattern for pattern in patterns if pattern.search(plan)], [], plan)
+
+
+REPLICAS = {'replica_1': {}, 'replica_2': {}}
+
+
+@override_settings(DATABASES={'default': settings.DATABASES['default'], **REPLICAS}, SOFTWARE_REPLICA_CHECK_INTERVAL=0)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Routing decisions only: replica health is mocked and nothing is queried"""
+
+    def setUp(self):
+        db_router._health.clear()
+        self.addCleanup(db_router._health.clear)
+        lag = mock.patch.object(db_router, 'measure_lag', return_value=0.0)
+        self.measure_lag = lag.start()
+        self.addCleanup(lag.stop)
+        self.factory = RequestFactory()
+
+    def read_alias(self):
+        return router.db_for_read(Software)
+
+    def through_middleware(self, request):
+        seen = {}
+
+        def view(request):
+            seen['alias'] = self.read_alias()
+            return HttpResponse()
+
+        response = db_router.PrimaryPinningMiddleware(view)(request)
+        return seen['alias'], response
+
+    def test_public_reads_go_to_a_replica(self):
+        self.assertIn(self.read_alias(), REPLICAS)
+
+    def test_writes_go_to_the_primary(self):
+        self.assertEqual(router.db_for_write(Software), DEFAULT_DB_ALIAS)
+
+    def test_reads_in_a_transaction_go_to_the_primary(self):
+        with mock.patch.object(transaction.get_connection(DEFAULT_DB_ALIAS), 'in_atomic_block', True):
+            self.assertEqual(self.read_alias(), DEFAULT_DB_ALIAS)
+
+    def test_use_primary(self):
+        with db_router.use_primary():
+            self.assertEqual(self.read_alias(), DEFAULT_DB_ALIAS)
+        self.assertIn(self.read_alias(), REPLICAS)
+
+    def test_writes_pin_the_browser_to_the_primary(self):
+        alias, _ = self.through_middleware(self.factory.get('/'))
+        self.assertIn(alias, REPLICAS)
+
+        alias, response = self.through_middleware(self.factory.post('/'))
+        self.assertEqual(alias, DEFAULT_DB_ALIAS)
+        cookie = response.cookies[db_router.PIN_COOKIE]
+
+        request = self.factory.get('/')
+        request.COOKIES[db_router.PIN_COOKIE] = cookie.value
+        alias, _ = self.through_middleware(request)
+        self.assertEqual(alias, DEFAULT_DB_ALIAS)
+        self.assertFalse(db_router.pinned())
+
+    @override_settings(SOFTWARE_REPLICA_MAX_LAG=1)
+    def test_lagging_replicas_are_skipped(self):
+        self.measure_lag.return_value = 5.0
+        self.assertEqual(self.read_alias(), DEFAULT_DB_ALIAS)
+
+    def test_unreachable_replicas_are_skipped(self):
+        self.measure_lag.side_effect = {'replica_1': None, 'replica_2': 0.0}.get
+        self.assertEqual({self.read_alias() for _ in range(20)}, {'replica_2'})
+
+        self.measure_lag.side_effect = None
+        self.measure_lag.return_value = None
+        self.assertEqual(self.read_alias(), DEFAULT_DB_ALIAS)
+
+    @override_settings(SOFTWARE_REPLICA_MAX_LAG=10)
+    def test_changes_feed_holds_back_the_replica_lag(self):
+        feed = ChangeFeed(safety_lag=0)
+
+        self.assertIn(feed.using, REPLICAS)
+        self.assertLess(feed.until, timezone.now() - timedelta(seconds=9))
+
+
+class SuggestIndexTests(SimpleTestCase):
+
+    def labels(self, index, query):
+        return [entry['label'] for entry in index.suggest(query)]
+
+    def test_added_entries_are_found(self):
+        index = SuggestIndex()
+        index.add(SOFTWARE, 1, 'Photo Editor', 10)
+        index.add(SOFTWARE, 2, 'Photo Viewer', 20)
+
+        self.assertEqual(self.labels(index, 'photo'), ['Photo Viewer', 'Photo Editor'])
+        self.assertEqual(self.labels(index, 'edi'), ['Photo Editor'])
+        self.assertEqual(self.labels(index, 'editr'), ['Photo Editor'])
+
+    def test_readers_keep_a_consistent_snapshot_of_the_prefix_keys(self):
+        index = SuggestIndex()
+        index.add(SOFTWARE, 1, 'Photo Editor')
+        keys, key_entries = index.prefixes
+
+        index.add(SOFTWARE, 2, 'Photo Viewer', keep_sorted=False)
+        self.assertEqual(index.prefix('photo v', 8), [])
+        index.sort()
+
+        # A lookup already holding the old lists sees them unchanged
+        self.assertEqual((keys, list(key_entries)), (['editor', 'photo editor'], [0, 0]))
+        self.assertEqual(index.prefix('photo v', 8), [1])
+
+    def test_lookups_while_entries_are_added(self):
+        index = SuggestIndex()
+        done = threading.Event()
+
+        def write():
+            for pk in range(1000):
+                index.add(SOFTWARE, pk, f'Tool {pk} editor', pk)
+            done.set()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        self.addCleanup(writer.join)
+        while not done.is_set():
+            for entry in index.suggest('tool 1'):
+                self.assertTrue(entry['label'].startswith('Tool 1'))
+        self.assertEqual(len(index.prefix('tool 999', 8)), 1)
+
+
+class PrerenderTests(SimpleTestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        overrides = override_settings(SOFTWARE_PRERENDER_ROOT=root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_included_templates_are_sources(self):
+        sources = [os.path.basename(source) for source in prerender.page_sources('/about-us/')]
+        self.assertEqual(sources, ['about_us.html', 'cookie_banner.html'])
+
+    def test_changed_included_template_makes_the_page_stale(self):
+        prerender.prerender_pages()
+        self.assertEqual(prerender.stale_pages(), [])
+
+        manifest_path = os.path.join(settings.SOFTWARE_PRERENDER_ROOT, prerender.MANIFEST)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        sources = manifest['pages']['/about-us/']['sources']
+        banner = next(source for source in sources if source.endswith('cookie_banner.html'))
+        sources[banner] = '0' * 64
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+
+        self.assertEqual(prerender.stale_pages(), ['/about-us/'])
+
+    def test_pages_with_a_csrf_token_are_not_prerendered(self):
+        self.assertNotIn('/contact-us/', [reverse(name) for name in prerender.PAGES])
+        with self.assertRaisesMessage(ValueError, 'CSRF'):
+            prerender.render_page('/contact-us/')
+
+
+class ApiETagTests(CacheClearingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.category = SoftwareCategory.objects.create(name='Tools')
+        make_software(category=self.category)
+
+    def etag(self, **params):
+        caches['pages'].clear()
+        return self.client.get('/api/software/', params)['ETag']
+
+    def test_unchanged_catalog_is_not_modified(self):
+        response = self.client.get('/api/software/', HTTP_IF_NONE_MATCH=self.etag())
+        self.assertEqual(response.status_code, 304)
+
+    def test_renaming_a_category_changes_the_etag(self):
+        before = self.etag()
+        self.category.name = 'Utilities'
+        self.category.save()
+
+        self.assertNotEqual(self.etag(), before)
+
+    def test_category_is_ignored_when_not_shown(self):
+        before = self.etag(fields='id,title')
+        self.category.name = 'Utilities'
+        self.category.save()
+
+        self.assertEqual(self.etag(fields='id,title'), before)
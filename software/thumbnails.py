@@ -0,0 +1,131 @@
+"""
+Resized WebP (and AVIF, where Pillow can write it) variants of thumbnails.
+
+When a row is saved with a new thumbnail, the variants are rendered once
+the transaction commits, in a pool of SOFTWARE_THUMBNAIL_WORKERS
+processes (software/imaging.py), so neither the request that saved it nor
+the thread serving pages decodes images.  Each width in
+SOFTWARE_THUMBNAIL_WIDTHS narrower than the original is stored beside the
+thumbnail blob as <hash>-<width>w.<format> (see software/storage.py) and
+recorded in Software.thumbnail_variants with its dimensions, together with
+the original's dimensions and a tiny inline placeholder.  Templates read
+them through the thumbnail tags (software/templatetags/thumbnails.py),
+which fall back to the original while the variants belong to another
+thumbnail or do not exist yet.
+
+Rows saved without signals (imports, migrate_media) are picked up by
+`manage.py generate_thumbnails`.  Only content-addressed thumbnails get
+variants, as their files are collected with the blob.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import imaging, page_cache
+from .models import Software
+from .storage import is_content_name
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variants_for(software):
+    """The row's thumbnail_variants when they belong to its current thumbnail, else None"""
+    data = software.thumbnail_variants
+    if data and software.thumbnail and data.get('source') == software.thumbnail.name:
+        return data
+    return None
+
+
+def render_args(name):
+    """Arguments of imaging.render() for thumbnail ``name``"""
+    storage = Software._meta.get_field('thumbnail').storage
+    return storage.path(name), settings.SOFTWARE_THUMBNAIL_WIDTHS, settings.SOFTWARE_THUMBNAIL_QUALITY
+
+
+def store(pk, name, category_id, result):
+    """
+    Save the variants imaging.render() made of thumbnail ``name`` and record
+    them on row ``pk``, unless its thumbnail changed meanwhile.  Returns
+    whether the row was updated.
+    """
+    storage = Software._meta.get_field('thumbnail').storage
+    variants = [
+        {
+            'name': storage.save_derived(name, f"{variant['width']}w.{variant['format']}", variant['content']),
+            'format': variant['format'],
+            'width': variant['width'],
+            'height': variant['height'],
+        }
+        for variant in result['variants']
+    ]
+    data = {
+        'source': name,
+        'width': result['width'],
+        'height': result['height'],
+        'placeholder': result['placeholder'],
+        'variants': variants,
+    }
+    if not Software.objects.filter(pk=pk, thumbnail=name).update(thumbnail_variants=data):
+        return False
+    scopes = ['catalog', f'software:{pk}']
+    if category_id:
+        scopes.append(f'category:{category_id}')
+    page_cache.bump_many(scopes)
+    return True
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Forked: spawning starts sys.executable, which is the uWSGI binary
+            # under uWSGI.  Workers only run Pillow and leave through
+            # os._exit(), so they never touch the inherited connections.
+            context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+            _executor = ProcessPoolExecutor(max_workers=settings.SOFTWARE_THUMBNAIL_WORKERS, mp_context=context)
+        return _executor
+
+
+def _finish(pk, name, category_id, future):
+    # Runs on the pool's result thread, which gets its own connection
+    try:
+        store(pk, name, category_id, future.result())
+    except Exception:
+        logger.exception('Could not make thumbnail variants of software %s', pk)
+    finally:
+        connection.close()
+
+
+def schedule(software):
+    """Render the variants of the row's thumbnail in the pool once the transaction commits"""
+    pk, name, category_id = software.pk, software.thumbnail.name, software.category_id
+
+    def submit():
+        try:
+            future = executor().submit(imaging.render, *render_args(name))
+        except Exception:
+            # A broken pool must not fail the request that saved the row
+            logger.exception('Could not queue thumbnail variants of software %s', pk)
+            return
+        future.add_done_callback(lambda future: _finish(pk, name, category_id, future))
+
+    transaction.on_commit(submit)
+
+
+@receiver(post_save, sender=Software)
+def software_saved(sender, instance, update_fields=None, **kwargs):
+    if not settings.SOFTWARE_THUMBNAIL_WORKERS:
+        return
+    if update_fields is not None and 'thumbnail' not in update_fields:
+        return
+    if is_content_name(instance.thumbnail.name) and variants_for(instance) is None:
+        schedule(instance)
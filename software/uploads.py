@@ -0,0 +1,302 @@
+"""
+Chunked, resumable uploads of software files.
+
+A client creates an UploadSession with the file name and size, PUTs the
+file in chunks of at most SOFTWARE_UPLOAD_CHUNK_SIZE bytes at the offset the
+session reports, and finalizes it.  Each chunk is streamed from the request
+straight into a staging file under SOFTWARE_UPLOAD_STAGING_DIR, so a worker
+holds one read buffer whatever the file size, and no request outlives a
+chunk.  A dropped connection loses at most the chunk in flight: the client
+asks for the session's offset and carries on from there.
+
+The SHA-256 of the file is computed as the chunks arrive, while they all
+land in the same process.  Once a chunk lands in another process (the usual
+case behind a pool of workers) no process holds the whole hash: the process
+receiving the last chunk then hashes the staged file once, in one streaming
+pass on a background thread, and finalize() raises HashPending until that
+has finished.  No request reads more than its own chunk.
+
+finalize() hands the staged file and its hash to the storage of
+Software.file (software/storage.py links it in when the staging directory
+is on the same filesystem) and attaches it to a Software row in the same
+transaction that closes the session.
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .db_router import use_primary
+from .models import Software, UploadSession
+
+try:
+    import fcntl
+except ImportError:  # not on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = 256 * 1024
+
+# Running hashes of the sessions this process received every chunk of so far
+MAX_RUNNING_HASHES = 64
+_hashes = OrderedDict()
+_hashes_lock = threading.Lock()
+
+# A complete session still unhashed after this long lost its hashing thread
+# (the worker was recycled) and is hashed again
+HASH_RETRY_AFTER = timedelta(minutes=10)
+
+
+class UploadError(Exception):
+    """Raised for a request the session cannot accept"""
+
+
+class OffsetMismatch(UploadError):
+    """Raised when a chunk does not start where the session left off"""
+
+    def __init__(self, offset):
+        super().__init__(f'Expected offset {offset}')
+        self.offset = offset
+
+
+class HashPending(UploadError):
+    """Raised by finalize() while the staged file is still being hashed"""
+
+    def __init__(self):
+        super().__init__('The upload is still being verified')
+
+
+def staging_path(session):
+    return os.path.join(settings.SOFTWARE_UPLOAD_STAGING_DIR, f'{session.pk}.part')
+
+
+def create_session(user, filename, size):
+    filename = os.path.basename(str(filename or '')).strip()
+    if not filename:
+        raise UploadError('A file name is required')
+    if len(filename) > UploadSession._meta.get_field('filename').max_length:
+        raise UploadError('The file name is too long')
+    if not 0 < size <= settings.SOFTWARE_UPLOAD_MAX_SIZE:
+        raise UploadError(f'The file must be between 1 byte and {settings.SOFTWARE_UPLOAD_MAX_SIZE} bytes')
+    session = UploadSession.objects.create(user=user, filename=filename, size=size)
+    os.makedirs(settings.SOFTWARE_UPLOAD_STAGING_DIR, exist_ok=True)
+    open(staging_path(session), 'wb').close()
+    return session
+
+
+def get_session(pk, user):
+    """The user's open or finished session (read from the primary), or None"""
+    with use_primary():
+        return UploadSession.objects.filter(pk=pk, user=user).first()
+
+
+@contextmanager
+def _locked(path):
+    """The staging file opened for writing, locked against concurrent chunks"""
+    with open(path, 'r+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield f
+
+
+def _running_hash(session, offset):
+    """This process's SHA-256 of the first ``offset`` staged bytes, or None"""
+    if offset == 0:
+        return hashlib.sha256()
+    with _hashes_lock:
+        entry = _hashes.pop(session.pk, None)
+    if entry is not None and entry[0] == offset:
+        return entry[1]
+    return None
+
+
+def _keep_hash(session, offset, digest):
+    with _hashes_lock:
+        _hashes[session.pk] = (offset, digest)
+        _hashes.move_to_end(session.pk)
+        while len(_hashes) > MAX_RUNNING_HASHES:
+            _hashes.popitem(last=False)
+
+
+def write_chunk(session, offset, stream, length, checksum=None):
+    """
+    Append ``length`` bytes read from ``stream`` at ``offset`` and return the
+    new offset.  ``checksum`` is an optional hex SHA-256 of the chunk.  A
+    chunk that arrives short or corrupt is discarded whole.
+    """
+    if session.completed_at is not None:
+        raise UploadError('The upload is already finalized')
+    if not 0 < length <= settings.SOFTWARE_UPLOAD_CHUNK_SIZE:
+        raise UploadError(f'Chunks must be between 1 and {settings.SOFTWARE_UPLOAD_CHUNK_SIZE} bytes')
+    path = staging_path(session)
+    if not os.path.exists(path):
+        raise UploadError('The upload has expired')
+    with _locked(path) as f:
+        # Another request may have written this chunk while we waited
+        with use_primary():
+            received = UploadSession.objects.filter(pk=session.pk).values_list('received', flat=True).first()
+        if offset != received:
+            raise OffsetMismatch(received)
+        if offset + length > session.size:
+            raise UploadError('The chunk runs past the end of the file')
+        digest = _running_hash(session, offset)
+        chunk_digest = hashlib.sha256()
+        f.seek(offset)
+        written = 0
+        try:
+            while written < length:
+                data = stream.read(min(BUFFER_SIZE, length - written))
+                if not data:
+                    break
+                f.write(data)
+                if digest is not None:
+                    digest.update(data)
+                chunk_digest.update(data)
+                written += len(data)
+        except OSError:
+            written = -1
+        if written != length or (checksum and checksum.lower() != chunk_digest.hexdigest()):
+            f.truncate(offset)
+            raise UploadError('The chunk was incomplete' if written != length else 'The chunk checksum does not match')
+        f.truncate(offset + length)
+        f.flush()
+        os.fsync(f.fileno())
+        complete = offset + length == session.size
+        sha256 = digest.hexdigest() if complete and digest is not None else ''
+        UploadSession.objects.filter(pk=session.pk, received=offset).update(
+            received=offset + length, sha256=sha256, updated_at=timezone.now()
+        )
+        if not complete and digest is not None:
+            _keep_hash(session, offset + length, digest)
+        elif complete and digest is None:
+            _start_hashing(session)
+    session.received = offset + length
+    session.sha256 = sha256
+    return session.received
+
+
+def hash_staged(pk):
+    """Hash the staged file of complete session ``pk`` in one pass and record it"""
+    with use_primary():
+        session = UploadSession.objects.get(pk=pk)
+    digest = hashlib.sha256()
+    size = 0
+    with open(staging_path(session), 'rb') as f:
+        for data in iter(lambda: f.read(BUFFER_SIZE), b''):
+            digest.update(data)
+            size += len(data)
+    if size != session.size:
+        raise UploadError('The staged file does not match the session')
+    UploadSession.objects.filter(pk=pk, sha256='', completed_at__isnull=True).update(sha256=digest.hexdigest())
+    return digest.hexdigest()
+
+
+def _hash_in_background(pk):
+    try:
+        hash_staged(pk)
+    except Exception:
+        logger.exception('Could not hash upload %s', pk)
+    finally:
+        connection.close()
+
+
+def _start_hashing(session):
+    thread = threading.Thread(target=_hash_in_background, args=(session.pk,), name=f'upload-hash-{session.pk}')
+    thread.daemon = True
+    thread.start()
+
+
+def _resume_hashing(session):
+    """Hash a complete session again if its hashing thread has gone away"""
+    now = timezone.now()
+    if session.updated_at > now - HASH_RETRY_AFTER:
+        return
+    # Only one request restarts it
+    if UploadSession.objects.filter(pk=session.pk, sha256='', updated_at=session.updated_at).update(updated_at=now):
+        session.updated_at = now
+        _start_hashing(session)
+
+
+def _store(session, software, sha256):
+    """Put the staged file in the storage of Software.file and return its name"""
+    field = Software._meta.get_field('file')
+    storage = field.storage
+    name = field.generate_filename(software, session.filename)
+    if hasattr(storage, 'adopt'):
+        # Content-addressed: the hash is known, link the staged file in
+        return storage.adopt(staging_path(session), name, sha256)
+    with open(staging_path(session), 'rb') as f:
+        return storage.save(name, File(f), max_length=field.max_length)
+
+
+def _discard(session):
+    try:
+        os.remove(staging_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def finalize(session, software):
+    """
+    Attach the uploaded file to ``software`` (a new, unsaved row or an
+    existing one) and save it together with the closed session.  The staged
+    file goes once that commits; a blob stored for a finalize that fails is
+    left to `manage.py collect_media`.  Raises HashPending while the file is
+    being hashed.
+    """
+    if session.completed_at is not None:
+        raise UploadError('The upload is already finalized')
+    path = staging_path(session)
+    with _locked(path):
+        with use_primary():
+            session.refresh_from_db(fields=['received', 'sha256', 'completed_at', 'updated_at'])
+        if session.completed_at is not None:
+            raise UploadError('The upload is already finalized')
+        if not session.complete:
+            raise OffsetMismatch(session.received)
+        if os.path.getsize(path) != session.size:
+            raise UploadError('The staged file does not match the session')
+        if not session.sha256:
+            _resume_hashing(session)
+            raise HashPending()
+        sha256 = session.sha256
+        name = _store(session, software, sha256)
+    with transaction.atomic():
+        locked = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if locked.completed_at is not None:
+            raise UploadError('The upload is already finalized')
+        software.file.name = name
+        software.file_name = session.filename
+        software.save()
+        session.sha256 = sha256
+        session.software = software
+        session.completed_at = timezone.now()
+        session.save(update_fields=['sha256', 'software', 'completed_at', 'updated_at'])
+        transaction.on_commit(lambda: _discard(session))
+    return software
+
+
+def abort(session):
+    """Delete an unfinished session and its staged bytes"""
+    with _hashes_lock:
+        _hashes.pop(session.pk, None)
+    _discard(session)
+    session.delete()
+
+
+def expired_sessions(now=None):
+    """Unfinished sessions that have not received a chunk within the TTL"""
+    now = now or timezone.now()
+    return UploadSession.objects.filter(
+        completed_at__isnull=True,
+        updated_at__lt=now - timedelta(hours=settings.SOFTWARE_UPLOAD_SESSION_TTL),
+    )
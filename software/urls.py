@@ -1,8 +1,19 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'software'
 
+# Under ASGI (see software_portal/asgi.py) downloads and the JSON APIs are served by async views
+if settings.SOFTWARE_ASYNC_VIEWS:
+    download_view = views.async_software_download
+    software_api_view = views.async_software_api
+    category_api_view = views.async_category_api
+else:
+    download_view = views.software_download
+    software_api_view = views.SoftwareAPIView.as_view()
+    category_api_view = views.CategoryAPIView.as_view()
+
 urlpatterns = [
     # Software list view (homepage)
     path('', views.SoftwareListView.as_view(), name='software_list'),
@@ -11,11 +22,13 @@ urlpatterns = [
     path('software/<int:pk>/', views.SoftwareDetailView.as_view(), name='software_detail'),
     
     # Software download
-    path('software/<int:pk>/download/', views.software_download, name='software_download'),
+    path('software/<int:pk>/download/', download_view, name='software_download'),
     
     # API endpoints
-    path('api/software/', views.SoftwareAPIView.as_view(), name='software_api'),
-    path('api/categories/', views.CategoryAPIView.as_view(), name='category_api'),
+    path('api/software/', software_api_view, name='software_api'),
+    path('api/software/changes/', views.SoftwareChangesAPIView.as_view(), name='software_changes_api'),
+    path('api/software/suggest/', views.SoftwareSuggestAPIView.as_view(), name='software_suggest_api'),
+    path('api/categories/', category_api_view, name='category_api'),
     
     # Static pages - Class-based views
     path('privacy-policy/', views.PrivacyPolicyView.as_view(), name='privacy_policy'),
@@ -1,30 +1,39 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
 from django.views.generic import ListView, DetailView, TemplateView
-from django.db.models import Q
-from django.http import JsonResponse, HttpResponse, Http404
+from django.http import JsonResponse, HttpResponse, HttpResponseNotAllowed, Http404, StreamingHttpResponse
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
+from django.utils.cache import get_conditional_response, patch_cache_control
 from .models import Software, SoftwareCategory
+from .changes import ChangeFeed, CursorExpired
+from .downloads import get_download_backend
+from .page_cache import cache_page_response, category_scopes, detail_scopes, fragment_version, list_scopes, normalized_query
+from .pagination import CursorPaginator, InvalidCursor
+from .search import get_search_backend
+from .serializers import FastJsonResponse, asoftware_etag, columns, parse_fields, serialize_rows, software_etag
+from .suggest import suggest_index
 
+@method_decorator(cache_page_response(list_scopes), name='dispatch')
 class SoftwareListView(ListView):
     model = Software
     template_name = 'software/software_list.html'
     context_object_name = 'software_list'
     paginate_by = 12
-    ordering = ['-upload_date']
+    ordering = ['-upload_date', '-id']
     
     def get_queryset(self):
-        queryset = Software.objects.filter(is_active=True).select_related('category', 'uploader')
+        queryset = Software.active.select_related('category', 'uploader')
         
-        # Search functionality
+        # Search functionality (relevance ordered, see software/search.py)
         search_query = self.request.GET.get('search')
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(version__icontains=search_query)
-            )
+            queryset = get_search_backend().search(queryset, search_query)
+        else:
+            queryset = queryset.order_by(*self.ordering)
         
         # Category filter
         category_id = self.request.GET.get('category')
@@ -33,90 +42,227 @@ class SoftwareListView(ListView):
         
         return queryset
     
+    def paginate_queryset(self, queryset, page_size):
+        """Keyset pagination on (upload_date, id); search results page by offset"""
+        ordering = None if self.request.GET.get('search') else self.ordering
+        paginator = CursorPaginator(queryset, page_size, ordering=ordering)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        return (paginator, page, page.object_list, page.has_other_pages())
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['categories'] = SoftwareCategory.objects.filter(is_active=True)
         context['search_query'] = self.request.GET.get('search', '')
         context['selected_category'] = self.request.GET.get('category', '')
+        # Resolve the selected category once instead of scanning the list in the template
+        context['current_category'] = None
+        if context['selected_category'].isdigit():
+            context['current_category'] = context['categories'].filter(pk=context['selected_category']).first()
+        # Versions for the {% cache %} fragments (see software/page_cache.py)
+        context['categories_version'] = fragment_version(['categories'])
+        context['list_version'] = fragment_version(list_scopes(self.request))
+        context['fragment_timeout'] = settings.SOFTWARE_FRAGMENT_CACHE_TIMEOUT
         return context
 
+@method_decorator(cache_page_response(detail_scopes), name='dispatch')
 class SoftwareDetailView(DetailView):
     model = Software
     template_name = 'software/software_detail.html'
     context_object_name = 'software'
     
     def get_queryset(self):
-        return Software.objects.filter(is_active=True).select_related('category', 'uploader')
+        return Software.active.select_related('category', 'uploader')
+
+def deliver_download(request, software, backend):
+    """Answer conditional requests, count the download and serve the file"""
+    # Answer If-None-Match / If-Modified-Since without sending the file
+    response = backend.get_conditional_response(request, software)
+    if response is not None:
+        return response
+    
+    # Count a download once, not for every range a client resumes with
+    if backend.is_new_download(request, software):
+        software.increment_download_count()
+    
+    # Hand the file over to the configured delivery backend
+    return backend.serve(request, software)
 
+@require_safe
 def software_download(request, pk):
     """Handle software download and increment download count"""
-    import os
-    software = get_object_or_404(Software, pk=pk, is_active=True)
-    
-    # Increment download count
-    software.increment_download_count()
+    software = get_object_or_404(Software.active, pk=pk)
+    if not software.file:
+        raise Http404("File not found")
     
-    # Return file download response
-    if software.file:
-        # Get the original filename from the file path
-        original_filename = os.path.basename(software.file.name)
-        
-        response = HttpResponse(software.file.read(), content_type='application/octet-stream')
-        response['Content-Disposition'] = f'attachment; filename="{original_filename}"'
-        return response
-    else:
+    return deliver_download(request, software, get_download_backend())
+
+async def async_software_download(request, pk):
+    """
+    software_download for ASGI: the file is streamed by async generators, so
+    a slow client holds a coroutine rather than a worker
+    """
+    # require_safe() only learned to wrap async views in Django 5.0
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    try:
+        software = await Software.active.aget(pk=pk)
+    except Software.DoesNotExist:
+        raise Http404("No Software matches the given query.")
+    if not software.file:
         raise Http404("File not found")
+    
+    # Stat, open and count in a thread; only the body is read on the loop
+    backend = get_download_backend(asynchronous=True)
+    return await sync_to_async(deliver_download)(request, software, backend)
 
-class SoftwareAPIView(View):
-    """API endpoint for software data"""
+class SoftwareAPIMixin:
+    """Request parsing and responses shared by the sync and async software APIs"""
+    default_limit = 20
+    max_limit = 100
     
-    def get(self, request):
-        software_list = Software.objects.filter(is_active=True).select_related('category', 'uploader')
+    def parse(self, request):
+        """(fields, filtered queryset, limit); raises ValueError on bad parameters"""
+        fields = parse_fields(request.GET.get('fields'))
+        
+        software_list = Software.active.all()
         
         # Apply filters
         search = request.GET.get('search')
         if search:
-            software_list = software_list.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search)
-            )
+            software_list = get_search_backend().search(software_list, search)
         
         category_id = request.GET.get('category')
         if category_id:
             software_list = software_list.filter(category_id=category_id)
         
-        # Serialize data
-        data = []
-        for software in software_list[:20]:  # Limit to 20 items
-            data.append({
-                'id': software.id,
-                'title': software.title,
-                'description': software.description,
-                'version': software.version,
-                'category': software.category.name if software.category else None,
-                'download_count': software.download_count,
-                'upload_date': software.upload_date.isoformat(),
-                'thumbnail': software.thumbnail.url if software.thumbnail else None,
-            })
+        try:
+            limit = min(max(int(request.GET.get('limit', self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        return fields, software_list, limit
+    
+    def page_response(self, request, software_list, fields, limit):
+        # Keyset pagination on (upload_date, id); search results page by offset
+        paginator = CursorPaginator(
+            software_list.values(*columns(fields)), limit,
+            ordering=None if request.GET.get('search') else ('-upload_date', '-id'),
+        )
+        try:
+            page = paginator.page(request.GET.get('cursor'))
+        except InvalidCursor:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
         
-        return JsonResponse({'software': data})
+        return FastJsonResponse({
+            'software': serialize_rows(page, fields),
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+            'estimated_total': page.estimated_total,
+        })
+    
+    def finish(self, response, etag):
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=settings.SOFTWARE_API_MAX_AGE, must_revalidate=True)
+        return response
 
+@method_decorator(cache_page_response(list_scopes), name='dispatch')
+class SoftwareAPIView(SoftwareAPIMixin, View):
+    """API endpoint for software data"""
+    
+    def get(self, request):
+        try:
+            fields, software_list, limit = self.parse(request)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        # Polling clients revalidate with If-None-Match and get a 304
+        etag = software_etag(software_list, normalized_query(request), fields)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = self.page_response(request, software_list, fields, limit)
+        return self.finish(response, etag)
+
+class AsyncSoftwareAPIView(SoftwareAPIMixin, View):
+    """SoftwareAPIView for ASGI"""
+    
+    async def get(self, request):
+        try:
+            fields, software_list, limit = self.parse(request)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        etag = await asoftware_etag(software_list, normalized_query(request), fields)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            # The keyset paginator is synchronous
+            response = await sync_to_async(self.page_response)(request, software_list, fields, limit)
+        return self.finish(response, etag)
+
+class SoftwareChangesAPIView(View):
+    """NDJSON feed of catalog changes for mirrors (see software/changes.py)"""
+    
+    def get(self, request):
+        try:
+            feed = ChangeFeed.from_params(request.GET.get('cursor'), request.GET.get('since'))
+        except (InvalidCursor, ValueError, TypeError):
+            return JsonResponse({'error': 'Invalid cursor or since parameter'}, status=400)
+        except CursorExpired:
+            return JsonResponse({'error': 'Cursor is too old, start again with a full export'}, status=410)
+        
+        response = StreamingHttpResponse(feed, content_type='application/x-ndjson')
+        response['Cache-Control'] = 'no-store'
+        return response
+
+class SoftwareSuggestAPIView(View):
+    """Typeahead suggestions served from the in-process index"""
+    
+    def get(self, request):
+        query = request.GET.get('q', '')[:100]
+        try:
+            limit = min(max(int(request.GET.get('limit', 8)), 1), 20)
+        except ValueError:
+            limit = 8
+        return JsonResponse({
+            'query': query,
+            'suggestions': suggest_index.suggest(query, limit),
+        })
+
+def category_data(category):
+    return {
+        'id': category['id'],
+        'name': category['name'],
+        'description': category['description'],
+        'software_count': category['active_software_count'],
+    }
+
+def active_categories():
+    return SoftwareCategory.objects.filter(is_active=True).values(
+        'id', 'name', 'description', 'active_software_count'
+    )
+
+@method_decorator(cache_page_response(category_scopes), name='dispatch')
 class CategoryAPIView(View):
     """API endpoint for categories"""
     
     def get(self, request):
-        categories = SoftwareCategory.objects.filter(is_active=True)
-        data = []
-        for category in categories:
-            data.append({
-                'id': category.id,
-                'name': category.name,
-                'description': category.description,
-                'software_count': category.software_set.filter(is_active=True).count()
-            })
+        data = [category_data(category) for category in active_categories()]
+        
+        return JsonResponse({'categories': data})
+
+class AsyncCategoryAPIView(View):
+    """CategoryAPIView for ASGI"""
+    
+    async def get(self, request):
+        data = [category_data(category) async for category in active_categories()]
         
         return JsonResponse({'categories': data})
 
+# The async views with the same page caching as their sync counterparts;
+# software/urls.py serves them when SOFTWARE_ASYNC_VIEWS is on
+async_software_api = cache_page_response(list_scopes)(AsyncSoftwareAPIView.as_view())
+async_category_api = cache_page_response(category_scopes)(AsyncCategoryAPIView.as_view())
 
 def robots_txt(request):
     """Generate robots.txt file"""
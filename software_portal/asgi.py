@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'software_portal.settings')
+# Downloads and the JSON APIs have async views (see software/urls.py)
+os.environ.setdefault('SOFTWARE_ASYNC_VIEWS', 'true')
 
 application = get_asgi_application()
@@ -6,6 +6,16 @@ from .local_settings import (
 )
 from software_portal.logging import LOGGING
 
+try:
+    from .local_settings import DB_REPLICAS
+except ImportError:  # local settings written before read replicas
+    DB_REPLICAS = []
+
+try:
+    from .local_settings import SHARED_CACHE
+except ImportError:  # local settings written before the shared cache
+    SHARED_CACHE = None
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 SETTINGS_DIR = os.path.dirname(os.path.abspath(__file__))
 BASE_DIR = os.path.dirname(SETTINGS_DIR)
@@ -37,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.sitemaps',
     'django_extensions',
     'software',
     'AdminPage'
@@ -50,16 +61,25 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'software.db_router.PrimaryPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'software_portal.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept in memory outside DEBUG (see software/checks.py)
+            'loaders': TEMPLATE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -79,6 +99,24 @@ DATABASES = {
     'default': os.getenv('DB_CONFIG', DB_CONFIG)
 }
 
+# Read replicas of default, see software/db_router.py
+for index, replica in enumerate(DB_REPLICAS, 1):
+    DATABASES[f'replica_{index}'] = {**replica, 'TEST': {'MIRROR': 'default'}}
+
+# Persistent connections per alias: DB_<ALIAS>_CONN_MAX_AGE (e.g.
+# DB_REPLICA_1_CONN_MAX_AGE) and DB_<ALIAS>_CONN_HEALTH_CHECKS, falling back
+# to DB_CONN_MAX_AGE and DB_CONN_HEALTH_CHECKS
+for alias, config in DATABASES.items():
+    prefix = f'DB_{alias.upper()}_'
+    config['CONN_MAX_AGE'] = int(os.getenv(
+        f'{prefix}CONN_MAX_AGE', os.getenv('DB_CONN_MAX_AGE', config.get('CONN_MAX_AGE', 0))
+    ))
+    config['CONN_HEALTH_CHECKS'] = os.getenv(
+        f'{prefix}CONN_HEALTH_CHECKS', os.getenv('DB_CONN_HEALTH_CHECKS', str(config.get('CONN_HEALTH_CHECKS', False)))
+    ).lower() in ('1', 'true', 'yes')
+
+DATABASE_ROUTERS = ['software.db_router.ReplicaRouter']
+
 
 
 # Password validation
@@ -124,6 +162,129 @@ STATICFILES_DIRS = [STATICFILES_DIR, ]  # development environment
 MEDIA_URL = '/media/'
 MEDIA_ROOT = MEDIA_DIR
 
+# Software downloads
+# 'stream' serves files from the worker in bounded chunks, 'accel' hands them
+# to nginx through X-Accel-Redirect (see examples/nginx.example)
+SOFTWARE_DOWNLOAD_BACKEND = os.getenv('SOFTWARE_DOWNLOAD_BACKEND', 'stream')
+SOFTWARE_DOWNLOAD_ACCEL_PREFIX = os.getenv('SOFTWARE_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+SOFTWARE_DOWNLOAD_CHUNK_SIZE = int(os.getenv('SOFTWARE_DOWNLOAD_CHUNK_SIZE', 64 * 1024))
+SOFTWARE_DOWNLOAD_MAX_RANGES = int(os.getenv('SOFTWARE_DOWNLOAD_MAX_RANGES', 16))  # more ranges get the whole file
+
+# Download counts are buffered in this cache and written in batches
+# (see software/counters.py and the flush_download_counts command)
+SOFTWARE_DOWNLOAD_COUNTER_CACHE = os.getenv('SOFTWARE_DOWNLOAD_COUNTER_CACHE', 'default')
+SOFTWARE_DOWNLOAD_COUNTER_FLUSH_INTERVAL = int(os.getenv('SOFTWARE_DOWNLOAD_COUNTER_FLUSH_INTERVAL', 30))  # seconds
+SOFTWARE_DOWNLOAD_EVENT_BATCH_SIZE = int(os.getenv('SOFTWARE_DOWNLOAD_EVENT_BATCH_SIZE', 500))
+# Event ids are only folded into the rollups once they have been visible this
+# long, so a batch that commits late is not skipped (see software/rollups.py)
+SOFTWARE_ROLLUP_SAFETY_LAG = int(os.getenv('SOFTWARE_ROLLUP_SAFETY_LAG', 60))  # seconds
+
+# Async views
+# Serve downloads and the JSON APIs with async views; software_portal/asgi.py turns this on
+SOFTWARE_ASYNC_VIEWS = os.getenv('SOFTWARE_ASYNC_VIEWS', 'false').lower() in ('1', 'true', 'yes')
+
+# Typeahead index held by every worker (see software/suggest.py)
+SOFTWARE_SUGGEST_MAX_ENTRIES = int(os.getenv('SOFTWARE_SUGGEST_MAX_ENTRIES', 50000))
+SOFTWARE_SUGGEST_REFRESH_INTERVAL = int(os.getenv('SOFTWARE_SUGGEST_REFRESH_INTERVAL', 60))  # seconds
+SOFTWARE_SUGGEST_REBUILD_INTERVAL = int(os.getenv('SOFTWARE_SUGGEST_REBUILD_INTERVAL', 3600))  # seconds
+
+# Show the planner's row estimate instead of an exact COUNT(*) on paginated
+# lists (PostgreSQL only, see software/pagination.py)
+SOFTWARE_LIST_ESTIMATE_TOTAL = os.getenv('SOFTWARE_LIST_ESTIMATE_TOTAL', 'true').lower() in ('1', 'true', 'yes')
+
+# Rendered public pages and API responses (see software/page_cache.py).
+# Generation counters live in the default cache.
+SOFTWARE_PAGE_CACHE = os.getenv('SOFTWARE_PAGE_CACHE', 'pages')
+SOFTWARE_PAGE_CACHE_TIMEOUT = int(os.getenv('SOFTWARE_PAGE_CACHE_TIMEOUT', 300))  # seconds, 0 disables
+SOFTWARE_FRAGMENT_CACHE_TIMEOUT = int(os.getenv('SOFTWARE_FRAGMENT_CACHE_TIMEOUT', 3600))  # seconds
+
+# The default cache holds state every worker and cron command must see: page
+# cache generations, buffered download counts, the suggest index version and
+# the dashboard snapshot.  Production sets SHARED_CACHE (Redis or Memcached)
+# in local_settings.py; the per-process fallback only suits a single-process
+# development server (`manage.py check --deploy` reports it).
+CACHES = {
+    'default': SHARED_CACHE or {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # {% cache %} fragments, versioned with the same generation counters
+    'template_fragments': {
+        'BACKEND': 'software.cache_backends.BoundedLocMemCache',
+        'LOCATION': 'software-fragments',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('SOFTWARE_FRAGMENT_CACHE_MAX_ENTRIES', 5000)),
+            'MAX_BYTES': int(os.getenv('SOFTWARE_FRAGMENT_CACHE_MAX_BYTES', 16 * 1024 * 1024)),
+        },
+    },
+    'pages': {
+        'BACKEND': 'software.cache_backends.BoundedLocMemCache',
+        'LOCATION': 'software-pages',
+        'TIMEOUT': SOFTWARE_PAGE_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('SOFTWARE_PAGE_CACHE_MAX_ENTRIES', 5000)),
+            'MAX_BYTES': int(os.getenv('SOFTWARE_PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+        },
+    },
+}
+
+# Static pages rendered at deploy time and served by nginx
+# (see software/prerender.py and examples/nginx.example)
+SOFTWARE_PRERENDER_ROOT = os.getenv('SOFTWARE_PRERENDER_ROOT', os.path.join(STATIC_ROOT, 'prerendered'))
+SOFTWARE_PRERENDER_HOST = os.getenv('SOFTWARE_PRERENDER_HOST', next(
+    (host for host in ALLOWED_HOSTS if host not in ('*', 'localhost') and not host.replace('.', '').isdigit()),
+    'localhost',
+))
+SOFTWARE_PRERENDER_SCHEME = os.getenv('SOFTWARE_PRERENDER_SCHEME', 'https')
+
+# Sitemap files written by `manage.py generate_sitemaps` and served by nginx
+# (see software/sitemap_writer.py). Sections hold at most 50,000 URLs.
+SOFTWARE_SITEMAP_ROOT = os.getenv('SOFTWARE_SITEMAP_ROOT', os.path.join(BASE_DIR, 'sitemaps'))
+SOFTWARE_SITEMAP_SECTION_SIZE = min(int(os.getenv('SOFTWARE_SITEMAP_SECTION_SIZE', 10000)), 50000)
+SOFTWARE_SITEMAP_HOST = os.getenv('SOFTWARE_SITEMAP_HOST', SOFTWARE_PRERENDER_HOST)
+SOFTWARE_SITEMAP_SCHEME = os.getenv('SOFTWARE_SITEMAP_SCHEME', 'https')
+
+# Seconds API clients may reuse a response before revalidating with its ETag
+SOFTWARE_API_MAX_AGE = int(os.getenv('SOFTWARE_API_MAX_AGE', 0))
+
+# Catalog changes feed for mirrors (see software/changes.py)
+SOFTWARE_CHANGES_BATCH_SIZE = int(os.getenv('SOFTWARE_CHANGES_BATCH_SIZE', 1000))
+SOFTWARE_CHANGES_SAFETY_LAG = int(os.getenv('SOFTWARE_CHANGES_SAFETY_LAG', 5))  # seconds
+SOFTWARE_CHANGES_TOMBSTONE_DAYS = int(os.getenv('SOFTWARE_CHANGES_TOMBSTONE_DAYS', 90))
+
+# Seconds the admin dashboard statistics are served before a background refresh
+SOFTWARE_DASHBOARD_STATS_TTL = int(os.getenv('SOFTWARE_DASHBOARD_STATS_TTL', 60))
+
+# Rows per UPDATE/DELETE statement of the admin bulk actions (see AdminPage/bulk.py)
+SOFTWARE_BULK_BATCH_SIZE = int(os.getenv('SOFTWARE_BULK_BATCH_SIZE', 1000))
+
+# Chunked upload sessions (see software/uploads.py).  Keep the staging
+# directory on the same filesystem as MEDIA_ROOT so finalizing is a link,
+# and the chunk size under nginx's client_max_body_size for /adminpage/uploads/.
+SOFTWARE_UPLOAD_STAGING_DIR = os.getenv(
+    'SOFTWARE_UPLOAD_STAGING_DIR', os.path.join(os.path.dirname(os.path.abspath(MEDIA_ROOT)), 'upload_staging')
+)
+SOFTWARE_UPLOAD_CHUNK_SIZE = int(os.getenv('SOFTWARE_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+SOFTWARE_UPLOAD_MAX_SIZE = int(os.getenv('SOFTWARE_UPLOAD_MAX_SIZE', 16 * 1024 ** 3))
+SOFTWARE_UPLOAD_SESSION_TTL = int(os.getenv('SOFTWARE_UPLOAD_SESSION_TTL', 48))  # hours without a chunk
+
+# Hours an unreferenced media blob is kept after it was last written or
+# reused before `manage.py collect_media` deletes it (see software/storage.py)
+SOFTWARE_MEDIA_GC_GRACE = int(os.getenv('SOFTWARE_MEDIA_GC_GRACE', 24))
+
+# Resized thumbnail variants (see software/thumbnails.py).  WORKERS is the
+# size of each web process's rendering pool; 0 leaves new thumbnails to
+# `manage.py generate_thumbnails`.
+SOFTWARE_THUMBNAIL_WIDTHS = [
+    int(width) for width in os.getenv('SOFTWARE_THUMBNAIL_WIDTHS', '160,320,640,1280').split(',')
+]
+SOFTWARE_THUMBNAIL_QUALITY = int(os.getenv('SOFTWARE_THUMBNAIL_QUALITY', 75))
+SOFTWARE_THUMBNAIL_WORKERS = int(os.getenv('SOFTWARE_THUMBNAIL_WORKERS', 1))
+
+# Read replicas
+SOFTWARE_REPLICA_MAX_LAG = float(os.getenv('SOFTWARE_REPLICA_MAX_LAG', 10))  # seconds, laggier replicas are skipped
+SOFTWARE_REPLICA_CHECK_INTERVAL = float(os.getenv('SOFTWARE_REPLICA_CHECK_INTERVAL', 5))  # seconds
+SOFTWARE_REPLICA_PIN_SECONDS = int(os.getenv('SOFTWARE_REPLICA_PIN_SECONDS', 30))  # primary reads after a write
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
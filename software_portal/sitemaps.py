@@ -1,9 +1,31 @@
+import os
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
 from django.contrib.sitemaps import Sitemap
+from django.db.models import Count, F, Max, Sum
 from django.shortcuts import reverse
-from django.utils import timezone
+from django.template.loader import get_template
+from django.urls import resolve
+from django.utils.functional import cached_property
 from software.models import Software, SoftwareCategory
 
 
+def catalog_lastmod():
+    """Latest update of any visible software, in one aggregate query"""
+    return Software.active.aggregate(latest=Max('updated_at'))['latest']
+
+
+def template_lastmod(url_name):
+    """Modification time of the template behind a TemplateView URL"""
+    view_class = getattr(resolve(reverse(url_name)).func, 'view_class', None)
+    template_name = getattr(view_class, 'template_name', None)
+    if template_name is None:
+        return None
+    mtime = os.path.getmtime(get_template(template_name).origin.name)
+    return datetime.fromtimestamp(mtime, tz=dt_timezone.utc)
+
+
 class StaticViewSitemap(Sitemap):
     """Sitemap for static pages"""
     priority = 0.8
@@ -22,9 +44,18 @@ class StaticViewSitemap(Sitemap):
     def location(self, item):
         return reverse(item)
 
+    @cached_property
+    def catalog_lastmod(self):
+        return catalog_lastmod()
+
     def lastmod(self, item):
-        # Return current time for static pages
-        return timezone.now()
+        # The list changes with the catalog, the other pages with their templates
+        if item == 'software:software_list':
+            return self.catalog_lastmod
+        return template_lastmod(item)
+
+    def get_latest_lastmod(self):
+        return max(filter(None, map(self.lastmod, self.items())), default=None)
 
 
 class SoftwareSitemap(Sitemap):
@@ -33,12 +64,42 @@ class SoftwareSitemap(Sitemap):
     priority = 0.9
     protocol = 'https'
 
+    limit = settings.SOFTWARE_SITEMAP_SECTION_SIZE
+
+    def __init__(self, bucket=None):
+        # Sections written to disk cover fixed pk ranges (bucket * limit and
+        # up), so a row never moves to another file
+        self.bucket = bucket
+
     def items(self):
-        return Software.objects.filter(is_active=True).select_related('category')
+        software = Software.active.only('pk', 'updated_at', 'download_count').order_by('pk')
+        if self.bucket is not None:
+            software = software.filter(pk__gte=self.bucket * self.limit, pk__lt=(self.bucket + 1) * self.limit)
+        return software
 
     def lastmod(self, obj):
         return obj.updated_at
 
+    def get_latest_lastmod(self):
+        return self.items().aggregate(latest=Max('updated_at'))['latest']
+
+    @classmethod
+    def buckets(cls):
+        """
+        {bucket: (row count, latest update, pk checksum)} from one grouped
+        query.  Every save moves updated_at forward, so an edit changes the
+        latest update and an insert, delete or toggle changes the count or
+        checksum of its bucket.
+        """
+        rows = (
+            Software.active
+            .annotate(bucket=F('pk') / cls.limit)
+            .values('bucket')
+            .annotate(count=Count('pk'), latest=Max('updated_at'), checksum=Sum('pk'))
+            .order_by('bucket')
+        )
+        return {row['bucket']: (row['count'], row['latest'], row['checksum']) for row in rows}
+
     def location(self, obj):
         return reverse('software:software_detail', args=[obj.pk])
 
@@ -63,19 +124,16 @@ class CategorySitemap(Sitemap):
     def items(self):
         return SoftwareCategory.objects.filter(
             is_active=True,
-            software__is_active=True
-        ).distinct()
+            active_software_count__gt=0
+        ).order_by('pk')
 
     def lastmod(self, obj):
-        # Get the latest update from software in this category
-        latest_software = Software.objects.filter(
-            category=obj,
-            is_active=True
-        ).order_by('-updated_at').first()
-        
-        if latest_software:
-            return latest_software.updated_at
-        return obj.updated_at
+        # Latest update of the software in this category, kept on the row
+        return obj.latest_software_update or obj.updated_at
+
+    def get_latest_lastmod(self):
+        latest = self.items().aggregate(software=Max('latest_software_update'), category=Max('updated_at'))
+        return max(filter(None, latest.values()), default=None)
 
     def location(self, obj):
         return f"{reverse('software:software_list')}?category={obj.pk}"
@@ -96,8 +154,21 @@ class SoftwareAPISitemap(Sitemap):
     def location(self, item):
         return reverse(item)
 
+    @cached_property
+    def latest(self):
+        catalog = catalog_lastmod()
+        categories = SoftwareCategory.objects.filter(is_active=True).aggregate(latest=Max('updated_at'))['latest']
+        return {
+            'software:software_api': catalog,
+            # Category listings include software counts
+            'software:category_api': max(filter(None, [catalog, categories]), default=None),
+        }
+
     def lastmod(self, item):
-        return timezone.now()
+        return self.latest[item]
+
+    def get_latest_lastmod(self):
+        return max(filter(None, self.latest.values()), default=None)
 
 
 # Sitemap registry
@@ -14,3 +14,23 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'software_portal.settings')
 
 application = get_wsgi_application()
+
+# Build the in-process typeahead index before the first request
+from django.db import connections  # noqa: E402
+
+from software.suggest import suggest_index  # noqa: E402
+
+
+def warm_suggest_index():
+    suggest_index.warm()
+    # The connection the index was read through must not outlive a fork
+    connections.close_all()
+
+
+try:
+    from uwsgidecorators import postfork
+except ImportError:  # not under uWSGI: this process serves the requests
+    warm_suggest_index()
+else:
+    # In each worker once the master has forked it, never in the master
+    postfork(warm_suggest_index)